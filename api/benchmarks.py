@@ -0,0 +1,59 @@
+import math
+import time
+import tracemalloc
+from typing import Callable
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Timing helpers of benchmarks, load test and traces. #
+
+
+def percentile(values: list, percent: float) -> float:
+    """Return percentile of values by nearest-rank method.
+
+    :param values: measured values
+    :type values: list
+
+    :param percent: percentile from 0 to 100
+    :type percent: float
+
+    :rtype: float
+    """
+    ordered = sorted(values)
+    index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def measure(func: Callable, repeat: int) -> list:
+    """Call func repeat times and return durations of calls in ms."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def format_durations(name: str, durations: list) -> str:
+    """Return line with p50, p95 and p99 of durations in ms."""
+    return (
+        f"{name:<24} p50={percentile(durations, 50):9.2f}ms "
+        f"p95={percentile(durations, 95):9.2f}ms "
+        f"p99={percentile(durations, 99):9.2f}ms"
+    )
+
+
+def measure_resources(func: Callable) -> (int, int):
+    """Call func once and return count of its queries and peak of
+    memory allocated by it in bytes. It is a separate call, because
+    tracing of memory slows down the measure of time.
+    """
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return len(queries), peak
@@ -0,0 +1,113 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Coalescing of identical concurrent requests. #
+
+COALESCING_LOCK_KEY = "coalescing-lock:{}"
+COALESCING_RESULT_KEY = "coalescing-result:{}"
+# pause between checks of the result of another process (seconds)
+COALESCING_POLL_INTERVAL = 0.02
+
+_missing = object()
+
+
+class Call:
+    """Computation that is shared by identical requests."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs only one computation for a key at once in this process.
+    Callers that come while it runs wait for it and get its result
+    or its exception.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key: str, function):
+        with self.lock:
+            call = self.calls.get(key, None)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+
+        if not leader:
+            if call.done.wait(settings.COALESCING_TIMEOUT):
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # the computation is too long, don't wait for it anymore
+            return function()
+
+        try:
+            call.result = function()
+            return call.result
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+
+single_flight = SingleFlight()
+
+
+def get_coalescing_keys(key: str) -> tuple:
+    """Return the cache keys of the lock and the result for key."""
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    return (
+        COALESCING_LOCK_KEY.format(digest),
+        COALESCING_RESULT_KEY.format(digest)
+    )
+
+
+def shared_call(key: str, function):
+    """Run function once for processes that share 'COALESCING_CACHE'.
+    The process that took the lock computes the result and keeps it
+    in the cache for 'COALESCING_RESULT_TIMEOUT' seconds, the others
+    wait for it.
+    """
+    if not settings.COALESCING_CACHE:
+        return function()
+
+    cache = caches[settings.COALESCING_CACHE]
+    lock_key, result_key = get_coalescing_keys(key)
+    deadline = time.monotonic() + settings.COALESCING_TIMEOUT
+    while not cache.add(lock_key, 1, settings.COALESCING_TIMEOUT):
+        result = cache.get(result_key, _missing)
+        if result is not _missing:
+            return result
+        if time.monotonic() > deadline:
+            return function()
+        time.sleep(COALESCING_POLL_INTERVAL)
+
+    try:
+        result = function()
+        cache.set(result_key, result, settings.COALESCING_RESULT_TIMEOUT)
+        return result
+    finally:
+        cache.delete(lock_key)
+
+
+def coalesce(key: str, function):
+    """Return the result of function, identical concurrent calls
+    with the same key share one computation.
+
+    :param key: identity of the request, e.g. its full URL
+    :type key: str
+    :param function: computation without arguments
+    :return: result of function
+    """
+    return single_flight.do(key, lambda: shared_call(key, function))
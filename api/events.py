@@ -0,0 +1,307 @@
+import asyncio
+import threading
+from typing import Union
+from urllib.parse import parse_qs
+from uuid import UUID
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models.expressions import RawSQL
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import CommentListSerializer
+from api.services import (get_comments_after, get_watermark, is_uuid,
+                          load_watermark)
+from api.snapshots import get_comment_ancestors
+from comments.models import Comment
+
+# Live feed of new comments by Server-Sent Events. #
+
+
+def format_event(comment: Comment) -> bytes:
+    """Return SSE message with the comment."""
+    data = JSONRenderer().render(CommentListSerializer(comment).data)
+    return (
+        f"id: {get_watermark(comment)}\nevent: comment\n".encode()
+        + b"data: " + data + b"\n\n"
+    )
+
+
+def format_reset_event(message: str) -> bytes:
+    """Return SSE message that tells the client to fetch the comments
+    again, because the missed comments can't be sent. The empty id
+    clears the last event id of the client.
+    """
+    data = JSONRenderer().render({"message": message})
+    return b"id\nevent: reset\ndata: " + data + b"\n\n"
+
+
+class Subscriber:
+    """Connection that receives events of one channel.
+    Events are put to the queue in the thread of connection's event loop.
+    If the client reads slower than 'SSE_MAX_PENDING_BYTES' are
+    published, the connection is closed and the client has to resume.
+    """
+
+    def __init__(self, channel: tuple, loop: asyncio.AbstractEventLoop):
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.pending_bytes = 0
+        self.overflowed = False
+
+    def deliver(self, key: tuple, message: bytes):
+        """Send the message to the connection from any thread."""
+        self.loop.call_soon_threadsafe(self.put, key, message)
+
+    def put(self, key: tuple, message: bytes):
+        if self.overflowed:
+            return
+        self.pending_bytes += len(message)
+        if self.pending_bytes > settings.SSE_MAX_PENDING_BYTES:
+            # drop the pending events, None closes the connection
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait((key, message))
+
+    async def get(self) -> Union[tuple, None]:
+        """Return the next (key, message) or None if the connection
+        has to be closed.
+        """
+        item = await self.queue.get()
+        if item is not None:
+            self.pending_bytes -= len(item[1])
+        return item
+
+
+class CommentBroker:
+    """In-process publisher of new comments to subscribers.
+    Channels are ('entity', <uuid>) for first level comments of entity
+    and ('thread', <uuid>) for all comments below a comment.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def subscribe(self, subscriber: Subscriber):
+        with self.lock:
+            self.subscribers.setdefault(subscriber.channel, set()).add(
+                subscriber
+            )
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(subscriber.channel, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self.subscribers.pop(subscriber.channel, None)
+
+    def has_threads(self) -> bool:
+        """Return whether somebody is subscribed to any thread."""
+        with self.lock:
+            return any(kind == "thread" for kind, _ in self.subscribers)
+
+    def publish(self, comment: Comment, ancestors: list = None):
+        """Send the new comment to subscribers of its entity and threads.
+        The message is rendered once for all subscribers. The ancestors
+        of the comment are read from database if they are not given.
+        """
+        channels = [("entity", comment.parent_entity)]
+        if self.has_threads():
+            if ancestors is None:
+                ancestors = get_comment_ancestors(comment.parent_entity)
+            channels += [("thread", ancestor) for ancestor in ancestors]
+        with self.lock:
+            subscribers = [
+                subscriber
+                for channel in channels
+                for subscriber in self.subscribers.get(channel, ())
+            ]
+        if not subscribers:
+            return
+
+        key = (comment.created_date, comment.uuid_comment)
+        message = format_event(comment)
+        for subscriber in subscribers:
+            subscriber.deliver(key, message)
+
+
+comment_broker = CommentBroker()
+
+
+def publish_comment(comment: Comment, ancestors: list = None):
+    """Send the new comment to subscribers in this process."""
+    comment_broker.publish(comment, ancestors)
+
+
+def get_missed_comments(channel: tuple, after: tuple) -> list:
+    """Return comments of channel created after (created_date, uuid_comment)
+    from older to newer, but not more than 'SSE_MAX_REPLAY' + 1:
+    the replay is not complete if there are more than 'SSE_MAX_REPLAY'.
+    """
+    kind, entity = channel
+    queryset = get_comments_after(after)
+    if kind == "entity":
+        queryset = queryset.filter(parent_entity=entity)
+    else:
+        table = Comment._meta.db_table
+        queryset = queryset.filter(uuid_comment__in=RawSQL(
+            f"""
+            WITH RECURSIVE thread AS (
+                SELECT uuid_comment FROM {table} WHERE parent_entity = %s
+                UNION ALL
+                SELECT comment.uuid_comment FROM {table} AS comment
+                JOIN thread ON comment.parent_entity = thread.uuid_comment
+            )
+            SELECT uuid_comment FROM thread
+            """,
+            [entity]
+        ))
+    return list(
+        queryset.select_related("user", "parent_entity_type")
+        [:settings.SSE_MAX_REPLAY + 1]
+    )
+
+
+async def wait_disconnect(receive):
+    """Wait until the client closes the connection."""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def send_json_response(send, status: int, data: dict):
+    """Send JSON response with the status."""
+    body = JSONRenderer().render(data)
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def sse_application(scope, receive, send):
+    """ASGI application with stream of new comments.
+
+    Processes such requests as:
+        /api/events?entity=<uuid>
+        /api/events?thread=<uuid>
+
+    Where:
+    entity - the entity whose new first level comments are sent.
+    thread - the comment whose new replies of any level are sent.
+
+    Every event has the comment in the same format as
+    '/api/first-lvl-comments'. The 'Last-Event-ID' header resumes
+    the stream after the event with this id. Comments are sent only
+    from the process that created them, so the resuming is needed
+    after reconnect to another process. If the missed comments can't
+    be sent (more than 'SSE_MAX_REPLAY' or the id is not valid),
+    the 'reset' event is sent and the stream is closed: the client
+    fetches the comments again and connects without 'Last-Event-ID'.
+    """
+    query = parse_qs(scope["query_string"].decode())
+    channels = [
+        (kind, query[kind][0]) for kind in ("entity", "thread")
+        if kind in query
+    ]
+    if len(channels) != 1:
+        await send_json_response(send, 400, {
+            "name": "Bad Request",
+            "message": "Please, input 'entity' or 'thread' value.",
+            "hint": "You need to write ?entity=<uuid> or ?thread=<uuid> "
+                    "parameter.",
+            "status": 400,
+        })
+        return
+    kind, entity = channels[0]
+    if not is_uuid(entity):
+        await send_json_response(send, 400, {
+            "name": "Bad Request",
+            "message": "Value was not UUID",
+            "status": 400,
+        })
+        return
+
+    headers = dict(scope["headers"])
+    after = None
+    reset = None
+    if b"last-event-id" in headers:
+        after = load_watermark(headers[b"last-event-id"].decode("latin-1"))
+        if after is None:
+            reset = "Last-Event-ID is not valid, fetch the comments again."
+
+    subscriber = Subscriber((kind, UUID(entity)), asyncio.get_running_loop())
+    comment_broker.subscribe(subscriber)
+    disconnect = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+        # the new comments are already collected by subscriber,
+        # so nothing is lost between reading database and waiting
+        if after is not None:
+            missed = await sync_to_async(get_missed_comments)(
+                subscriber.channel, after
+            )
+            if len(missed) > settings.SSE_MAX_REPLAY:
+                reset = "Too many missed comments, fetch the comments again."
+                missed = []
+            for comment in missed:
+                after = (comment.created_date, comment.uuid_comment)
+                await send({
+                    "type": "http.response.body",
+                    "body": format_event(comment),
+                    "more_body": True,
+                })
+        if reset is not None:
+            await send({
+                "type": "http.response.body",
+                "body": format_reset_event(reset),
+            })
+            return
+
+        while True:
+            get_event = asyncio.ensure_future(subscriber.get())
+            done, _ = await asyncio.wait(
+                {disconnect, get_event},
+                timeout=settings.SSE_HEARTBEAT_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnect in done:
+                get_event.cancel()
+                return
+            if get_event not in done:
+                get_event.cancel()
+                body = b": heartbeat\n\n"
+            else:
+                item = get_event.result()
+                if item is None:
+                    break
+                key, body = item
+                if after is not None and key <= after:
+                    continue
+            await send({
+                "type": "http.response.body",
+                "body": body,
+                "more_body": True,
+            })
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnect.cancel()
+        comment_broker.unsubscribe(subscriber)
@@ -0,0 +1,279 @@
+import asyncio
+import json
+import random
+import time
+from typing import Union
+from urllib.parse import urlencode, urlsplit
+
+from api.benchmarks import percentile
+
+# Load test of API against a running server (load_test command). #
+# Requests are sent by asyncio workers, every worker keeps its own
+# HTTP/1.1 connection. A scenario is weights of endpoints, the worker
+# chooses the next endpoint by the weights.
+
+SCENARIOS = {
+    "mixed": {
+        "create": 20,
+        "first-level": 35,
+        "history": 20,
+        "tree": 15,
+        "csv": 10,
+    },
+    "read-heavy": {
+        "create": 5,
+        "first-level": 50,
+        "history": 25,
+        "tree": 15,
+        "csv": 5,
+    },
+    "write-heavy": {
+        "create": 70,
+        "first-level": 15,
+        "history": 5,
+        "tree": 5,
+        "csv": 5,
+    },
+}
+
+
+def get_request(endpoint: str, context: dict) -> tuple:
+    """Return (method, path, body) of request to endpoint.
+
+    :param endpoint: name of endpoint from scenario
+    :param context: data of requests:
+     user (nickname), entity_type (name), entity (uuid of commented
+     entity), root (uuid of comment with replies), new_entity
+     (uuid of entity for new comments)
+
+    :rtype: tuple[str, str, bytes | None]
+    """
+    if endpoint == "create":
+        body = json.dumps({
+            "author": context["user"],
+            "text": "Load test comment",
+            "parent_entity_uuid": context["new_entity"],
+            "parent_entity_type": context["entity_type"],
+        }).encode()
+        return "POST", "/api/new-comments/", body
+    if endpoint == "first-level":
+        query = urlencode({"entity": context["entity"]})
+        return "GET", f"/api/first-lvl-comments?{query}", None
+    if endpoint == "history":
+        query = urlencode({"user": context["user"]})
+        return "GET", f"/api/history-comments?{query}", None
+    if endpoint == "tree":
+        query = urlencode({"root": context["root"]})
+        return "GET", f"/api/child-comments?{query}", None
+    if endpoint == "csv":
+        query = urlencode({"entity": context["entity"]})
+        return "GET", f"/api/history/entity?{query}", None
+    raise ValueError(f"Unknown endpoint '{endpoint}'")
+
+
+class HTTPConnection:
+    """HTTP/1.1 connection with keep-alive. The connection is opened
+    again if the server closes it.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader, self.writer = None, None
+
+    async def read_body(self, headers: dict) -> bytes:
+        if headers.get("transfer-encoding", "") == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    return b"".join(chunks)
+                chunks.append(chunk[:-2])
+        if "content-length" in headers:
+            return await self.reader.readexactly(
+                int(headers["content-length"])
+            )
+        # the body without length is ended by closing
+        body = await self.reader.read()
+        await self.close()
+        return body
+
+    async def request(self, method: str, path: str,
+                      body: Union[bytes, None] = None) -> (int, bytes):
+        """Send request and return status and body of response."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        body = body or b""
+        self.writer.write((
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"\r\n"
+        ).encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("The connection was closed by server")
+        version, status = status_line.split(b" ", 2)[:2]
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, value = line.decode("latin-1").split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+        data = await self.read_body(headers)
+        if version == b"HTTP/1.0" or \
+                headers.get("connection", "").lower() == "close":
+            await self.close()
+        return int(status), data
+
+
+async def worker(url: str, scenario: dict, context: dict, deadline: float,
+                 requests: list, results: dict, seed: int):
+    """Send requests of scenario until deadline or until
+    the shared budget of requests is over.
+    """
+    parts = urlsplit(url)
+    connection = HTTPConnection(parts.hostname, parts.port or 80)
+    choice = random.Random(seed)
+    endpoints, weights = list(scenario), list(scenario.values())
+    try:
+        while time.perf_counter() < deadline and requests[0] > 0:
+            requests[0] -= 1
+            endpoint = choice.choices(endpoints, weights)[0]
+            method, path, body = get_request(endpoint, context)
+            result = results.setdefault(
+                endpoint, {"durations": [], "statuses": {}, "errors": 0}
+            )
+            started = time.perf_counter()
+            try:
+                status, _ = await connection.request(method, path, body)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                await connection.close()
+                result["errors"] += 1
+                continue
+            result["durations"].append(
+                (time.perf_counter() - started) * 1000
+            )
+            status = str(status)
+            result["statuses"][status] = result["statuses"].get(status, 0) + 1
+    finally:
+        await connection.close()
+
+
+async def run_load(url: str, scenario: dict, context: dict, concurrency: int,
+                   duration: float, requests: int, seed: int) -> dict:
+    """Run workers and return the statistics of endpoints."""
+    results = {}
+    budget = [requests or float("inf")]
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        worker(url, scenario, context, started + duration, budget, results,
+               seed + number)
+        for number in range(concurrency)
+    ))
+    return get_statistics(results, time.perf_counter() - started)
+
+
+def run(url: str, scenario: str, context: dict, concurrency: int = 10,
+        duration: float = 30, requests: int = 0, seed: int = 0) -> dict:
+    """Run the load test against the server.
+
+    :param url: URL of the server, e.g. http://127.0.0.1:8000
+    :param scenario: name of scenario from SCENARIOS
+    :param context: data of requests (see 'get_request')
+    :param concurrency: count of concurrent connections
+    :param duration: maximal seconds of the test
+    :param requests: maximal count of requests (0 - no limit)
+    :param seed: seed of the choice of endpoints
+
+    :return: statistics of endpoints (see 'get_statistics')
+    :rtype: dict
+    """
+    return asyncio.run(run_load(
+        url, SCENARIOS[scenario], context, concurrency, duration, requests,
+        seed
+    ))
+
+
+def get_statistics(results: dict, elapsed: float) -> dict:
+    """Return p50, p95, p99 (ms), requests per second, statuses and
+    errors of every endpoint and of all requests ('total').
+
+    :rtype: dict
+    """
+    statistics = {}
+    all_durations, all_statuses, all_errors = [], {}, 0
+    for endpoint, result in sorted(results.items()):
+        durations = result["durations"]
+        all_durations += durations
+        all_errors += result["errors"]
+        for status, count in result["statuses"].items():
+            all_statuses[status] = all_statuses.get(status, 0) + count
+        statistics[endpoint] = get_endpoint_statistics(
+            durations, result["statuses"], result["errors"], elapsed
+        )
+    statistics["total"] = get_endpoint_statistics(
+        all_durations, all_statuses, all_errors, elapsed
+    )
+    return statistics
+
+
+def get_endpoint_statistics(durations: list, statuses: dict, errors: int,
+                            elapsed: float) -> dict:
+    if not durations:
+        return {"requests": 0, "statuses": statuses, "errors": errors}
+    return {
+        "requests": len(durations),
+        "rps": round(len(durations) / elapsed, 1),
+        "p50": round(percentile(durations, 50), 2),
+        "p95": round(percentile(durations, 95), 2),
+        "p99": round(percentile(durations, 99), 2),
+        "statuses": dict(sorted(statuses.items())),
+        "errors": errors,
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    """Compare statistics with the baseline. Latency is a regression
+    if it grew more than tolerance, requests per second - if they fell
+    more than tolerance.
+
+    :param tolerance: allowed relative change, e.g. 0.1
+
+    :return: rows (endpoint, metric, baseline value, current value,
+     relative change, is regression)
+    :rtype: list
+    """
+    rows = []
+    for endpoint, statistics in current.items():
+        before = baseline.get(endpoint, {})
+        for metric in ("p50", "p95", "p99", "rps"):
+            if metric not in statistics or not before.get(metric):
+                continue
+            change = (statistics[metric] - before[metric]) / before[metric]
+            if metric == "rps":
+                regression = change < -tolerance
+            else:
+                regression = change > tolerance
+            rows.append((
+                endpoint, metric, before[metric], statistics[metric], change,
+                regression
+            ))
+    return rows
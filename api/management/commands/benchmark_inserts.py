@@ -0,0 +1,66 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from comments.models import uuid7
+
+
+class Command(BaseCommand):
+    """Compare insert throughput of random (v4) and time-ordered (v7)
+    primary keys. Rows are inserted to temporary tables with the same
+    key as 'Comment', the size of primary key index is shown as well.
+
+    Example:
+        python manage.py benchmark_inserts --rows 1000000
+    """
+
+    help = "Compare inserts with UUID v4 and UUID v7 primary keys."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="rows in one INSERT statement")
+
+    def run(self, name: str, generate, options) -> str:
+        """Insert rows with keys from generate and return the result."""
+        table = f"benchmark_{name}"
+        batch_size = options["batch_size"]
+        values = ", ".join(["(%s, %s, %s)"] * batch_size)
+        sql = (
+            f"INSERT INTO {table} (uuid_comment, created_date, text) "
+            f"VALUES {values}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {table} ("
+                f"uuid_comment uuid PRIMARY KEY, "
+                f"created_date timestamp with time zone, text text)"
+            )
+            inserted = 0
+            started = time.perf_counter()
+            while inserted < options["rows"]:
+                now = timezone.now()
+                params = []
+                for _ in range(batch_size):
+                    params += [generate(), now, "benchmark comment"]
+                with transaction.atomic():
+                    cursor.execute(sql, params)
+                inserted += batch_size
+            duration = time.perf_counter() - started
+            cursor.execute(
+                "SELECT pg_relation_size(%s)", [f"{table}_pkey"]
+            )
+            index_size = cursor.fetchone()[0]
+            cursor.execute(f"DROP TABLE {table}")
+        return (
+            f"{name}: {inserted} rows in {duration:.1f}s, "
+            f"{inserted / duration:.0f} rows/s, "
+            f"primary key index {index_size / 1024 / 1024:.1f}MB"
+        )
+
+    def handle(self, *args, **options):
+        for name, generate in (("uuid4", uuid.uuid4), ("uuid7", uuid7)):
+            self.stdout.write(self.run(name, generate, options))
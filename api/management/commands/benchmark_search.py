@@ -0,0 +1,155 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmarks import format_durations, measure
+from api.services import get_search_queryset
+from comments.models import Comment, EntityType, User
+
+BENCHMARK_ENTITY_TYPE = "Search benchmark"
+# count of words in the vocabulary, 'w1' is the most frequent word
+VOCABULARY_SIZE = 5000
+
+
+class Command(BaseCommand):
+    """Measure latency of full-text search on generated comments.
+    The comments are generated by SQL for the 'Search benchmark' entity
+    type and they are kept between runs with '--keep', so the next run
+    with the same '--comments' doesn't generate them again.
+
+    Example:
+        python manage.py benchmark_search --comments 10000000 --keep
+    """
+
+    help = "Measure latency of full-text search over comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--comments", type=int, default=10_000_000)
+        parser.add_argument("--entities", type=int, default=100_000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--words", type=int, default=12,
+                            help="count of words in every comment")
+        parser.add_argument("--queries", type=int, default=100,
+                            help="how many times to run every query")
+        parser.add_argument("--batch-size", type=int, default=1_000_000)
+        parser.add_argument("--keep", action="store_true",
+                            help="don't delete generated comments")
+
+    def generate(self, entity_type, options):
+        """Generate missing comments of benchmark by batches."""
+        users = [
+            User(nickname=f"benchmark_{number}", firstname="Benchmark")
+            for number in range(options["users"])
+        ]
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        user_uuids = list(
+            User.objects.filter(nickname__startswith="benchmark_")
+            .values_list("uuid_user", flat=True)[:options["users"]]
+        )
+
+        generated = Comment.objects.filter(
+            parent_entity_type=entity_type
+        ).count()
+        sql = f"""
+            INSERT INTO {Comment._meta.db_table} (
+                uuid_comment, created_date, user_id, text, parent_entity,
+                parent_entity_type_id, search_vector
+            )
+            SELECT md5(random()::text || number)::uuid,
+                   now() - make_interval(secs => number),
+                   (%(users)s::uuid[])[1 + number %% %(users_count)s],
+                   generated.text,
+                   md5('entity' || number %% %(entities)s)::uuid,
+                   %(entity_type)s,
+                   to_tsvector(%(config)s, generated.text)
+            FROM generate_series(%(start)s, %(end)s) AS number,
+            LATERAL (
+                -- skewed choice of words: 'w1' is the most frequent
+                SELECT array_to_string(ARRAY(
+                    SELECT 'w' || (
+                        1 + floor(%(vocabulary)s * power(random(), 3))
+                    )::int
+                    FROM generate_series(1, %(words)s + 0 * number)
+                ), ' ') AS text
+            ) AS generated
+        """
+        while generated < options["comments"]:
+            end = min(generated + options["batch_size"], options["comments"])
+            start_time = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute(sql, {
+                    "users": user_uuids,
+                    "users_count": len(user_uuids),
+                    "entities": options["entities"],
+                    "entity_type": entity_type.id,
+                    "config": settings.COMMENT_SEARCH_CONFIG,
+                    "start": generated + 1,
+                    "end": end,
+                    "vocabulary": VOCABULARY_SIZE,
+                    "words": options["words"],
+                })
+            self.stdout.write(
+                f"Generated comments: {end} "
+                f"({time.perf_counter() - start_time:.1f}s)"
+            )
+            generated = end
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Comment._meta.db_table}")
+        return user_uuids
+
+    def handle(self, *args, **options):
+        entity_type, _ = EntityType.objects.get_or_create(
+            name=BENCHMARK_ENTITY_TYPE,
+            defaults={"description": "Comments of search benchmark"}
+        )
+        user_uuids = self.generate(entity_type, options)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT md5('entity' || 1)::uuid")
+            entity = cursor.fetchone()[0]
+        user = User.objects.get(uuid_user=user_uuids[0])
+        end_date = timezone.now()
+        start_date = end_date - timedelta(days=1)
+        first_page = list(get_search_queryset("w1")[:10])
+        after = None
+        if first_page:
+            last = first_page[-1]
+            after = (last.rank, last.uuid_comment)
+
+        scenarios = {
+            "frequent word": lambda: get_search_queryset("w1"),
+            "rare word": lambda: get_search_queryset(f"w{VOCABULARY_SIZE}"),
+            "two words": lambda: get_search_queryset("w1 w2"),
+            "phrase": lambda: get_search_queryset('"w1 w2"'),
+            "word by entity": lambda: get_search_queryset(
+                "w1", entity=entity
+            ),
+            "word by user": lambda: get_search_queryset("w1", user=user),
+            "word by dates": lambda: get_search_queryset(
+                "w1", start_date=start_date, end_date=end_date
+            ),
+            "second page": lambda: get_search_queryset("w1", after=after),
+        }
+        self.stdout.write(
+            f"Latency of search with page size 10 "
+            f"({options['queries']} queries per line):"
+        )
+        for name, get_queryset in scenarios.items():
+            durations = measure(
+                lambda: list(get_queryset()[:11]), options["queries"]
+            )
+            self.stdout.write(format_durations(name, durations))
+
+        if not options["keep"]:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {Comment._meta.db_table} "
+                    f"WHERE parent_entity_type_id = %s",
+                    [entity_type.id]
+                )
+            User.objects.filter(uuid_user__in=user_uuids).delete()
+            entity_type.delete()
@@ -0,0 +1,181 @@
+import json
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.benchmarks import format_durations, measure, measure_resources
+from api.serializers import CommentListSerializer
+from api.services import (get_all_child_comments, get_user,
+                          is_valid_comment_request)
+from api.views import CSVEntityViewSet
+from comments.models import Comment, EntityType, User
+
+
+class Command(BaseCommand):
+    """Micro-benchmarks of services and serialization: wall time
+    (p50/p95/p99), count of queries and peak of allocated memory
+    of every case. The data is created in a transaction that is
+    rolled back at the end, so the command can be run on any database.
+
+    Trees of '--tree-size' comments:
+        wide - all comments are replies of the root;
+        deep - every comment is the reply of the previous one;
+        balanced - binary tree.
+
+    Example:
+        python manage.py benchmark_services --repeat 50 --output bench.json
+    """
+
+    help = "Benchmark hot paths of services and serialization."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20,
+                            help="calls of every case")
+        parser.add_argument("--tree-size", type=int, default=200,
+                            help="comments in every tree")
+        parser.add_argument("--page-sizes", type=int, nargs="+",
+                            default=[10, 100, 500])
+        parser.add_argument("--csv-rows", type=int, default=1000,
+                            help="comments of CSV export")
+        parser.add_argument("--output", help="save results to JSON file")
+
+    def create_comments(self, user: User, entity_type: EntityType,
+                        parents: list, first=None) -> list:
+        """Create comments with parents in one query, the comment with
+        index 'i' is the reply of parents[i] (of root if it is None).
+        The n-th comment is n seconds older than the first one.
+        """
+        first = first or timezone.now()
+        comments = [Comment(
+            uuid_comment=uuid.uuid4(),
+            created_date=first - timedelta(seconds=number),
+            user=user,
+            text=f"Benchmark comment {number}",
+            parent_entity=parent,
+            parent_entity_type=entity_type,
+        ) for number, parent in enumerate(parents)]
+        # the parent of comment is known only after its uuid is chosen
+        for comment in comments:
+            if isinstance(comment.parent_entity, int):
+                comment.parent_entity = comments[
+                    comment.parent_entity
+                ].uuid_comment
+        Comment.objects.bulk_create(comments)
+        return comments
+
+    def create_data(self, options) -> dict:
+        user = User.objects.create(
+            nickname=f"benchmark_{uuid.uuid4().hex[:8]}", firstname="Bench"
+        )
+        entity_type = EntityType.objects.create(
+            name="Services benchmark", description=""
+        )
+        size = options["tree_size"]
+        roots = {}
+        for shape, get_parent in (
+            ("wide", lambda number: None),
+            ("deep", lambda number: number - 1 if number else None),
+            ("balanced", lambda number: (
+                (number - 1) // 2 if number else None
+            )),
+        ):
+            root = uuid.uuid4()
+            self.create_comments(user, entity_type, [
+                root if get_parent(number) is None else get_parent(number)
+                for number in range(size)
+            ])
+            roots[shape] = root
+
+        page_entity = uuid.uuid4()
+        self.create_comments(
+            user, entity_type, [page_entity] * max(options["page_sizes"])
+        )
+        csv_entity = uuid.uuid4()
+        self.create_comments(
+            user, entity_type, [csv_entity] * options["csv_rows"]
+        )
+        return {
+            "user": user,
+            "entity_type": entity_type,
+            "roots": roots,
+            "page_entity": page_entity,
+            "csv_entity": csv_entity,
+        }
+
+    def get_cases(self, data: dict, options) -> dict:
+        """Return functions of benchmark cases by names."""
+        user, entity_type = data["user"], data["entity_type"]
+        cases = {
+            f"child tree {shape}": (
+                lambda root=root: get_all_child_comments(str(root))
+            ) for shape, root in data["roots"].items()
+        }
+        comment_request = {
+            "author": user.nickname,
+            "text": "New comment",
+            "parent_entity_uuid": str(uuid.uuid4()),
+            "parent_entity_type": entity_type.name,
+        }
+        cases["valid request name"] = (
+            lambda: is_valid_comment_request(comment_request)
+        )
+        cases["valid request id"] = lambda: is_valid_comment_request(
+            dict(comment_request, author=str(user.uuid_user),
+                 parent_entity_type=str(entity_type.id))
+        )
+        cases["get_user nickname"] = lambda: get_user(user.nickname)
+        cases["get_user uuid"] = lambda: get_user(str(user.uuid_user))
+
+        for page_size in options["page_sizes"]:
+            def serialize(page_size=page_size):
+                # the same queryset as the first level comments view
+                page = Comment.objects.filter(
+                    parent_entity=data["page_entity"]
+                ).order_by("-created_date")[:page_size]
+                return JSONRenderer().render(
+                    CommentListSerializer(page, many=True).data
+                )
+            cases[f"serializer page {page_size}"] = serialize
+
+        view = CSVEntityViewSet.as_view()
+        request = RequestFactory().get(
+            "/api/history/entity", {"entity": str(data["csv_entity"])}
+        )
+        cases[f"csv rows {options['csv_rows']}"] = (
+            lambda: view(request).content
+        )
+        return cases
+
+    def handle(self, *args, **options):
+        results = {}
+        with transaction.atomic():
+            data = self.create_data(options)
+            cases = self.get_cases(data, options)
+            self.stdout.write(
+                f"Benchmark of services ({options['repeat']} calls per line, "
+                f"trees of {options['tree_size']} comments):"
+            )
+            for name, case in cases.items():
+                # the first call warms up caches of connection and python
+                case()
+                durations = measure(case, options["repeat"])
+                queries, peak = measure_resources(case)
+                results[name] = {
+                    "durations": durations,
+                    "queries": queries,
+                    "peak_memory": peak,
+                }
+                self.stdout.write(
+                    f"{format_durations(name, durations)} "
+                    f"queries={queries:<5} peak={peak / 1024:9.1f}KB"
+                )
+            transaction.set_rollback(True)
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
@@ -0,0 +1,124 @@
+import json
+import os
+import subprocess
+import sys
+from statistics import median
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import format_durations
+
+# the script is run by a new interpreter for every measure of startup,
+# it prints JSON with durations in ms
+SCRIPT = """
+import json
+import sys
+import time
+from wsgiref.util import setup_testing_defaults
+
+started = time.perf_counter()
+import django
+from django.core.wsgi import get_wsgi_application
+
+application = get_wsgi_application()
+path, query, host, requests = sys.argv[1:5]
+
+
+def request():
+    environ = {}
+    setup_testing_defaults(environ)
+    environ.update(PATH_INFO=path, QUERY_STRING=query, HTTP_HOST=host)
+    statuses = []
+    body = application(environ, lambda status, headers: statuses.append(
+        status
+    ))
+    b"".join(body)
+    body.close()
+    return statuses[0]
+
+
+status = request()
+startup = (time.perf_counter() - started) * 1000
+durations = []
+for _ in range(int(requests)):
+    request_started = time.perf_counter()
+    request()
+    durations.append((time.perf_counter() - request_started) * 1000)
+print(json.dumps({
+    "startup": startup,
+    "status": status,
+    "durations": durations,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+class Command(BaseCommand):
+    """Compare the startup time and the overhead of requests of
+    the full settings ('project.settings') and of API-only settings
+    ('project.settings_api'). Every run starts a new interpreter,
+    the startup is the time from the import of django to the response
+    of the first request, then the same request is repeated in it.
+    The request should be cheap (e.g. 400 response without queries),
+    so the time is the overhead of middleware and framework.
+
+    Example:
+        python manage.py benchmark_settings --runs 10 --requests 2000
+    """
+
+    help = "Compare startup and per-request overhead of settings profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profiles", nargs="+",
+            default=["project.settings", "project.settings_api"],
+            help="settings modules to compare"
+        )
+        parser.add_argument("--runs", type=int, default=5,
+                            help="new interpreters of every profile")
+        parser.add_argument("--requests", type=int, default=1000,
+                            help="requests in every interpreter")
+        parser.add_argument("--path", default="/api/first-lvl-comments")
+        parser.add_argument("--query", default="",
+                            help="query string of request")
+
+    def run(self, profile: str, options) -> dict:
+        """Run the script with the profile and return its result."""
+        env = dict(
+            os.environ, DJANGO_SETTINGS_MODULE=profile,
+            # the repeated requests must not be limited
+            API_RATE_LIMIT_RATE="0",
+        )
+        process = subprocess.run(
+            [sys.executable, "-c", SCRIPT, options["path"],
+             options["query"], settings.ALLOWED_HOSTS[0],
+             str(options["requests"])],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True
+        )
+        if process.returncode:
+            raise CommandError(f"{profile} failed:\n{process.stderr}")
+        return json.loads(process.stdout.splitlines()[-1])
+
+    def handle(self, *args, **options):
+        for profile in options["profiles"]:
+            results = [self.run(profile, options) for _ in range(
+                options["runs"]
+            )]
+            startups = [result["startup"] for result in results]
+            durations = [
+                duration for result in results
+                for duration in result["durations"]
+            ]
+            self.stdout.write(
+                f"{profile}: status {results[0]['status']}, "
+                f"modules {results[0]['modules']}"
+            )
+            self.stdout.write(
+                f"  startup median={median(startups):.1f}ms "
+                f"min={min(startups):.1f}ms max={max(startups):.1f}ms"
+            )
+            if durations:
+                self.stdout.write(
+                    "  " + format_durations("request", durations)
+                )
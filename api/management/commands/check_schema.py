@@ -0,0 +1,67 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.state import ProjectState
+
+SCHEMA_APPS = ("comments",)
+
+
+class Command(BaseCommand):
+    """Check that the database schema of the comments app is complete
+    before the process starts (BOOT_MODE=fast in entrypoint.sh):
+        - the app has committed migrations;
+        - the models have no changes without migrations;
+        - all migrations are applied;
+        - the tables of all models exist.
+    The command exits with an error if something is missing.
+    """
+
+    help = "Check that migrations and tables of the comments app exist."
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def get_problems(self, connection) -> list:
+        executor = MigrationExecutor(connection)
+        loader = executor.loader
+        problems = [
+            f"The app '{app}' has no migrations."
+            for app in SCHEMA_APPS if app not in loader.migrated_apps
+        ]
+
+        changes = MigrationAutodetector(
+            loader.project_state(), ProjectState.from_apps(apps)
+        ).changes(graph=loader.graph)
+        problems += [
+            f"The models of '{app}' have changes without migrations."
+            for app in SCHEMA_APPS if app in changes
+        ]
+
+        # every migration is checked, not only the plan to the leaf
+        # nodes, so a missing record of an older migration is found too
+        problems += [
+            f"The migration {app}.{name} is not applied."
+            for app, name in sorted(loader.graph.nodes)
+            if app in SCHEMA_APPS and
+            (app, name) not in loader.applied_migrations
+        ]
+
+        tables = set(connection.introspection.table_names())
+        for app in SCHEMA_APPS:
+            for model in apps.get_app_config(app).get_models():
+                if model._meta.db_table not in tables:
+                    problems.append(
+                        f"The table {model._meta.db_table} does not exist."
+                    )
+        return problems
+
+    def handle(self, *args, **options):
+        problems = self.get_problems(connections[options["database"]])
+        if problems:
+            raise CommandError(
+                "\n".join(problems + ["Run 'manage.py migrate'."])
+            )
+        self.stdout.write("The schema is complete.")
@@ -0,0 +1,90 @@
+from uuid import UUID
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.services import get_child_comments_tree, get_comment_dict, is_uuid
+from api.snapshots import (SNAPSHOT_KEY, delete_tree_snapshot,
+                           get_snapshot_cache, snapshots_enabled)
+from comments.models import Comment
+
+
+def get_fresh_tree(root: UUID):
+    """Return the whole tree for root comment from database
+    or None if the root comment was not found.
+    """
+    comment = Comment.objects.filter(uuid_comment=root).first()
+    if comment is None:
+        return None
+    tree = get_comment_dict(comment)
+    tree["child"], _ = get_child_comments_tree(comment.uuid_comment)
+    return tree
+
+
+class Command(BaseCommand):
+    """Compare cached snapshots of comment trees with the database.
+    Without arguments all comments are checked for cached snapshots.
+    Only caches shared between processes are used for snapshots.
+    """
+
+    help = "Check that cached snapshots of comment trees are consistent."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "roots", nargs="*", help="uuid values of root comments to check"
+        )
+        parser.add_argument(
+            "--fix", action="store_true",
+            help="delete the snapshots that are not consistent"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="how many comments to look up in cache at a time"
+        )
+
+    def get_roots_batches(self, roots, batch_size):
+        """Return uuid values of roots by batches."""
+        if roots:
+            yield roots
+            return
+        batch = []
+        queryset = Comment.objects.values_list("uuid_comment", flat=True)
+        for uuid_comment in queryset.iterator(chunk_size=batch_size):
+            batch.append(uuid_comment)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def handle(self, *args, **options):
+        if not snapshots_enabled():
+            raise CommandError(
+                "Snapshots are off, set TREE_SNAPSHOT_CACHE to a cache "
+                "shared by processes."
+            )
+        for root in options["roots"]:
+            if not is_uuid(root):
+                raise CommandError(f"Root '{root}' is not UUID.")
+        roots = [UUID(root) for root in options["roots"]]
+
+        cache = get_snapshot_cache()
+        renderer = JSONRenderer()
+        checked = inconsistent = 0
+        for batch in self.get_roots_batches(roots, options["batch_size"]):
+            keys = {SNAPSHOT_KEY.format(root): root for root in batch}
+            for key, snapshot in cache.get_many(list(keys)).items():
+                root = keys[key]
+                checked += 1
+                tree = get_fresh_tree(root)
+                if tree is not None and renderer.render(tree) == \
+                        renderer.render(snapshot["tree"]):
+                    continue
+                inconsistent += 1
+                self.stdout.write(f"Snapshot '{root}' is not consistent.")
+                if options["fix"]:
+                    delete_tree_snapshot(root)
+
+        self.stdout.write(
+            f"Checked snapshots: {checked}, not consistent: {inconsistent}."
+        )
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.outbox import dispatch, get_sink
+
+
+class Command(BaseCommand):
+    """Deliver events from the outbox to other systems by batches.
+    Several dispatchers can be run at the same time.
+
+    Examples:
+        python manage.py dispatch_outbox --once
+        python manage.py dispatch_outbox --sink http://127.0.0.1:8080/events
+    """
+
+    help = "Deliver outbox events to the sink."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sink", default=settings.OUTBOX_SINK,
+            help="file:<path> or URL of HTTP endpoint"
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--interval", type=float, default=1,
+            help="seconds to wait when the outbox is empty"
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="stop when the outbox is empty"
+        )
+        parser.add_argument(
+            "--retries", type=int, default=None,
+            help="failures of the sink in a row to retry "
+                 "(forever by default)"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sink = get_sink(options["sink"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        try:
+            dispatch(
+                sink,
+                options["batch_size"],
+                options["interval"],
+                options["once"],
+                report=self.stdout.write,
+                retries=options["retries"],
+            )
+        except OSError as exc:
+            raise CommandError(f"The sink failed: {exc}")
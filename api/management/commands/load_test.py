@@ -0,0 +1,150 @@
+import json
+import os
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.loadtest import SCENARIOS, compare, run
+from comments.models import Comment, EntitySummary, EntityType, User
+
+
+class Command(BaseCommand):
+    """Load test of API against a running server. The scenario mixes
+    creates, first level comments, history pages, trees and CSV
+    exports; the users, the entity and the tree are taken from
+    database of the server. New comments are added to a new entity,
+    so the read requests are the same during the test.
+
+    The result is compared with the baseline file if it exists, the
+    baseline is saved with --save-baseline. Run the server without
+    the rate limit (API_RATE_LIMIT_RATE=0), otherwise requests get 429.
+
+    Examples:
+        python manage.py load_test --url http://127.0.0.1:8000 --save-baseline
+        python manage.py load_test --scenario read-heavy --concurrency 50
+    """
+
+    help = "Run load test of API and compare it with the baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument(
+            "--scenario", default="mixed", choices=sorted(SCENARIOS)
+        )
+        parser.add_argument("--concurrency", type=int, default=10,
+                            help="concurrent connections")
+        parser.add_argument("--duration", type=float, default=30,
+                            help="seconds of the test")
+        parser.add_argument("--requests", type=int, default=0,
+                            help="stop after so many requests (0 - no limit)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--baseline", default="loadtest.baseline.json",
+                            help="JSON file with the baseline")
+        parser.add_argument("--save-baseline", action="store_true",
+                            help="save the result as the baseline")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.1,
+            help="allowed relative change of latency and throughput"
+        )
+        parser.add_argument("--fail-on-regression", action="store_true",
+                            help="exit with error if there are regressions")
+
+    def get_context(self) -> dict:
+        """Return data of requests from database."""
+        user = User.objects.order_by("nickname").first()
+        entity_type = EntityType.objects.order_by("id").first()
+        if user is None or entity_type is None:
+            raise CommandError(
+                "There are no users or entity types, run set_demo_data."
+            )
+        summary = EntitySummary.objects.order_by("-comments_count").first()
+        root = Comment.objects.order_by("-descendant_count").first()
+        if summary is None or root is None:
+            self.stderr.write("There are no comments, reads will be empty.")
+        return {
+            "user": user.nickname,
+            "entity_type": entity_type.name,
+            "entity": str(summary.parent_entity if summary else uuid.uuid4()),
+            "root": str(root.uuid_comment if root else uuid.uuid4()),
+            "new_entity": str(uuid.uuid4()),
+        }
+
+    def write_statistics(self, statistics: dict):
+        self.stdout.write(
+            f"{'endpoint':<12} {'requests':>8} {'rps':>8} {'p50':>9} "
+            f"{'p95':>9} {'p99':>9}  statuses"
+        )
+        for endpoint, row in statistics.items():
+            if not row["requests"]:
+                self.stdout.write(
+                    f"{endpoint:<12} {0:>8}  errors {row['errors']}"
+                )
+                continue
+            statuses = " ".join(
+                f"{status}:{count}"
+                for status, count in row["statuses"].items()
+            )
+            errors = f" errors:{row['errors']}" if row["errors"] else ""
+            self.stdout.write(
+                f"{endpoint:<12} {row['requests']:>8} {row['rps']:>8.1f} "
+                f"{row['p50']:>7.2f}ms {row['p95']:>7.2f}ms "
+                f"{row['p99']:>7.2f}ms  {statuses}{errors}"
+            )
+
+    def write_comparison(self, baseline: dict, statistics: dict,
+                         options) -> int:
+        """Write the difference with the baseline.
+
+        :return: count of regressions
+        """
+        for name in ("scenario", "concurrency"):
+            if baseline.get(name) != options[name]:
+                self.stderr.write(
+                    f"The baseline has {name} {baseline.get(name)}, "
+                    f"the result is not comparable."
+                )
+        rows = compare(
+            baseline["statistics"], statistics, options["tolerance"]
+        )
+        self.stdout.write(f"\nComparison with {options['baseline']}:")
+        regressions = 0
+        for endpoint, metric, before, after, change, regression in rows:
+            regressions += regression
+            self.stdout.write(
+                f"{'-' if regression else ' '} {endpoint:<12} {metric:<4} "
+                f"{before:>9.2f} -> {after:>9.2f} {change:>+8.1%}"
+                f"{'  REGRESSION' if regression else ''}"
+            )
+        return regressions
+
+    def handle(self, *args, **options):
+        context = self.get_context()
+        statistics = run(
+            options["url"], options["scenario"], context,
+            options["concurrency"], options["duration"], options["requests"],
+            options["seed"]
+        )
+        self.write_statistics(statistics)
+        if statistics["total"]["statuses"].get("429"):
+            self.stderr.write(
+                "Requests were limited (429), run the server with "
+                "API_RATE_LIMIT_RATE=0."
+            )
+
+        regressions = 0
+        if os.path.exists(options["baseline"]):
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+            regressions = self.write_comparison(baseline, statistics, options)
+        if options["save_baseline"]:
+            with open(options["baseline"], "w") as file:
+                json.dump({
+                    "scenario": options["scenario"],
+                    "concurrency": options["concurrency"],
+                    "statistics": statistics,
+                }, file, indent=2)
+            self.stdout.write(
+                f"The baseline was saved to {options['baseline']}."
+            )
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"Regressions: {regressions}.")
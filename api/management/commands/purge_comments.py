@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.retention import purge
+
+
+class Command(BaseCommand):
+    """Delete comments older than the retention period by small batches
+    in the order of primary key, replies of deleted comments are deleted
+    too. The progress is saved to the checkpoint file, so an interrupted
+    purge continues from the last batch with the same cutoff.
+
+    Examples:
+        python manage.py purge_comments --days 365
+        python manage.py purge_comments --before 2021-01-01 --sleep 1
+    """
+
+    help = "Delete old comments by batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int,
+            help="delete comments older than so many days"
+        )
+        parser.add_argument(
+            "--before", help="delete comments created before YYYY-MM-DD"
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--sleep", type=float, default=0.5,
+            help="seconds to sleep between batches"
+        )
+        parser.add_argument(
+            "--max-lag", type=float, default=10,
+            help="wait while replication lag is more (seconds)"
+        )
+        parser.add_argument(
+            "--checkpoint", default="purge_comments.checkpoint.json",
+            help="file with progress, empty value disables it"
+        )
+
+    def get_cutoff(self, options) -> datetime:
+        if options["before"] is not None:
+            try:
+                return datetime.strptime(
+                    options["before"], "%Y-%m-%d"
+                ).replace(tzinfo=timezone.utc)
+            except ValueError:
+                raise CommandError("--before must have format YYYY-MM-DD")
+        if options["days"] is not None:
+            return datetime.now(tz=timezone.utc) - timedelta(
+                days=options["days"]
+            )
+        raise CommandError("--days or --before is required")
+
+    def handle(self, *args, **options):
+        purge(
+            self.get_cutoff(options),
+            options["batch_size"],
+            options["sleep"],
+            options["max_lag"],
+            options["checkpoint"] or None,
+            report=self.stdout.write,
+        )
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from comments.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    """Delete Idempotency-Key values older than 'IDEMPOTENCY_KEY_TTL'
+    by small batches, so the table keeps only the keys of the window.
+    Expired keys are also reused by new requests, so it only keeps
+    the table small.
+    """
+
+    help = "Delete expired idempotency keys."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        cutoff = datetime.now(tz=timezone.utc) - timedelta(
+            seconds=settings.IDEMPOTENCY_KEY_TTL
+        )
+        table = IdempotencyKey._meta.db_table
+        deleted = 0
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE key IN ("
+                    f"SELECT key FROM {table} WHERE created_date < %s "
+                    f"LIMIT %s)",
+                    [cutoff, options["batch_size"]]
+                )
+                if not cursor.rowcount:
+                    break
+                deleted += cursor.rowcount
+        self.stdout.write(f"Deleted idempotency keys: {deleted}.")
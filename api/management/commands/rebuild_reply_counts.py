@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from comments.models import Comment
+
+
+class Command(BaseCommand):
+    """Recount replies and descendants of all comments.
+    It is needed for comments that were saved before the counts or
+    without 'Comment.save' (e.g. by bulk inserts). Run it while comments
+    are not created, otherwise the new replies can be lost.
+    """
+
+    help = "Recount replies and descendants of comments."
+
+    def handle(self, *args, **options):
+        table = Comment._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET reply_count = 0, descendant_count = 0 "
+                f"WHERE reply_count <> 0 OR descendant_count <> 0"
+            )
+            # every comment is counted once for each of its ancestors
+            cursor.execute(
+                f"""
+                WITH RECURSIVE closure AS (
+                    SELECT uuid_comment AS ancestor, 0 AS depth
+                    FROM {table}
+                    UNION ALL
+                    SELECT comment.parent_entity, closure.depth + 1
+                    FROM {table} AS comment
+                    JOIN closure ON comment.uuid_comment = closure.ancestor
+                ), counts AS (
+                    SELECT ancestor,
+                           count(*) FILTER (WHERE depth = 1) AS replies,
+                           count(*) AS descendants
+                    FROM closure
+                    WHERE depth > 0
+                    GROUP BY ancestor
+                )
+                UPDATE {table} SET
+                    reply_count = counts.replies,
+                    descendant_count = counts.descendants
+                FROM counts
+                WHERE {table}.uuid_comment = counts.ancestor
+                """
+            )
+            updated = cursor.rowcount
+
+        self.stdout.write(f"Done, comments with replies: {updated}.")
@@ -0,0 +1,113 @@
+from datetime import timezone
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from comments import hyperloglog
+from comments.models import (Comment, EntityDailyStats, EntityParticipant,
+                             EntitySummary, UserDailyStats)
+
+
+class Command(BaseCommand):
+    """Rebuild the daily rollups of statistics and the summaries of
+    entities from comments. It is needed for comments that were saved
+    before them or without 'Comment.save' (e.g. by bulk inserts).
+    Comments are read in the order of creation, so only the rollups of
+    one day are kept in memory. Run it while comments are not created,
+    otherwise the new comments can be counted twice.
+    """
+
+    help = "Rebuild daily statistics and summaries of entities."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=10000,
+            help="how many comments to read from database at once"
+        )
+
+    def save_day(self, day, entities: dict, users: dict):
+        """Save the rollups of one day."""
+        EntityDailyStats.objects.bulk_create([
+            EntityDailyStats(
+                day=day,
+                parent_entity=parent_entity,
+                parent_entity_type_id=entity_type_id,
+                comments_count=comments_count,
+                participants=bytes(participants),
+            ) for parent_entity, (entity_type_id, comments_count,
+                                  participants) in entities.items()
+        ])
+        UserDailyStats.objects.bulk_create([
+            UserDailyStats(
+                day=day,
+                user_id=user,
+                comments_count=comments_count,
+                entities=bytes(sketch),
+            ) for user, (comments_count, sketch) in users.items()
+        ])
+
+    def rebuild_summaries(self):
+        """Rebuild the summaries of entities with SQL."""
+        comments = Comment._meta.db_table
+        EntityParticipant.objects.all().delete()
+        EntitySummary.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {EntityParticipant._meta.db_table} "
+                f"(parent_entity, user_id) "
+                f"SELECT DISTINCT parent_entity, user_id FROM {comments} "
+                f"WHERE user_id IS NOT NULL"
+            )
+            cursor.execute(
+                f"INSERT INTO {EntitySummary._meta.db_table} "
+                f"(parent_entity, comments_count, participants_count, "
+                f"latest_comment_id, latest_created_date) "
+                f"SELECT parent_entity, count(*), count(DISTINCT user_id), "
+                f"(array_agg(uuid_comment ORDER BY created_date DESC, "
+                f"uuid_comment DESC))[1], max(created_date) "
+                f"FROM {comments} GROUP BY parent_entity"
+            )
+            return cursor.rowcount
+
+    def handle(self, *args, **options):
+        rows = Comment.objects.order_by("created_date").values_list(
+            "created_date", "parent_entity", "parent_entity_type_id",
+            "user_id"
+        ).iterator(chunk_size=options["batch_size"])
+
+        count, days = 0, 0
+        current_day, entities, users = None, {}, {}
+        with transaction.atomic():
+            EntityDailyStats.objects.all().delete()
+            UserDailyStats.objects.all().delete()
+            for created_date, parent_entity, entity_type_id, user in rows:
+                day = created_date.astimezone(timezone.utc).date()
+                if day != current_day:
+                    if current_day is not None:
+                        self.save_day(current_day, entities, users)
+                        days += 1
+                    current_day, entities, users = day, {}, {}
+
+                entity = entities.setdefault(
+                    parent_entity,
+                    [entity_type_id, 0, bytearray(hyperloglog.empty())]
+                )
+                entity[1] += 1
+                if user is not None:
+                    index, rank = hyperloglog.get_register(user)
+                    entity[2][index] = max(entity[2][index], rank)
+                    user_stats = users.setdefault(
+                        user, [0, bytearray(hyperloglog.empty())]
+                    )
+                    user_stats[0] += 1
+                    index, rank = hyperloglog.get_register(parent_entity)
+                    user_stats[1][index] = max(user_stats[1][index], rank)
+                count += 1
+            if current_day is not None:
+                self.save_day(current_day, entities, users)
+                days += 1
+            summaries = self.rebuild_summaries()
+
+        self.stdout.write(
+            f"Done, comments: {count}, days: {days}, entities: {summaries}."
+        )
@@ -0,0 +1,94 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.profiling import (get_call_tree, get_top_functions, list_profiles,
+                           load_profile)
+
+
+class Command(BaseCommand):
+    """Render a profile written by api.middleware.ProfilingMiddleware:
+    the request, the top allocation sites of tracemalloc, the call tree
+    with shares of the total time and the top functions of cProfile.
+    Without the id the profiles of the directory are listed.
+
+    Examples:
+        python manage.py render_profile
+        python manage.py render_profile 20211006T101500-1a2b3c4d
+        python manage.py render_profile <id> --min-percent 5 --sort tottime
+    """
+
+    help = "Render call tree and allocations of a profiled request."
+
+    def add_arguments(self, parser):
+        parser.add_argument("profile_id", nargs="?",
+                            help="value of X-Profile-Id header")
+        parser.add_argument("--dir", default=None,
+                            help="directory of profiles (PROFILING_DIR "
+                                 "by default)")
+        parser.add_argument("--min-percent", type=float, default=1.0,
+                            help="hide calls that take less of total time")
+        parser.add_argument("--max-depth", type=int, default=30)
+        parser.add_argument("--sort", default="cumulative",
+                            help="sort key of the top functions")
+        parser.add_argument("--limit", type=int, default=20,
+                            help="top functions and allocation sites")
+
+    def write_list(self, directory: str):
+        summaries = list_profiles(directory)
+        if not summaries:
+            self.stdout.write("There are no profiles.")
+        for summary in summaries:
+            self.stdout.write(
+                f"{summary['id']}  {summary['duration']:>9.2f}ms "
+                f"{summary['status']} {summary['method']} {summary['path']} "
+                f"({summary['trigger']})"
+            )
+
+    def handle(self, *args, **options):
+        directory = options["dir"] or settings.PROFILING_DIR
+        if not os.path.isdir(directory):
+            raise CommandError(
+                f"There is no directory {directory}, set PROFILING_ENABLED "
+                f"to profile requests."
+            )
+        if not options["profile_id"]:
+            self.write_list(directory)
+            return
+        try:
+            summary, stats = load_profile(directory, options["profile_id"])
+        except FileNotFoundError:
+            raise CommandError(
+                f"There is no profile {options['profile_id']} in {directory}."
+            )
+
+        self.stdout.write(
+            f"{summary['method']} {summary['path']} -> {summary['status']} "
+            f"in {summary['duration']:.2f}ms at {summary['time']} "
+            f"({summary['trigger']})"
+        )
+        if summary["streaming"]:
+            self.stdout.write(
+                "The response is streamed, sending of the stream is not "
+                "in the profile."
+            )
+        self.stdout.write(
+            f"\nAllocations: {summary['allocated'] / 1024:.1f}KB kept, "
+            f"peak {summary['peak_memory'] / 1024:.1f}KB"
+        )
+        for allocation in summary["allocations"][:options["limit"]]:
+            self.stdout.write(
+                f"  {allocation['size'] / 1024:9.1f}KB "
+                f"{allocation['count']:>7}  "
+                f"{allocation['file']}:{allocation['line']}"
+            )
+        self.stdout.write("\nCall tree:")
+        for line in get_call_tree(
+                stats, options["max_depth"], options["min_percent"]
+        ):
+            self.stdout.write(f"  {line}")
+        self.stdout.write("\nTop functions:")
+        self.stdout.write(
+            get_top_functions(stats, options["sort"], options["limit"])
+        )
@@ -0,0 +1,87 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.slow_queries import (format_plan, get_worst_offenders,
+                              read_slow_queries)
+
+
+class Command(BaseCommand):
+    """The worst offenders among SQL statements captured by
+    api.middleware.SlowQueryMiddleware. Statements are grouped by
+    normalized shape (literals and parameters are '?') and ordered by
+    total duration; the plan of the slowest statement of every group
+    is shown with its view and parameters.
+
+    Examples:
+        python manage.py slow_queries
+        python manage.py slow_queries --view api.views.manage_new_comment
+        python manage.py slow_queries --top 3 --json
+    """
+
+    help = "List the slowest captured SQL statements grouped by shape."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=None,
+                            help="file of statements (SLOW_QUERY_FILE "
+                                 "by default)")
+        parser.add_argument("--top", type=int, default=10,
+                            help="count of shapes")
+        parser.add_argument("--view", default=None,
+                            help="only statements of this view")
+        parser.add_argument("--no-plans", action="store_true",
+                            help="don't show plans")
+        parser.add_argument("--json", action="store_true",
+                            help="write the groups as JSON")
+
+    def write_group(self, number: int, group: dict, plans: bool):
+        self.stdout.write(
+            f"{number}. {group['fingerprint']} count={group['count']} "
+            f"total={group['total']:.2f}ms mean={group['mean']:.2f}ms "
+            f"max={group['max']:.2f}ms"
+        )
+        self.stdout.write(f"   {group['shape']}")
+        self.stdout.write("   views: " + ", ".join(
+            f"{view} ({count})" for view, count in sorted(
+                group["views"].items(), key=lambda item: -item[1]
+            )
+        ))
+        slowest = group["slowest"]
+        self.stdout.write(
+            f"   slowest: {slowest['duration']:.2f}ms at {slowest['time']}, "
+            f"params {json.dumps(slowest['params'])}"
+        )
+        if not plans:
+            return
+        if slowest.get("explain_error"):
+            self.stdout.write(f"   plan: {slowest['explain_error']}")
+            return
+        kind = "EXPLAIN ANALYZE" if slowest["analyzed"] else \
+            "EXPLAIN (the statement changes data)"
+        self.stdout.write(f"   plan, {kind}:")
+        for line in format_plan(slowest["plan"]):
+            self.stdout.write(f"     {line}")
+
+    def handle(self, *args, **options):
+        path = options["file"] or settings.SLOW_QUERY_FILE
+        if not os.path.exists(path):
+            raise CommandError(
+                f"There is no file {path}, set SLOW_QUERY_THRESHOLD to "
+                f"capture statements."
+            )
+        records = read_slow_queries(path)
+        if options["view"]:
+            records = [
+                record for record in records
+                if record.get("view") == options["view"]
+            ]
+        groups = get_worst_offenders(records, options["top"])
+        if options["json"]:
+            self.stdout.write(json.dumps(groups, indent=2))
+            return
+        if not groups:
+            self.stdout.write("There are no slow statements.")
+        for number, group in enumerate(groups, 1):
+            self.write_group(number, group, not options["no_plans"])
@@ -0,0 +1,89 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.tracing import read_traces, summarize
+
+
+class Command(BaseCommand):
+    """Summary of traces written by api.middleware.TracingMiddleware.
+    For every endpoint: latency of requests, self time of components
+    (http, view, service, db, render), spans with the largest self
+    time, the slowest SQL statements and the slowest traces. Self time
+    of span is its duration without durations of its children.
+
+    Examples:
+        python manage.py summarize_traces
+        python manage.py summarize_traces --file traces.jsonl \
+--endpoint "GET /api/child-comments" --top 10
+    """
+
+    help = "Summarize traces of API requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=None,
+                            help="file of traces (TRACING_FILE by default)")
+        parser.add_argument("--endpoint", default=None,
+                            help="only the root span with this name")
+        parser.add_argument("--top", type=int, default=5,
+                            help="spans, statements and traces in lists")
+        parser.add_argument("--json", action="store_true",
+                            help="write the summary as JSON")
+
+    def write_endpoint(self, name: str, endpoint: dict, top: int):
+        self.stdout.write(
+            f"{name}: traces={endpoint['traces']} p50={endpoint['p50']:.2f}ms "
+            f"p95={endpoint['p95']:.2f}ms p99={endpoint['p99']:.2f}ms"
+        )
+        total = sum(endpoint["components"].values()) or 1
+        self.stdout.write("  self time: " + ", ".join(
+            f"{component} {value / total:.1%}"
+            for component, value in endpoint["components"].items()
+        ))
+        self.stdout.write(
+            f"  {'span':<40} {'count':>7} {'errors':>6} {'total':>11} "
+            f"{'self':>11} {'p95':>9}"
+        )
+        for span, row in list(endpoint["spans"].items())[:top]:
+            self.stdout.write(
+                f"  {span[:40]:<40} {row['count']:>7} {row['errors']:>6} "
+                f"{row['total']:>9.2f}ms {row['self']:>9.2f}ms "
+                f"{row['p95']:>7.2f}ms"
+            )
+        if endpoint["statements"]:
+            self.stdout.write("  slowest statements (self time, count):")
+            for total, count, statement in endpoint["statements"]:
+                statement = " ".join(statement.split())
+                self.stdout.write(
+                    f"  {total:>9.2f}ms {count:>6}  {statement[:100]}"
+                )
+        self.stdout.write("  slowest traces:")
+        for duration, trace_id in endpoint["slowest"]:
+            self.stdout.write(f"  {duration:>9.2f}ms  {trace_id}")
+
+    def handle(self, *args, **options):
+        path = options["file"] or settings.TRACING_FILE
+        if not os.path.exists(path):
+            raise CommandError(
+                f"There is no file {path}, set TRACING_SAMPLE_RATE to trace "
+                f"requests."
+            )
+        traces = read_traces(path)
+        if options["endpoint"]:
+            traces = (
+                spans for spans in traces
+                if any(span["name"] == options["endpoint"] and
+                       span["component"] == "http" for span in spans)
+            )
+        summary = summarize(traces, options["top"])
+        if options["json"]:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        if not summary:
+            self.stdout.write("There are no traces.")
+        for name, endpoint in sorted(
+                summary.items(), key=lambda item: -item[1]["traces"]
+        ):
+            self.write_endpoint(name, endpoint, options["top"])
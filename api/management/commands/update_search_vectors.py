@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.core.management.base import BaseCommand
+
+from comments.models import Comment
+
+
+class Command(BaseCommand):
+    """Fill the search documents of comments by batches.
+    It is needed for comments that were created before full-text search
+    and after changing 'COMMENT_SEARCH_CONFIG'.
+    """
+
+    help = "Update full-text search documents of comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true",
+            help="update all comments, not only comments without document"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=10000,
+            help="how many comments to update in one query"
+        )
+
+    def handle(self, *args, **options):
+        queryset = Comment.objects.order_by("pk")
+        if not options["all"]:
+            queryset = queryset.filter(search_vector__isnull=True)
+
+        updated = 0
+        last_pk = None
+        while True:
+            batch = queryset
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            pks = list(
+                batch.values_list("pk", flat=True)[:options["batch_size"]]
+            )
+            if not pks:
+                break
+            updated += Comment.objects.filter(pk__in=pks).update(
+                search_vector=SearchVector(
+                    "text", config=settings.COMMENT_SEARCH_CONFIG
+                )
+            )
+            last_pk = pks[-1]
+            self.stdout.write(f"Updated comments: {updated}")
+
+        self.stdout.write(f"Done, updated comments: {updated}.")
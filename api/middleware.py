@@ -0,0 +1,349 @@
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import OperationalError, connection
+from django.http import JsonResponse
+
+from api import profiling, slow_queries, tracing
+
+# Middlewares of API. #
+
+# SQLSTATE of statement cancelled by statement_timeout
+QUERY_CANCELED = "57014"
+
+
+class TokenBucket:
+    """Token buckets of clients. Every request takes a token, tokens
+    are added with 'rate' per second up to 'burst'.
+    Only 'max_clients' recently seen clients are kept.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()
+
+    def take(self, client: str) -> float:
+        """Take a token of client.
+
+        :return: 0 if the token was taken, otherwise seconds until
+         the next token
+        :rtype: float
+        """
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self.buckets[client] = (tokens, now)
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class StatementTimeout:
+    """Execute wrapper that sets statement_timeout of the connection
+    before the first query, so requests without queries (e.g. served
+    from cache) don't get extra round trips.
+    """
+
+    def __init__(self, timeout: int):
+        self.timeout = timeout
+        self.is_set = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if not self.is_set:
+            self.is_set = True
+            # a new cursor, the current one can be a server-side cursor
+            raw_connection = context["connection"].connection
+            with raw_connection.cursor() as cursor:
+                cursor.execute("SET statement_timeout = %s", [self.timeout])
+        return execute(sql, params, many, context)
+
+    def reset(self):
+        """Remove the wrapper and reset the timeout if it was set."""
+        connection.execute_wrappers.remove(self)
+        if self.is_set:
+            with connection.cursor() as cursor:
+                cursor.execute("RESET statement_timeout")
+
+
+def get_rejected_response(status: int, message: str, retry_after: float):
+    """Return JSON response for the rejected request with Retry-After."""
+    name = "Too Many Requests" if status == 429 else "Service Unavailable"
+    response = JsonResponse(
+        {"name": name, "message": message, "status": status}, status=status
+    )
+    response["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class AdmissionControlMiddleware:
+    """Rejects requests to API quickly instead of queueing them:
+        - a client that sends more requests than 'API_RATE_LIMIT'
+          gets 429 (the client is the address from
+          'API_CLIENT_IP_HEADER' or 'REMOTE_ADDR');
+        - an endpoint from 'API_CONCURRENCY_LIMITS' that already
+          processes so many requests in this process returns 503;
+        - SQL statements of an endpoint from 'API_STATEMENT_TIMEOUTS'
+          are cancelled after the timeout and the request gets 503.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.bucket = None
+        if settings.API_RATE_LIMIT:
+            self.bucket = TokenBucket(**settings.API_RATE_LIMIT)
+        self.semaphores = {
+            path: threading.BoundedSemaphore(limit)
+            for path, limit in settings.API_CONCURRENCY_LIMITS.items()
+        }
+
+    def get_client(self, request) -> str:
+        """Return address of client."""
+        header = settings.API_CLIENT_IP_HEADER
+        if header and request.META.get(header):
+            return request.META[header].split(",")[0].strip()
+        return request.META.get("REMOTE_ADDR", "")
+
+    def __call__(self, request):
+        if not request.path.startswith("/api/"):
+            return self.get_response(request)
+
+        if self.bucket is not None:
+            wait = self.bucket.take(self.get_client(request))
+            if wait:
+                return get_rejected_response(
+                    429, "Too many requests, try again later.", wait
+                )
+
+        releases = []
+        semaphore = self.semaphores.get(request.path, None)
+        if semaphore is not None:
+            if not semaphore.acquire(timeout=settings.API_QUEUE_TIMEOUT):
+                return get_rejected_response(
+                    503, "The server is busy, try again later.",
+                    settings.API_RETRY_AFTER_SECONDS
+                )
+            releases.append(semaphore.release)
+
+        timeout = settings.API_STATEMENT_TIMEOUTS.get(request.path, None)
+        statement_timeout = None
+        if timeout is not None:
+            statement_timeout = StatementTimeout(timeout)
+            connection.execute_wrappers.append(statement_timeout)
+
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self.release(releases)
+            raise
+        finally:
+            # the wrapper is removed by the thread that added it,
+            # the stream can be sent by another thread (ASGI)
+            if statement_timeout is not None:
+                statement_timeout.reset()
+        if response.streaming:
+            # the slot is kept until the stream is sent
+            response.streaming_content = self.stream(
+                response.streaming_content, releases, timeout
+            )
+        else:
+            self.release(releases)
+        return response
+
+    def process_exception(self, request, exception):
+        """Return 503 for statements cancelled by statement_timeout."""
+        if isinstance(exception, OperationalError) and getattr(
+            exception.__cause__, "pgcode", None
+        ) == QUERY_CANCELED:
+            return get_rejected_response(
+                503, "The request took too long, try again later.",
+                settings.API_RETRY_AFTER_SECONDS
+            )
+        return None
+
+    def stream(self, content, releases, timeout):
+        # statements of the stream get the timeout in the thread
+        # that sends it
+        statement_timeout = None
+        if timeout is not None:
+            statement_timeout = StatementTimeout(timeout)
+            connection.execute_wrappers.append(statement_timeout)
+        try:
+            yield from content
+        finally:
+            if statement_timeout is not None:
+                statement_timeout.reset()
+            self.release(releases)
+
+    @staticmethod
+    def release(releases):
+        for release in reversed(releases):
+            release()
+
+
+class TracingMiddleware:
+    """Traces the part 'TRACING_SAMPLE_RATE' of requests to API
+    (see api.tracing): the request, the dispatch of view, service
+    functions, SQL statements and the render of response are spans.
+    The middleware is not used if the rate is 0.
+    """
+
+    def __init__(self, get_response):
+        if not settings.TRACING_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith("/api/") or \
+                random.random() >= settings.TRACING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        trace = tracing.Trace(
+            settings.TRACING_MAX_SPANS,
+            request.META.get("HTTP_TRACEPARENT", "")
+        )
+        root = trace.start_span(
+            f"{request.method} {request.path}", "http",
+            tracing.SPAN_KIND_SERVER, {
+                "http.method": request.method,
+                "http.target": request.get_full_path(),
+            }
+        )
+        request.trace = trace
+        tracing.current_trace.set(trace)
+        connection.execute_wrappers.append(tracing.trace_sql)
+        try:
+            response = self.get_response(request)
+        except BaseException as error:
+            self.finish(trace, root, error)
+            raise
+        finally:
+            # the stream adds the wrapper again in the thread that sends it
+            connection.execute_wrappers.remove(tracing.trace_sql)
+        root.attributes["http.status_code"] = response.status_code
+        if response.streaming:
+            # the spans of the stream are recorded until it is sent
+            response.streaming_content = self.stream(
+                response.streaming_content, trace, root
+            )
+        else:
+            self.finish(trace, root)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        trace = getattr(request, "trace", None)
+        if trace is not None:
+            request.trace_view = trace.start_span(
+                f"view {view_func.__name__}", "view"
+            )
+
+    def process_template_response(self, request, response):
+        """Start the span of render, it ends after the render."""
+        trace = getattr(request, "trace", None)
+        if trace is not None:
+            trace.end_span(getattr(request, "trace_view", None))
+            span = trace.start_span("render", "render")
+            response.add_post_render_callback(
+                lambda response: trace.end_span(span)
+            )
+        return response
+
+    def stream(self, content, trace, root):
+        # statements of the stream are traced in the thread that sends it
+        error = None
+        tracing.current_trace.set(trace)
+        try:
+            with connection.execute_wrapper(tracing.trace_sql):
+                yield from content
+        except BaseException as exception:
+            error = exception
+            raise
+        finally:
+            self.finish(trace, root, error)
+
+    @staticmethod
+    def finish(trace, root, error=None):
+        """End the trace and write it to 'TRACING_FILE'."""
+        tracing.current_trace.set(None)
+        for span in list(reversed(trace.stack)):
+            trace.end_span(span, error if span is root else None)
+        tracing.write_trace(trace, settings.TRACING_FILE)
+
+
+class SlowQueryMiddleware:
+    """Captures SQL statements of requests to API that are slower than
+    'SLOW_QUERY_THRESHOLD' (ms) with the view, the parameters and
+    the plan (see api.slow_queries). The middleware is not used if
+    the threshold is 0.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_THRESHOLD:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith("/api/"):
+            return self.get_response(request)
+
+        recorder = slow_queries.SlowQueryRecorder(request.path)
+        request.slow_query_recorder = recorder
+        connection.execute_wrappers.append(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            connection.execute_wrappers.remove(recorder)
+        if response.streaming:
+            # statements of the stream are captured until it is sent
+            response.streaming_content = self.stream(
+                response.streaming_content, recorder
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        recorder = getattr(request, "slow_query_recorder", None)
+        if recorder is not None:
+            recorder.view = f"{view_func.__module__}.{view_func.__name__}"
+
+    def stream(self, content, recorder):
+        # statements of the stream are captured in the thread that sends it
+        with connection.execute_wrapper(recorder):
+            yield from content
+
+
+class ProfilingMiddleware:
+    """Profiles requests to API on demand (see api.profiling):
+    a request with the header 'X-Profile-Token: <PROFILING_TOKEN>'
+    or the next requests of admin toggles. The middleware is not used
+    if 'PROFILING_ENABLED' is false.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.toggles = profiling.AdminToggles()
+
+    def __call__(self, request):
+        if not request.path.startswith("/api/"):
+            return self.get_response(request)
+        if profiling.has_profiling_token(request):
+            trigger = "header"
+        elif self.toggles.take(request.path):
+            trigger = "admin"
+        else:
+            return self.get_response(request)
+        return profiling.profile_request(request, self.get_response, trigger)
@@ -0,0 +1,146 @@
+import json
+import time
+import urllib.request
+from typing import Union
+
+from django.db import transaction
+from django.utils import timezone
+
+# Delivery of outbox events to other systems. #
+from comments.models import OutboxEvent
+
+# seconds to wait after the first failure of the sink, the pause is
+# doubled after every next failure up to RETRY_MAX_BACKOFF
+RETRY_BACKOFF = 1
+RETRY_MAX_BACKOFF = 60
+
+
+class FileSink:
+    """Sink that appends events to a local file, one JSON per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def send(self, events: list):
+        with open(self.path, "a") as file:
+            file.writelines(json.dumps(event) + "\n" for event in events)
+
+
+class HttpSink:
+    """Sink that sends events to a URL by one POST request per batch
+    with JSON list of events. Any status except 2xx is an error.
+    """
+
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, events: list):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(events).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def get_sink(sink: str) -> Union[FileSink, HttpSink]:
+    """Return sink by its address:
+        file:<path> - local file
+        http://... or https://... - HTTP endpoint
+    """
+    if sink.startswith(("http://", "https://")):
+        return HttpSink(sink)
+    if sink.startswith("file:"):
+        return FileSink(sink[len("file:"):])
+    raise ValueError(f"Unknown sink '{sink}'")
+
+
+def dispatch_batch(sink, batch_size: int) -> (int, Union[float, None]):
+    """Deliver the oldest events to the sink and delete them.
+    Locked events are skipped, so several dispatchers can work together.
+    If the sink fails, the events stay in the outbox.
+
+    :param sink: sink for events
+    :param batch_size: how many events to deliver at once
+    :type batch_size: int
+
+    :return: count of delivered events and lag of the oldest of them
+     in seconds (None if there were no events)
+    :rtype: (int, float | None)
+    """
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return 0, None
+        sink.send([
+            {
+                "id": event.id,
+                "event_type": event.event_type,
+                "created_date": event.created_date.isoformat(),
+                "payload": event.payload,
+            }
+            for event in events
+        ])
+        OutboxEvent.objects.filter(
+            id__in=[event.id for event in events]
+        ).delete()
+    lag = (timezone.now() - events[0].created_date).total_seconds()
+    return len(events), lag
+
+
+def dispatch(sink, batch_size: int, interval: float, once: bool,
+             report=print, retries: Union[int, None] = None):
+    """Deliver events by batches until the outbox is empty (once)
+    or forever. Lag and throughput are reported after every batch.
+    If the sink fails (e.g. timeout of HTTP or error of file), the error
+    is reported and the batch is retried after a growing pause.
+
+    :param sink: sink for events
+    :param batch_size: how many events to deliver at once
+    :param interval: seconds to wait when the outbox is empty
+    :param once: stop when the outbox is empty
+    :param report: function for reporting
+    :param retries: how many failures in a row are retried
+     (None - retry forever)
+
+    :raises OSError: if the sink failed more than 'retries' times in a row
+    """
+    started = time.perf_counter()
+    delivered = failures = 0
+    while True:
+        batch_started = time.perf_counter()
+        try:
+            count, lag = dispatch_batch(sink, batch_size)
+        except OSError as error:
+            failures += 1
+            if retries is not None and failures > retries:
+                raise
+            backoff = min(
+                RETRY_BACKOFF * 2 ** (failures - 1), RETRY_MAX_BACKOFF
+            )
+            report(
+                f"Sink failed ({type(error).__name__}: {error}), "
+                f"retry in {backoff}s."
+            )
+            time.sleep(backoff)
+            continue
+        failures = 0
+        if not count:
+            if once:
+                break
+            time.sleep(interval)
+            continue
+        delivered += count
+        duration = time.perf_counter() - batch_started
+        report(
+            f"Delivered {count} events in {duration * 1000:.1f}ms, "
+            f"lag {lag:.3f}s, throughput "
+            f"{delivered / (time.perf_counter() - started):.1f} events/s"
+        )
+    report(f"Delivered events: {delivered}.")
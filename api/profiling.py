@@ -0,0 +1,236 @@
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import StrIndex
+
+from comments.models import ProfilingToggle
+
+# On-demand profiling of API requests (api.middleware.ProfilingMiddleware). #
+# A request is profiled if it has the header 'X-Profile-Token' with
+# 'PROFILING_TOKEN' or if an admin toggle (ProfilingToggle) has remaining
+# requests for its path. cProfile and tracemalloc run around the request,
+# the profile (<id>.prof) and the summary with the top allocation sites
+# (<id>.json) are written to 'PROFILING_DIR', the id is returned in
+# the 'X-Profile-Id' header. The render_profile command renders them.
+
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# tracemalloc traces all threads, so only one request of the process
+# is profiled at once
+_profile_lock = threading.Lock()
+
+
+def has_profiling_token(request) -> bool:
+    """Return True if the request has the valid profiling token."""
+    token = request.META.get("HTTP_X_PROFILE_TOKEN", "")
+    return bool(token and settings.PROFILING_TOKEN) and hmac.compare_digest(
+        token.encode(), settings.PROFILING_TOKEN.encode()
+    )
+
+
+class AdminToggles:
+    """Remaining requests of admin toggles. The prefixes of toggles
+    with remaining requests are read from database at most once per
+    'PROFILING_POLL_INTERVAL' seconds, other requests don't query them.
+    """
+
+    def __init__(self):
+        self.checked = None
+        self.prefixes = []
+
+    def take(self, path: str) -> bool:
+        """Take a request of the toggle for the path.
+
+        :return: True if the request must be profiled
+        :rtype: bool
+        """
+        now = time.monotonic()
+        if self.checked is None or \
+                now - self.checked >= settings.PROFILING_POLL_INTERVAL:
+            self.checked = now
+            self.prefixes = list(ProfilingToggle.objects.filter(
+                remaining__gt=0
+            ).values_list("path_prefix", flat=True))
+        if not any(path.startswith(prefix) for prefix in self.prefixes):
+            return False
+        # the toggle is decremented by one statement, so processes
+        # together profile exactly 'remaining' requests
+        toggles = ProfilingToggle.objects.annotate(
+            prefix_position=StrIndex(Value(path), F("path_prefix"))
+        ).filter(remaining__gt=0, prefix_position=1)
+        taken = ProfilingToggle.objects.filter(
+            pk__in=toggles.order_by("id").values("pk")[:1],
+            remaining__gt=0,
+        ).update(remaining=F("remaining") - 1)
+        return bool(taken)
+
+
+def profile_request(request, get_response, trigger: str):
+    """Return the response of request and write its profile.
+    The request is not profiled while another request is profiled.
+
+    :param trigger: what requested the profile, 'header' or 'admin'
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return get_response(request)
+    try:
+        now = datetime.now(timezone.utc)
+        profile_id = f"{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        # tracemalloc can already be started, e.g. by PYTHONTRACEMALLOC
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(settings.PROFILING_TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+            duration = (time.perf_counter() - started) * 1000
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+        write_profile(profile_id, profiler, snapshot, {
+            "id": profile_id,
+            "time": datetime.now(timezone.utc).isoformat(),
+            "trigger": trigger,
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "streaming": response.streaming,
+            "duration": round(duration, 3),
+            "peak_memory": peak,
+        })
+        response[PROFILE_ID_HEADER] = profile_id
+        return response
+    finally:
+        _profile_lock.release()
+
+
+def write_profile(profile_id: str, profiler: cProfile.Profile,
+                  snapshot: tracemalloc.Snapshot, summary: dict):
+    """Write the profile and the summary with the top allocation sites."""
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILING_DIR, profile_id)
+    profiler.dump_stats(f"{path}.prof")
+
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, cProfile.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+    statistics = snapshot.statistics("lineno")
+    summary["allocated"] = sum(statistic.size for statistic in statistics)
+    summary["allocations"] = [{
+        "file": statistic.traceback[0].filename,
+        "line": statistic.traceback[0].lineno,
+        "size": statistic.size,
+        "count": statistic.count,
+    } for statistic in statistics[:settings.PROFILING_TOP_ALLOCATIONS]]
+    with open(f"{path}.json", "w") as file:
+        json.dump(summary, file, indent=2)
+
+
+def list_profiles(directory: str) -> list:
+    """Return summaries of profiles of the directory, newer first."""
+    summaries = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name)) as file:
+                summaries.append(json.load(file))
+    return summaries
+
+
+def load_profile(directory: str, profile_id: str) -> (dict, pstats.Stats):
+    """Return the summary and the statistics of profile.
+
+    :raise FileNotFoundError: if there is no profile with the id
+
+    :rtype: (dict, pstats.Stats)
+    """
+    path = os.path.join(directory, os.path.basename(profile_id))
+    with open(f"{path}.json") as file:
+        summary = json.load(file)
+    return summary, pstats.Stats(f"{path}.prof", stream=io.StringIO())
+
+
+def get_function_name(function: tuple) -> str:
+    """Return name of pstats function with short path of its file."""
+    filename, line, name = function
+    if filename == "~":
+        # built-in function
+        return name
+    base = str(settings.BASE_DIR) + os.sep
+    if filename.startswith(base):
+        filename = filename[len(base):]
+    elif "site-packages" + os.sep in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[1]
+    return f"{name} ({filename}:{line})"
+
+
+def get_call_tree(stats: pstats.Stats, max_depth: int = 30,
+                  min_percent: float = 1.0) -> list:
+    """Return lines of the call tree: every line is the share of
+    the total time, the cumulative time in ms and the function.
+    Calls that take less than 'min_percent' of the total time are
+    not shown. cProfile keeps only pairs of caller and callee, so
+    a recursive function is shown once with callees of all its levels
+    (e.g. the chain of middlewares).
+
+    :rtype: list
+    """
+    callees = {}
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        for caller, values in callers.items():
+            # the cumulative time of the calls from this caller
+            callees.setdefault(caller, []).append((values[3], function))
+    # a root is called from outside of the profile, e.g. the first
+    # middleware, its calls are more than the calls from its callers
+    roots = sorted((
+        (row[3], function) for function, row in stats.stats.items()
+        if row[1] > sum(values[0] for values in row[4].values())
+    ), reverse=True)
+    total = sum(cumulative for cumulative, _ in roots) or 1
+    lines = []
+
+    def add_call(cumulative: float, function: tuple, path: tuple):
+        percent = cumulative / total * 100
+        if percent < min_percent:
+            return
+        lines.append(
+            f"{'  ' * len(path)}{percent:5.1f}% {cumulative * 1000:9.2f}ms  "
+            f"{get_function_name(function)}"
+        )
+        if len(path) >= max_depth:
+            return
+        for child in sorted(callees.get(function, []), reverse=True):
+            if child[1] not in path:
+                add_call(*child, path + (function,))
+
+    for root in roots:
+        add_call(*root, ())
+    return lines
+
+
+def get_top_functions(stats: pstats.Stats, sort: str = "cumulative",
+                      limit: int = 20) -> str:
+    """Return the pstats table of the top functions."""
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
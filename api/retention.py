@@ -0,0 +1,281 @@
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Union
+from uuid import UUID
+
+from django.db import connection, transaction
+
+from api.snapshots import (delete_tree_snapshots, get_ancestors_of_comments,
+                           snapshots_enabled)
+from comments.models import Comment, EntityParticipant, EntitySummary
+
+# Retention purge of old comments. #
+
+
+def get_replication_lag() -> float:
+    """Return the maximal replay lag of replicas in seconds
+    (0 if there are no replicas or the lag is not visible).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COALESCE(MAX(EXTRACT(EPOCH FROM replay_lag)), 0) "
+            "FROM pg_stat_replication"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def get_subtrees(roots: list) -> list:
+    """Return the comments and all their replies as rows
+    (uuid_comment, parent_entity).
+
+    :param roots: uuid values of comments
+    :type roots: list
+
+    :rtype: list
+    """
+    table = Comment._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH RECURSIVE subtree AS (
+                SELECT uuid_comment, parent_entity
+                FROM {table}
+                WHERE uuid_comment = ANY(%s)
+                UNION
+                SELECT comment.uuid_comment, comment.parent_entity
+                FROM {table} AS comment
+                JOIN subtree ON comment.parent_entity = subtree.uuid_comment
+            )
+            SELECT uuid_comment, parent_entity FROM subtree
+            """,
+            [roots]
+        )
+        return cursor.fetchall()
+
+
+def get_subtree_sizes(rows: list) -> dict:
+    """Return the count of comments in the subtree of every comment
+    from rows (uuid_comment, parent_entity) that has no parent in rows.
+
+    :rtype: dict
+    """
+    children = {}
+    for uuid_comment, parent_entity in rows:
+        children.setdefault(parent_entity, []).append(uuid_comment)
+    comments = {uuid_comment for uuid_comment, _ in rows}
+
+    sizes = {}
+    for uuid_comment, parent_entity in rows:
+        if parent_entity in comments:
+            continue
+        size, stack = 0, [uuid_comment]
+        while stack:
+            size += 1
+            stack.extend(children.get(stack.pop(), []))
+        sizes[uuid_comment] = (parent_entity, size)
+    return sizes
+
+
+def update_summaries(entities: list):
+    """Recompute the participants and the latest comment of entity
+    summaries from the remaining comments. The participants without
+    remaining comments of the entity are deleted.
+
+    :param entities: parent entities of deleted comments
+    :type entities: list
+    """
+    comments = Comment._meta.db_table
+    participants = EntityParticipant._meta.db_table
+    summary = EntitySummary._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            DELETE FROM {participants} AS participant
+            WHERE participant.parent_entity = ANY(%s)
+            AND NOT EXISTS (
+                SELECT 1 FROM {comments} AS comment
+                WHERE comment.parent_entity = participant.parent_entity
+                AND comment.user_id = participant.user_id
+            )
+            """,
+            [entities]
+        )
+        cursor.execute(
+            f"""
+            UPDATE {summary} SET
+                participants_count = (
+                    SELECT count(*) FROM {participants} AS participant
+                    WHERE participant.parent_entity = {summary}.parent_entity
+                ),
+                latest_comment_id = latest.uuid_comment,
+                latest_created_date = latest.created_date
+            FROM unnest(%s::uuid[]) AS purged (parent_entity)
+            LEFT JOIN LATERAL (
+                SELECT uuid_comment, created_date FROM {comments}
+                WHERE parent_entity = purged.parent_entity
+                ORDER BY created_date DESC, uuid_comment DESC
+                LIMIT 1
+            ) AS latest ON TRUE
+            WHERE {summary}.parent_entity = purged.parent_entity
+            """,
+            [entities]
+        )
+
+
+def purge_batch(cutoff: datetime, after: Union[UUID, None],
+                batch_size: int) -> (int, Union[UUID, None]):
+    """Delete the next comments created before cutoff in the order
+    of primary key together with all their replies. The counts of
+    replies of the remaining parents and the entity summaries with
+    their participants are updated in the same transaction, the
+    snapshots of the deleted trees and of their ancestors are deleted
+    after it is committed.
+
+    :param cutoff: comments created before it are deleted
+    :param after: primary key of the last comment of previous batch
+    :param batch_size: how many old comments to delete at once
+     (replies are not counted)
+
+    :return: count of deleted comments and primary key of the last
+     old comment of the batch (None if there are no old comments)
+    :rtype: (int, UUID | None)
+    """
+    with transaction.atomic():
+        queryset = Comment.objects.filter(created_date__lt=cutoff)
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after)
+        roots = list(
+            queryset.order_by("pk").values_list("pk", flat=True)[:batch_size]
+        )
+        if not roots:
+            return 0, None
+
+        rows = get_subtrees(roots)
+        uuids = [uuid_comment for uuid_comment, _ in rows]
+        counts = Counter(parent_entity for _, parent_entity in rows)
+        entities = sorted(counts)
+        # new comments of the entities wait for the purge
+        list(EntitySummary.objects.filter(
+            parent_entity__in=entities
+        ).order_by("pk").select_for_update().values_list("pk", flat=True))
+
+        # replies of comments that are not deleted
+        sizes = get_subtree_sizes(rows)
+        parents = set(Comment.objects.filter(
+            pk__in=[parent for parent, _ in sizes.values()]
+        ).values_list("pk", flat=True))
+        for parent, size in sizes.values():
+            if parent in parents:
+                Comment.add_reply_counts(parent, -1, -size)
+
+        if snapshots_enabled():
+            # the trees of deleted comments and of their ancestors
+            trees = uuids + get_ancestors_of_comments(parents)
+            transaction.on_commit(lambda: delete_tree_snapshots(trees))
+
+        values = ", ".join(["(%s::uuid, %s)"] * len(counts))
+        summary = EntitySummary._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {summary} SET comments_count = "
+                f"GREATEST({summary}.comments_count - purged.count, 0) "
+                f"FROM (VALUES {values}) AS purged (parent_entity, count) "
+                f"WHERE {summary}.parent_entity = purged.parent_entity",
+                [value for item in counts.items() for value in item]
+            )
+            cursor.execute(
+                f"DELETE FROM {Comment._meta.db_table} "
+                f"WHERE uuid_comment = ANY(%s)",
+                [uuids]
+            )
+            deleted = cursor.rowcount
+        update_summaries(entities)
+    return deleted, roots[-1]
+
+
+def load_checkpoint(path: str) -> Union[dict, None]:
+    """Return the saved progress of purge or None."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        checkpoint = json.load(file)
+    return {
+        "cutoff": datetime.fromisoformat(checkpoint["cutoff"]),
+        "after": UUID(checkpoint["after"]) if checkpoint["after"] else None,
+        "deleted": checkpoint["deleted"],
+    }
+
+
+def save_checkpoint(path: str, cutoff: datetime, after: Union[UUID, None],
+                    deleted: int):
+    """Save the progress of purge, the file is replaced atomically."""
+    with open(f"{path}.tmp", "w") as file:
+        json.dump({
+            "cutoff": cutoff.isoformat(),
+            "after": str(after) if after else None,
+            "deleted": deleted,
+        }, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def purge(cutoff: datetime, batch_size: int, sleep: float, max_lag: float,
+          checkpoint: Union[str, None], report=print) -> int:
+    """Delete comments created before cutoff by batches.
+    The progress is saved to the checkpoint file after every batch,
+    a purge with the checkpoint continues from it with its cutoff.
+    Before every batch the purge waits while the replication lag
+    is more than max_lag.
+
+    :param cutoff: comments created before it are deleted
+    :param batch_size: how many old comments to delete at once
+    :param sleep: seconds to sleep between batches
+    :param max_lag: maximal replication lag in seconds (None - no limit)
+    :param checkpoint: path of the checkpoint file (None - no checkpoint)
+    :param report: function for reporting
+
+    :return: count of deleted comments
+    :rtype: int
+    """
+    after, deleted = None, 0
+    saved = load_checkpoint(checkpoint) if checkpoint else None
+    if saved is not None:
+        cutoff, after, deleted = (
+            saved["cutoff"], saved["after"], saved["deleted"]
+        )
+        report(f"Resume from {after}, deleted comments: {deleted}.")
+
+    started = time.perf_counter()
+    batch_deleted = 0
+    while True:
+        while max_lag is not None:
+            lag = get_replication_lag()
+            if lag <= max_lag:
+                break
+            report(f"Replication lag {lag:.1f}s, waiting.")
+            time.sleep(max(sleep, 1))
+
+        batch_started = time.perf_counter()
+        count, last = purge_batch(cutoff, after, batch_size)
+        if last is None:
+            break
+        after = last
+        deleted += count
+        batch_deleted += count
+        if checkpoint:
+            save_checkpoint(checkpoint, cutoff, after, deleted)
+        duration = time.perf_counter() - batch_started
+        report(
+            f"Deleted {count} comments in {duration * 1000:.1f}ms, "
+            f"{count / duration:.0f} rows/s, total {deleted}, "
+            f"throughput {batch_deleted / (time.perf_counter() - started):.0f}"
+            f" rows/s"
+        )
+        time.sleep(sleep)
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    report(f"Deleted comments: {deleted}.")
+    return deleted
@@ -15,4 +15,4 @@ class CommentListSerializer(ModelSerializer):
 
     class Meta:
         model = Comment
-        fields = "__all__"
+        exclude = ("search_vector",)
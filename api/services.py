@@ -1,15 +1,37 @@
+import base64
+import binascii
+import hashlib
+import json
+import time
 import uuid
 from collections import OrderedDict
-from datetime import datetime
-from typing import Union
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, Union
 from uuid import UUID
 
-from rest_framework.exceptions import APIException
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core import signing
+from django.core.paginator import InvalidPage
+from django.db import connection
+from django.db.models import Count, F, FloatField, Q, Sum, Window
+from django.db.models.functions import Cast, RowNumber
+from rest_framework.exceptions import APIException, NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 # Services for check and get data to views. #
-from comments.models import Comment, EntityType, User
+from api.tracing import traced
+from comments import hyperloglog
+from comments.models import (Comment, EntityDailyStats, EntitySummary,
+                             EntityType, IdempotencyKey, User, UserDailyStats)
+
+CHILD_COMMENTS_TOKEN_SALT = "api.child-comments"
+FIRST_LEVEL_BATCH_MAX_ENTITIES = 100
+SUMMARIES_MAX_ENTITIES = 1000
+CHILD_COMMENTS_STREAM_CHUNK = 500
+SEARCH_CURSOR_SALT = "api.search-comments"
 
 
 def is_uuid(check_uuid: str) -> bool:
@@ -29,6 +51,7 @@ def is_uuid(check_uuid: str) -> bool:
         return False
 
 
+@traced
 def is_valid_comment_request(data: dict) -> (bool, str):
     """Returns True if request's data is valid and False otherwise.
     Also returns exceptions message if data is not valid.
@@ -71,6 +94,192 @@ def is_valid_comment_request(data: dict) -> (bool, str):
     return True, ""
 
 
+@traced
+def get_payload_fingerprint(data: dict) -> UUID:
+    """Return the fingerprint of new comment's data (md5 of it)
+    to compare the retry with the request that used the key.
+    """
+    payload = json.dumps([
+        str(data["author"]), str(data["text"]),
+        str(data["parent_entity_uuid"]), str(data["parent_entity_type"]),
+    ])
+    return UUID(hashlib.md5(payload.encode()).hexdigest())
+
+
+@traced
+def create_comment(data: dict, idempotency_key: str = None) -> \
+        (Union[Comment, None], str):
+    """Adds new comment to database in one query. The author is found
+    by uuid or nickname and the parent entity type by id or name inside
+    the insert, the other tables are updated by the same statement
+    (see 'Comment.get_insert_effects_sql'). If the comment was not
+    inserted, the exception message is chosen by what was not found.
+
+    With idempotency_key the key of the author is claimed by the same
+    statement and the comment is inserted only if the key is new or
+    expired, so the retry adds only the lookup of the key's primary key.
+    The retry must have the same data as the request that used the key.
+
+    :param data: new comment's data that adding to database
+    :type data: dict
+    :param idempotency_key: value of Idempotency-Key header
+    :type idempotency_key: str
+
+    :raises UnprocessableExceptionIdempotencyKey: if the key was used
+     with other data
+
+    :rtype: (Comment | None, str)
+    :return: the new comment (None if data is not valid or the comment
+     was already created with idempotency_key) and exception message
+     if it is required (empty for the retry)
+    """
+
+    # checking the availability of keys
+    for key in ["author", "text", "parent_entity_uuid", "parent_entity_type"]:
+        if key not in data:
+            return None, f"The '{key}' field was not found!"
+    if not is_uuid(data["parent_entity_uuid"]):
+        # the message depends on the author, so it is checked as usual
+        return None, is_valid_comment_request(data)[1]
+
+    author, entity_type = data["author"], data["parent_entity_type"]
+    if is_uuid(author):
+        author_where = "uuid_user = %s::uuid"
+    else:
+        author_where = "nickname = %s"
+    if str(entity_type).isdigit():
+        entity_type_where = "id = %s::bigint"
+    else:
+        entity_type_where = "name = %s"
+
+    comment = Comment(
+        created_date=datetime.now(tz=timezone.utc),
+        # the text is converted as 'TextField' does it in 'Comment.save'
+        text=Comment._meta.get_field("text").to_python(data["text"]),
+        parent_entity=UUID(data["parent_entity_uuid"]),
+    )
+    claimed_sql, claimed_where = "", ""
+    claimed_select = "true, NULL::uuid"
+    claimed_params = []
+    fingerprint = None
+    if idempotency_key:
+        # the key is md5 of the author and the value, it is overwritten
+        # only if it is expired, a concurrent request with the same key
+        # waits for the first one here; the kept row is returned too,
+        # so the retry is compared with the data of the first request
+        table = IdempotencyKey._meta.db_table
+        fingerprint = get_payload_fingerprint(data)
+        claimed_sql = f"""claimed AS (
+            INSERT INTO {table} AS claimed
+            (key, created_date, uuid_comment, fingerprint)
+            SELECT md5(author.uuid_user::text || %s)::uuid, %s, %s, %s
+            FROM author, entity_type
+            ON CONFLICT (key) DO UPDATE SET
+                created_date = CASE WHEN claimed.created_date < %s
+                    THEN EXCLUDED.created_date
+                    ELSE claimed.created_date END,
+                uuid_comment = CASE WHEN claimed.created_date < %s
+                    THEN EXCLUDED.uuid_comment
+                    ELSE claimed.uuid_comment END,
+                fingerprint = CASE WHEN claimed.created_date < %s
+                    THEN EXCLUDED.fingerprint
+                    ELSE claimed.fingerprint END
+            RETURNING uuid_comment = %s AS taken, fingerprint
+        ), """
+        claimed_where = "WHERE (SELECT taken FROM claimed)"
+        claimed_select = (
+            "COALESCE((SELECT taken FROM claimed), false), "
+            "(SELECT fingerprint FROM claimed)"
+        )
+        expired = comment.created_date - timedelta(
+            seconds=settings.IDEMPOTENCY_KEY_TTL
+        )
+        claimed_params = [
+            f":{idempotency_key}", comment.created_date,
+            comment.uuid_comment, fingerprint, expired, expired, expired,
+            comment.uuid_comment,
+        ]
+    sql = f"""
+        WITH RECURSIVE author AS (
+            SELECT uuid_user, nickname, firstname
+            FROM {User._meta.db_table}
+            WHERE {author_where}
+        ), entity_type AS (
+            SELECT id, name, description
+            FROM {EntityType._meta.db_table}
+            WHERE {entity_type_where}
+            ORDER BY id
+            LIMIT 1
+        ), {claimed_sql}new_comment AS (
+            INSERT INTO {Comment._meta.db_table}
+            (uuid_comment, created_date, user_id, text, parent_entity,
+             parent_entity_type_id, search_vector, reply_count,
+             descendant_count)
+            SELECT %s, %s, author.uuid_user, %s, %s, entity_type.id,
+                   to_tsvector(%s::regconfig, COALESCE(%s, '')), 0, 0
+            FROM author, entity_type
+            {claimed_where}
+            RETURNING uuid_comment, created_date, user_id, text,
+                      parent_entity, parent_entity_type_id
+        ), {Comment.get_insert_effects_sql()}
+        SELECT author.uuid_user, author.nickname, author.firstname,
+               entity_type.id, entity_type.name, entity_type.description,
+               {claimed_select},
+               ARRAY(SELECT uuid_comment FROM ancestors ORDER BY depth)
+        FROM (SELECT 1) AS request
+        LEFT JOIN author ON true
+        LEFT JOIN entity_type ON true
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            str(author), str(entity_type), *claimed_params,
+            comment.uuid_comment, comment.created_date, comment.text,
+            comment.parent_entity, settings.COMMENT_SEARCH_CONFIG,
+            comment.text
+        ])
+        (uuid_user, nickname, firstname, entity_type_id, name, description,
+         claimed, claimed_fingerprint, ancestors) = cursor.fetchone()
+
+    if uuid_user is None:
+        return None, f"The user '{author}' was not found"
+    if entity_type_id is None:
+        return None, "The parent_entity_type was not found"
+    if not claimed:
+        # the keys saved without fingerprint are not compared
+        if claimed_fingerprint is not None and \
+                UUID(str(claimed_fingerprint)) != fingerprint:
+            raise UnprocessableExceptionIdempotencyKey
+        return None, ""
+
+    comment.user = User(
+        uuid_user=uuid_user, nickname=nickname, firstname=firstname
+    )
+    comment.parent_entity_type = EntityType(
+        id=entity_type_id, name=name, description=description
+    )
+    for instance in (comment, comment.user, comment.parent_entity_type):
+        instance._state.adding = False
+        instance._state.db = connection.alias
+    comment.ancestors = ancestors
+    return comment, ""
+
+
+@traced
+def get_database_latency() -> float:
+    """Return the duration of the simplest query to database in ms.
+
+    :raises DatabaseError: if database is not available
+
+    :rtype: float
+    """
+    started = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+    return (time.perf_counter() - started) * 1000
+
+
+@traced
 def get_user(user_value: str) -> Union[User, None]:
     """Check user exist and return User instance (if user exist)
     and None otherwise.
@@ -95,6 +304,7 @@ def get_user(user_value: str) -> Union[User, None]:
             return User.objects.get(nickname=user_value)
 
 
+@traced
 def get_date(date: str) -> Union[datetime, None]:
     """Check format of date and convert str to datetime.
     Need date format:
@@ -114,6 +324,7 @@ def get_date(date: str) -> Union[datetime, None]:
         return None
 
 
+@traced
 def get_comments_queryset_user_with_filtered(
         user: User,
         start_date: Union[str, datetime],
@@ -155,6 +366,7 @@ def get_comments_queryset_user_with_filtered(
         )
 
 
+@traced
 def get_comments_queryset_entity_with_filtered(
         entity_uuid: uuid.uuid4,
         start_date: Union[str, datetime],
@@ -196,6 +408,37 @@ def get_comments_queryset_entity_with_filtered(
         )
 
 
+def get_comment_dict(comment: Comment) -> dict:
+    """Return presentation of comment for the tree of comments
+    (without the 'child' field):
+        {
+          "uuid_comment": <uuid>,
+          "created_date": <datetime>,
+          "user": <str>,
+          "parent_entity": <str>,
+          "parent_entity_type": <str>,
+          "text": <str>
+        }
+
+    :param comment: the comment to present
+    :type comment: Comment
+
+    :rtype: dict
+    """
+    return {
+        "uuid_comment": comment.uuid_comment,
+        "created_date": comment.created_date,
+        "user": comment.user.nickname if comment.user else None,
+        "parent_entity": str(comment.parent_entity),
+        "parent_entity_type": (
+            comment.parent_entity_type.name
+            if comment.parent_entity_type else None
+        ),
+        "text": comment.text,
+    }
+
+
+@traced
 def get_all_child_comments(entity: str) -> list:
     """Return list of all comments, that was written for
     certain entity.
@@ -216,21 +459,938 @@ def get_all_child_comments(entity: str) -> list:
         :return: list of all comments for this entity
         :rtype: list
     """
-    child_comments_list = []
-    child_comments = Comment.objects.filter(parent_entity=UUID(entity))
-    for child_comment in child_comments:
-        child_comments_list.append({
-            "uuid_comment": child_comment.uuid_comment,
-            "created_date": child_comment.created_date,
-            "user": child_comment.user.nickname,
-            "parent_entity": str(child_comment.parent_entity),
-            "parent_entity_type": child_comment.parent_entity_type.name,
-            "text": child_comment.text,
-            "child": get_all_child_comments(str(child_comment.uuid_comment))
-        })
+    child_comments_list, _ = get_child_comments_tree(UUID(entity))
     return child_comments_list
 
 
+@traced
+def get_tree_limits(params) -> (Union[dict, None], str):
+    """Returns the limits of a comment tree from request's parameters.
+    Also returns exceptions message if parameters are not valid.
+    Parameters that were not given are returned as None (no limit).
+        max_depth - how many levels below the root to load (>= 0);
+        limit - how many newest replies to load for each node (>= 1);
+        budget - how many comments to load for the whole response (>= 1,
+        a response without comments would return the same token).
+
+    :param params: query parameters of request
+    :type params: QueryDict
+
+    :rtype: (dict | None, str)
+    :return: limits of tree and exception message if it is required
+    """
+    limits = {}
+    for key, minimum in (("max_depth", 0), ("limit", 1), ("budget", 1)):
+        value = params.get(key, None)
+        if value is None:
+            limits[key] = None
+        elif not value.isdigit() or int(value) < minimum:
+            return None, f"The {key} must be an integer >= {minimum}"
+        else:
+            limits[key] = int(value)
+    return limits, ""
+
+
+@traced
+def get_child_comment_rows(
+        parents: list,
+        limit: Union[int, None] = None,
+        after: Union[tuple, None] = None,
+        max_rows: Union[int, None] = None
+) -> list:
+    """Return rows of child comments for all parents in one query.
+    The replies of every parent are numbered from newer to older
+    and the rows are ordered by this number, so the first rows contain
+    the newest replies of every parent.
+    Every row looks like this:
+        (uuid_comment, created_date, nickname, parent_entity,
+         parent_entity_type name, text, row_number)
+
+    :param parents: uuid values of parent entities
+    :type parents: list
+
+    :param limit: how many replies to load for each parent. One more reply
+     is loaded to find out that the parent has more replies
+    :type limit: int | None
+
+    :param after: (created_date, uuid_comment) of the last loaded reply,
+     only older replies are returned
+    :type after: tuple | None
+
+    :param max_rows: how many rows to load at most
+    :type max_rows: int | None
+
+    :return: list of rows
+    :rtype: list
+    """
+    queryset = Comment.objects.filter(parent_entity__in=parents)
+    if after is not None:
+        created_date, uuid_comment = after
+        queryset = queryset.filter(
+            Q(created_date__lt=created_date) |
+            Q(created_date=created_date, uuid_comment__lt=uuid_comment)
+        )
+    queryset = queryset.annotate(
+        nickname=F("user__nickname"),
+        type_name=F("parent_entity_type__name"),
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F("parent_entity")],
+            order_by=[F("created_date").desc(), F("uuid_comment").desc()],
+        ),
+    ).values_list(
+        "uuid_comment", "created_date", "nickname", "parent_entity",
+        "type_name", "text", "row_number"
+    )
+
+    # the window function can't be filtered in the same query
+    sql, params = queryset.query.sql_with_params()
+    sql = (
+        "SELECT ranked.uuid_comment, ranked.created_date, ranked.nickname, "
+        "ranked.parent_entity, ranked.type_name, ranked.text, "
+        f"ranked.row_number FROM ({sql}) AS ranked"
+    )
+    if limit is not None:
+        sql += " WHERE ranked.row_number <= %s"
+        params = (*params, limit + 1)
+    sql += (
+        " ORDER BY ranked.row_number, ranked.created_date DESC, "
+        "ranked.uuid_comment DESC"
+    )
+    if max_rows is not None:
+        sql += " LIMIT %s"
+        params = (*params, max_rows)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+@traced
+def get_entities(
+        value: Union[str, list, None],
+        max_count: int = FIRST_LEVEL_BATCH_MAX_ENTITIES
+) -> Union[list, None]:
+    """Return unique uuid values of entities.
+
+    :param value: comma separated entities or list of them
+    :type value: str | list | None
+
+    :param max_count: how many entities are allowed
+    :type max_count: int
+
+    :return: list of UUID or None if value is not valid
+    :rtype: list | None
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list) or \
+            not all(isinstance(entity, str) for entity in value):
+        return None
+    entities = list(OrderedDict.fromkeys(value))
+    if len(entities) > max_count or \
+            not all(is_uuid(entity) for entity in entities):
+        return None
+    return [UUID(entity) for entity in entities]
+
+
+@traced
+def get_first_level_comments_batch(entities: list, limit: int) -> dict:
+    """Return the first comments and the count of comments of every
+    entity in one query. The comments of every entity are numbered
+    in the order of creation and counted with window functions.
+    Response looks like this:
+        {
+          "<uuid>": {"comments_count": <int>, "comments": [...]},
+          ...
+        }
+
+    :param entities: uuid values of entities
+    :type entities: list
+
+    :param limit: how many first comments to load for each entity
+    :type limit: int
+
+    :rtype: dict
+    """
+    queryset = Comment.objects.filter(parent_entity__in=entities).annotate(
+        nickname=F("user__nickname"),
+        type_name=F("parent_entity_type__name"),
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F("parent_entity")],
+            order_by=[F("created_date").asc(), F("uuid_comment").asc()],
+        ),
+        total=Window(
+            expression=Count("uuid_comment"),
+            partition_by=[F("parent_entity")],
+        ),
+    ).values_list(
+        "uuid_comment", "created_date", "nickname", "parent_entity",
+        "type_name", "text", "reply_count", "descendant_count",
+        "row_number", "total"
+    )
+
+    # the window function can't be filtered in the same query
+    sql, params = queryset.query.sql_with_params()
+    sql = (
+        "SELECT ranked.uuid_comment, ranked.created_date, ranked.nickname, "
+        "ranked.parent_entity, ranked.type_name, ranked.text, "
+        "ranked.reply_count, ranked.descendant_count, "
+        f"ranked.total FROM ({sql}) AS ranked "
+        "WHERE ranked.row_number <= %s "
+        "ORDER BY ranked.parent_entity, ranked.row_number"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (*params, limit))
+        rows = cursor.fetchall()
+
+    result = OrderedDict(
+        (str(entity), {"comments_count": 0, "comments": []})
+        for entity in entities
+    )
+    for uuid_comment, created_date, nickname, parent_entity, type_name, \
+            text, reply_count, descendant_count, total in rows:
+        entity = result[str(parent_entity)]
+        entity["comments_count"] = total
+        entity["comments"].append({
+            "uuid_comment": uuid_comment,
+            "created_date": created_date,
+            "user": nickname,
+            "parent_entity": str(parent_entity),
+            "parent_entity_type": type_name,
+            "text": text,
+            "reply_count": reply_count,
+            "descendant_count": descendant_count,
+        })
+    return result
+
+
+@traced
+def get_entity_summaries(entities: list) -> dict:
+    """Return summaries of entities from 'EntitySummary' in one query
+    by primary key. Entities without comments have empty summaries.
+    Response looks like this:
+        {
+          "<uuid>": {
+            "comments_count": <int>,
+            "participants_count": <int>,
+            "latest_comment": {...} | null
+          },
+          ...
+        }
+
+    :param entities: uuid values of entities
+    :type entities: list
+
+    :rtype: dict
+    """
+    summaries = EntitySummary.objects.filter(
+        parent_entity__in=entities
+    ).select_related(
+        "latest_comment__user", "latest_comment__parent_entity_type"
+    )
+    result = OrderedDict(
+        (str(entity), {
+            "comments_count": 0,
+            "participants_count": 0,
+            "latest_comment": None,
+        }) for entity in entities
+    )
+    for summary in summaries:
+        result[str(summary.parent_entity)] = {
+            "comments_count": summary.comments_count,
+            "participants_count": summary.participants_count,
+            "latest_comment": (
+                get_comment_dict(summary.latest_comment)
+                if summary.latest_comment else None
+            ),
+        }
+    return result
+
+
+@traced
+def get_child_comments_token(
+        parent: UUID,
+        last_child: Union[dict, None],
+        max_depth: Union[int, None],
+        limit: Union[int, None],
+        budget: Union[int, None]
+) -> str:
+    """Return continuation token for loading next replies of parent.
+
+    :param parent: the entity which has more replies
+    :type parent: UUID
+
+    :param last_child: the last loaded reply of parent
+    :type last_child: dict | None
+
+    :return: signed token
+    :rtype: str
+    """
+    after = None
+    if last_child is not None:
+        after = [
+            last_child["created_date"].isoformat(),
+            str(last_child["uuid_comment"])
+        ]
+    return signing.dumps(
+        {
+            "parent": str(parent),
+            "after": after,
+            "max_depth": max_depth,
+            "limit": limit,
+            "budget": budget,
+        },
+        salt=CHILD_COMMENTS_TOKEN_SALT,
+    )
+
+
+@traced
+def load_child_comments_token(token: str) -> Union[dict, None]:
+    """Check continuation token and return its data
+    or None if token is not valid.
+    The 'after' value is converted to (datetime, UUID).
+
+    :param token: token from 'next' field of comment tree
+    :type token: str
+
+    :return: data of token or None
+    """
+    try:
+        data = signing.loads(token, salt=CHILD_COMMENTS_TOKEN_SALT)
+        data["parent"] = UUID(data["parent"])
+        if data["after"] is not None:
+            created_date, uuid_comment = data["after"]
+            data["after"] = (
+                datetime.fromisoformat(created_date), UUID(uuid_comment)
+            )
+        if data["budget"] is not None and data["budget"] < 1:
+            # tokens with empty budget were issued before it was checked
+            return None
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+    return data
+
+
+@traced
+def get_child_comments_tree(
+        parent: UUID,
+        max_depth: Union[int, None] = None,
+        limit: Union[int, None] = None,
+        budget: Union[int, None] = None,
+        after: Union[tuple, None] = None
+) -> (list, Union[str, None]):
+    """Return tree of comments that was written for certain entity.
+    The tree is loaded level by level, one query per level.
+    Replies of every comment are ordered from newer to older.
+    The result list consists of the same dictionaries as in
+    'get_all_child_comments'. If a comment has more replies than
+    were loaded, it also has the field:
+        "next": <str> - token for loading the next replies
+
+    :param parent: the entity to find child comments for
+    :type parent: UUID
+
+    :param max_depth: how many levels to load (None - all levels)
+    :type max_depth: int | None
+
+    :param limit: how many newest replies to load for each comment
+     (None - all replies)
+    :type limit: int | None
+
+    :param budget: how many comments to load at all (None - all comments)
+    :type budget: int | None
+
+    :param after: (created_date, uuid_comment) of the last loaded reply
+     of parent, only older replies of parent are loaded
+    :type after: tuple | None
+
+    :return: list of comments and continuation token for parent
+     (None if all replies of parent were loaded)
+    :rtype: (list, str | None)
+    """
+    nodes = {parent: {"child": []}}
+    has_more = set()
+    frontier = [parent]
+    depth = 0
+    remaining = budget
+
+    while frontier:
+        if (max_depth is not None and depth >= max_depth) or remaining == 0:
+            # find out which of not expanded comments have replies
+            has_more.update(
+                Comment.objects.filter(parent_entity__in=frontier)
+                .values_list("parent_entity", flat=True).distinct()
+            )
+            break
+
+        # the rows are ordered by the number of the reply, so the budget
+        # is shared equally between parents. Two extra rows per parent
+        # are enough to see every parent which replies were cut off.
+        max_rows = None
+        if remaining is not None:
+            max_rows = remaining + 2 * len(frontier)
+        rows = get_child_comment_rows(
+            frontier, limit, after if depth == 0 else None, max_rows
+        )
+
+        next_frontier = []
+        for row in rows:
+            uuid_comment, created_date, nickname, parent_entity, \
+                type_name, text, row_number = row
+            if (limit is not None and row_number > limit) or \
+                    (remaining is not None and
+                     len(next_frontier) >= remaining):
+                has_more.add(parent_entity)
+                continue
+            node = {
+                "uuid_comment": uuid_comment,
+                "created_date": created_date,
+                "user": nickname,
+                "parent_entity": str(parent_entity),
+                "parent_entity_type": type_name,
+                "text": text,
+                "child": [],
+            }
+            nodes[parent_entity]["child"].append(node)
+            nodes[uuid_comment] = node
+            next_frontier.append(uuid_comment)
+
+        if remaining is not None:
+            remaining -= len(next_frontier)
+        frontier = next_frontier
+        depth += 1
+
+    parent_token = None
+    for uuid_comment in has_more:
+        children = nodes[uuid_comment]["child"]
+        if uuid_comment == parent and after is not None and not children:
+            last_child = {"created_date": after[0], "uuid_comment": after[1]}
+        else:
+            last_child = children[-1] if children else None
+        token = get_child_comments_token(
+            uuid_comment, last_child, max_depth, limit, budget
+        )
+        if uuid_comment == parent:
+            parent_token = token
+        else:
+            nodes[uuid_comment]["next"] = token
+
+    return nodes[parent]["child"], parent_token
+
+
+def get_child_comments_stream(
+        root: Comment,
+        chunk_size: int = CHILD_COMMENTS_STREAM_CHUNK
+) -> Iterator[bytes]:
+    """Return JSON of root comment with all the tree of child comments
+    by parts. The JSON is the same as the response of
+    '/api/child-comments' without limits.
+    The tree is read by one query in depth-first order (replies from
+    newer to older) through a server-side cursor, so only one chunk of
+    rows is kept in memory at a time.
+
+    :param root: the comment to get the tree for
+    :type root: Comment
+
+    :param chunk_size: how many rows to read from database at a time
+    :type chunk_size: int
+
+    :return: parts of JSON
+    :rtype: Iterator[bytes]
+    """
+    renderer = JSONRenderer()
+    separator = b"," if renderer.compact else b", "
+
+    def open_node(node: dict) -> bytes:
+        # render the node with empty 'child' and leave the list open
+        node["child"] = []
+        return renderer.render(node)[:-2]
+
+    yield open_node(get_comment_dict(root))
+
+    sql = f"""
+        WITH RECURSIVE tree AS (
+            SELECT comment.*, 1 AS depth, ARRAY[ROW_NUMBER() OVER (
+                ORDER BY comment.created_date DESC,
+                         comment.uuid_comment DESC
+            )] AS path
+            FROM {Comment._meta.db_table} AS comment
+            WHERE comment.parent_entity = %s
+            UNION ALL
+            SELECT comment.*, tree.depth + 1, tree.path || ROW_NUMBER() OVER (
+                PARTITION BY comment.parent_entity
+                ORDER BY comment.created_date DESC,
+                         comment.uuid_comment DESC
+            )
+            FROM {Comment._meta.db_table} AS comment
+            JOIN tree ON comment.parent_entity = tree.uuid_comment
+        )
+        SELECT tree.uuid_comment, tree.created_date, author.nickname,
+               tree.parent_entity, entity_type.name, tree.text, tree.depth
+        FROM tree
+        LEFT JOIN {User._meta.db_table} AS author
+            ON author.uuid_user = tree.user_id
+        LEFT JOIN {EntityType._meta.db_table} AS entity_type
+            ON entity_type.id = tree.parent_entity_type_id
+        ORDER BY tree.path
+    """
+
+    # depth of the last opened comment, the root has depth 0
+    last_depth = 0
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, [root.uuid_comment])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            parts = []
+            for row in rows:
+                uuid_comment, created_date, nickname, parent_entity, \
+                    type_name, text, depth = row
+                # close the replies of previous comments
+                parts.append(b"]}" * (last_depth - depth + 1))
+                if depth <= last_depth:
+                    parts.append(separator)
+                parts.append(open_node({
+                    "uuid_comment": uuid_comment,
+                    "created_date": created_date,
+                    "user": nickname,
+                    "parent_entity": str(parent_entity),
+                    "parent_entity_type": type_name,
+                    "text": text,
+                }))
+                last_depth = depth
+            yield b"".join(parts)
+
+    yield b"]}" * (last_depth + 1)
+
+
+def get_datetime_json_sql(column: str) -> str:
+    """Return SQL expression of datetime in the format of responses
+    (ISO 8601 in UTC with 'Z', microseconds only if they are not 0),
+    e.g. 2021-01-01T00:00:00.000001Z.
+    """
+    utc = f"({column} AT TIME ZONE 'UTC')"
+    return (
+        f"to_char({utc}, 'YYYY-MM-DD\"T\"HH24:MI:SS') || "
+        f"CASE WHEN date_trunc('second', {utc}) = {utc} THEN '' "
+        f"ELSE to_char({utc}, '.US') END || 'Z'"
+    )
+
+
+def get_comment_json_sql(alias: str, tree: bool = False) -> str:
+    """Return SQL expression of the comment of row with alias as JSON
+    object with the same keys as 'CommentListSerializer' (or as
+    'get_comment_dict' for trees, without the 'child' field).
+    The row must have the columns of the comment table.
+    """
+    user = (
+        f"(SELECT nickname FROM {User._meta.db_table} "
+        f"WHERE uuid_user = {alias}.user_id)"
+    )
+    entity_type = (
+        f"(SELECT name FROM {EntityType._meta.db_table} "
+        f"WHERE id = {alias}.parent_entity_type_id)"
+    )
+    created_date = get_datetime_json_sql(f"{alias}.created_date")
+    if tree:
+        fields = [
+            ("uuid_comment", f"{alias}.uuid_comment"),
+            ("created_date", created_date),
+            ("user", user),
+            ("parent_entity", f"{alias}.parent_entity"),
+            ("parent_entity_type", entity_type),
+            ("text", f"{alias}.text"),
+        ]
+    else:
+        fields = [
+            ("uuid_comment", f"{alias}.uuid_comment"),
+            ("user", user),
+            ("parent_entity_type", entity_type),
+            ("created_date", created_date),
+            ("text", f"{alias}.text"),
+            ("parent_entity", f"{alias}.parent_entity"),
+            ("reply_count", f"{alias}.reply_count"),
+            ("descendant_count", f"{alias}.descendant_count"),
+        ]
+    return "json_build_object({})".format(
+        ", ".join(f"'{key}', {value}" for key, value in fields)
+    )
+
+
+@traced
+def get_comments_json(queryset) -> bytes:
+    """Return JSON array of comments of queryset built by database
+    in the order of queryset.
+
+    :param queryset: queryset of comments (can be sliced)
+
+    :rtype: bytes
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT coalesce(json_agg({get_comment_json_sql('comment')}), "
+            f"'[]')::text FROM ({sql}) AS comment",
+            params
+        )
+        return cursor.fetchone()[0].encode()
+
+
+def get_child_comments_tree_json_stream(
+        root: UUID,
+        chunk_size: int = CHILD_COMMENTS_STREAM_CHUNK
+) -> Iterator[bytes]:
+    """Return the whole tree of root comment as JSON object by parts
+    with the same contract as 'get_comment_dict' with the 'child' field
+    (see 'manage_all_child_comments'). The objects of comments are
+    built by database, the tree is read by one query in depth-first
+    order (replies from newer to older) through a server-side cursor,
+    so only one chunk of rows is kept in memory at a time.
+
+    :param root: uuid of root comment
+    :type root: UUID
+
+    :param chunk_size: how many rows to read from database at a time
+    :type chunk_size: int
+
+    :return: parts of JSON, nothing if the root was not found
+    :rtype: Iterator[bytes]
+    """
+    table = Comment._meta.db_table
+    sql = f"""
+        WITH RECURSIVE tree AS (
+            SELECT {table}.*, 0 AS depth, ARRAY[]::bigint[] AS path
+            FROM {table}
+            WHERE uuid_comment = %s
+            UNION ALL
+            SELECT comment.*, tree.depth + 1, tree.path || ROW_NUMBER() OVER (
+                PARTITION BY comment.parent_entity
+                ORDER BY comment.created_date DESC,
+                         comment.uuid_comment DESC
+            )
+            FROM {table} AS comment
+            JOIN tree ON comment.parent_entity = tree.uuid_comment
+        )
+        SELECT depth, {get_comment_json_sql('tree', tree=True)}::text
+        FROM tree
+        ORDER BY path
+    """
+
+    # depth of the last opened comment, None before the root
+    last_depth = None
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, [root])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            parts = []
+            for depth, comment in rows:
+                if last_depth is not None:
+                    # close the replies of previous comments
+                    parts.append("]}" * (last_depth - depth + 1))
+                    if depth <= last_depth:
+                        parts.append(", ")
+                # the object of comment with the open list of replies
+                parts.append(comment[:-1])
+                parts.append(', "child" : [')
+                last_depth = depth
+            yield "".join(parts).encode()
+
+    if last_depth is not None:
+        yield b"]}" * (last_depth + 1)
+
+
+@traced
+def get_child_comments_tree_json(root: UUID) -> Union[bytes, None]:
+    """Return the whole tree of root comment as JSON object built
+    by database (see 'get_child_comments_tree_json_stream').
+
+    :param root: uuid of root comment
+    :type root: UUID
+
+    :return: JSON of tree or None if the root was not found
+    :rtype: bytes | None
+    """
+    return b"".join(get_child_comments_tree_json_stream(root)) or None
+
+
+@traced
+def get_search_queryset(
+        text: str,
+        entity: Union[str, None] = None,
+        user: Union[User, None] = None,
+        start_date: Union[str, datetime, None] = None,
+        end_date: Union[str, datetime, None] = None,
+        after: Union[tuple, None] = None
+):
+    """Return Comment queryset with comments which text matches
+    the search query. The comments are ranked and ordered from more
+    relevant to less relevant (with uuid_comment for equal ranks).
+    Every comment has the 'rank' attribute.
+
+    :param text: search query in web search syntax
+    :type text: str
+
+    :param entity: the entity for which comments are searching
+    :type entity: str | None
+
+    :param user: the user whose comments are searching
+    :type user: User | None
+
+    :param start_date: starting from what date to search
+    :type start_date: str | datetime | None
+
+    :param end_date: ending with what date to search
+    :type end_date: str | datetime | None
+
+    :param after: (rank, uuid_comment) of the last comment of previous
+     page, only the next comments are returned
+    :type after: tuple | None
+
+    :return: Comment queryset
+    """
+    query = SearchQuery(
+        text, config=settings.COMMENT_SEARCH_CONFIG, search_type="websearch"
+    )
+    queryset = Comment.objects.filter(search_vector=query)
+    if entity is not None:
+        queryset = queryset.filter(parent_entity=entity)
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    if start_date:
+        queryset = queryset.filter(created_date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(created_date__lte=end_date)
+
+    # the rank is real, it is cast to double to compare it with cursor
+    queryset = queryset.annotate(
+        rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+    )
+    if after is not None:
+        rank, uuid_comment = after
+        queryset = queryset.filter(
+            Q(rank__lt=rank) | Q(rank=rank, uuid_comment__gt=uuid_comment)
+        )
+    return queryset.select_related("user", "parent_entity_type").order_by(
+        "-rank", "uuid_comment"
+    )
+
+
+@traced
+def get_search_cursor(comment: Comment) -> str:
+    """Return signed cursor of the next page after the comment."""
+    return signing.dumps(
+        [comment.rank, str(comment.uuid_comment)], salt=SEARCH_CURSOR_SALT
+    )
+
+
+@traced
+def load_search_cursor(cursor: str) -> Union[tuple, None]:
+    """Check cursor and return (rank, uuid_comment)
+    or None if cursor is not valid.
+    """
+    try:
+        rank, uuid_comment = signing.loads(cursor, salt=SEARCH_CURSOR_SALT)
+        return float(rank), UUID(uuid_comment)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+@traced
+def get_watermark(comment: Comment) -> str:
+    """Return opaque watermark of comment's position.
+    Comments are ordered by (created_date, uuid_comment), the watermark
+    keeps this pair.
+
+    :param comment: the last comment that was received
+    :type comment: Comment
+
+    :rtype: str
+    """
+    value = f"{comment.created_date.isoformat()}|{comment.uuid_comment}"
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+
+@traced
+def load_watermark(watermark: str) -> Union[tuple, None]:
+    """Return (created_date, uuid_comment) from watermark
+    or None if the watermark is not valid.
+
+    :param watermark: value from 'get_watermark'
+    :type watermark: str
+
+    :rtype: tuple | None
+    """
+    try:
+        value = base64.urlsafe_b64decode(
+            watermark + "=" * (-len(watermark) % 4)
+        ).decode()
+        created_date, uuid_comment = value.split("|")
+        created_date = datetime.fromisoformat(created_date)
+        uuid_comment = UUID(uuid_comment)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if created_date.tzinfo is None:
+        return None
+    return created_date, uuid_comment
+
+
+@traced
+def get_comments_after(after: Union[tuple, None]):
+    """Return Comment queryset with comments created after the position
+    (created_date, uuid_comment), ordered by this pair.
+
+    :param after: position of the last received comment
+    :type after: tuple | None
+
+    :return: Comment queryset
+    """
+    queryset = Comment.objects.all()
+    if after is not None:
+        created_date, uuid_comment = after
+        queryset = queryset.filter(
+            Q(created_date__gt=created_date) |
+            Q(created_date=created_date, uuid_comment__gt=uuid_comment)
+        )
+    return queryset.order_by("created_date", "uuid_comment")
+
+
+@traced
+def get_day(day: str) -> Union[date, None]:
+    """Check format of day and convert str to date.
+    Need date format:
+        %Y-%m-%d
+    Example:
+        '2000-01-01'
+
+    :param day:
+    :type day: str
+    :return: date or None if date format incorrect
+    """
+    try:
+        return datetime.strptime(day, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+@traced
+def get_stats_days(params) -> Union[tuple, None]:
+    """Return the period of statistics from 'start_date' and
+    'end_date' parameters (format: YYYY-MM-DD), both days are included.
+    Parameters that were not given are returned as None.
+
+    :param params: query parameters of request
+    :type params: QueryDict
+
+    :rtype: tuple | None
+    :return: (start, end) or None if a date format incorrect
+    """
+    days = []
+    for name in ("start_date", "end_date"):
+        value = params.get(name, None)
+        day = None if value is None else get_day(value)
+        if value is not None and day is None:
+            return None
+        days.append(day)
+    return tuple(days)
+
+
+@traced
+def filter_stats_days(queryset, start: date = None, end: date = None):
+    """Return queryset of daily stats in the period."""
+    if start is not None:
+        queryset = queryset.filter(day__gte=start)
+    if end is not None:
+        queryset = queryset.filter(day__lte=end)
+    return queryset
+
+
+@traced
+def get_entity_stats(entity: UUID, start: date = None,
+                     end: date = None) -> dict:
+    """Return daily counts of comments and participants of entity
+    and the totals for the period. Participants of the period are
+    counted by merged sketches of the days, not by their sum.
+
+    :rtype: dict
+    """
+    rows = filter_stats_days(
+        EntityDailyStats.objects.filter(parent_entity=entity), start, end
+    ).order_by("day").values_list("day", "comments_count", "participants")
+
+    days, sketches = [], []
+    for day, comments_count, participants in rows:
+        sketches.append(bytes(participants))
+        days.append({
+            "day": day.isoformat(),
+            "comments_count": comments_count,
+            "participants": hyperloglog.count(sketches[-1]),
+        })
+    return {
+        "entity": str(entity),
+        "comments_count": sum(day["comments_count"] for day in days),
+        "participants": hyperloglog.count(hyperloglog.merge(*sketches)),
+        "days": days,
+    }
+
+
+@traced
+def get_entity_types_stats(start: date = None, end: date = None) -> list:
+    """Return daily counts of comments for every type of entity.
+
+    :rtype: list
+    """
+    rows = filter_stats_days(
+        EntityDailyStats.objects.all(), start, end
+    ).values("day", "parent_entity_type__name").annotate(
+        count=Sum("comments_count")
+    ).order_by("day", "parent_entity_type__name")
+    return [
+        {
+            "day": row["day"].isoformat(),
+            "entity_type": row["parent_entity_type__name"],
+            "comments_count": row["count"],
+        } for row in rows
+    ]
+
+
+@traced
+def get_top_users_stats(start: date = None, end: date = None,
+                        limit: int = 10) -> list:
+    """Return users with the most comments for the period and
+    the count of entities that they commented.
+
+    :rtype: list
+    """
+    queryset = filter_stats_days(UserDailyStats.objects.all(), start, end)
+    top = list(
+        queryset.values("user", "user__nickname").annotate(
+            count=Sum("comments_count")
+        ).order_by("-count", "user")[:limit]
+    )
+    sketches = {}
+    rows = queryset.filter(
+        user__in=[row["user"] for row in top]
+    ).values_list("user", "entities")
+    for user, entities in rows:
+        sketches.setdefault(user, []).append(bytes(entities))
+    return [
+        {
+            "user": row["user__nickname"],
+            "comments_count": row["count"],
+            "entities": hyperloglog.count(
+                hyperloglog.merge(*sketches[row["user"]])
+            ),
+        } for row in top
+    ]
+
+
 # Another services #
 
 class PaginationComments(PageNumberPagination):
@@ -250,12 +1410,15 @@ class PaginationComments(PageNumberPagination):
       "parent_entity_type": 'Type_name',
       "created_date": "2021-01-01T00:00:00.000001Z",
       "text": "text",
-      "parent_entity": uuid.uuid4()
+      "parent_entity": uuid.uuid4(),
+      "reply_count": 0,
+      "descendant_count": 0
     }
     """
 
     page_size = 10
     page_size_query_param = 'page_size'
+    max_page_size = 100
 
     def get_paginated_response(self, data):
         """Processes requests with pagination."""
@@ -266,6 +1429,36 @@ class PaginationComments(PageNumberPagination):
             ('comments', data),
         ]), status=200)
 
+    @traced
+    def get_paginated_json(self, queryset, request) -> bytes:
+        """Return the same response as 'get_paginated_response' as JSON,
+        the comments of page are built by database (see
+        'get_comments_json').
+
+        :raises NotFound: if the page is invalid
+        """
+        paginator = self.django_paginator_class(
+            queryset, self.get_page_size(request)
+        )
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        self.request = request
+
+        envelope = json.dumps(OrderedDict([
+            ('comments_count', paginator.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ]), separators=(",", ":"))
+        return b"".join((
+            envelope[:-1].encode(), b',"comments":',
+            get_comments_json(self.page.object_list), b"}"
+        ))
+
 
 class PaginationHistoryUserComments(PageNumberPagination):
     """Custom pagination class with custom response
@@ -284,12 +1477,15 @@ class PaginationHistoryUserComments(PageNumberPagination):
       "parent_entity_type": 'Type_name',
       "created_date": "2021-01-01T00:00:00.000001Z",
       "text": "text",
-      "parent_entity": uuid.uuid4()
+      "parent_entity": uuid.uuid4(),
+      "reply_count": 0,
+      "descendant_count": 0
     }
     """
 
     page_size = 50
     page_size_query_param = 'page_size'
+    max_page_size = 500
 
     def get_paginated_response(self, data):
         """Processes requests with pagination."""
@@ -361,3 +1557,69 @@ class BadRequestExceptionUserNotFound(APIException):
         "status": 400,
     }
     default_code = 'service_unavailable'
+
+
+class BadRequestExceptionSearchNotFound(APIException):
+    status_code = 400
+    default_detail = {
+        "name": "Bad Request",
+        "message": "Please, input 'q' value.",
+        "hint": "You need to write ?q=<str> parameter. "
+                "Not necessary parameters: ?entity=<str:uuid>, "
+                "?user=<str>, ?start_date=<str>, ?end_date=<str>, "
+                "?page_size=<int>.",
+        "status": 400,
+    }
+    default_code = 'service_unavailable'
+
+
+class BadRequestExceptionCursor(APIException):
+    """Exception is for the situation when cursor of page is incorrect."""
+
+    status_code = 400
+    default_detail = {
+        "name": "Bad Request",
+        "message": "Cursor is not valid.",
+        "status": 400,
+    }
+    default_code = 'service_unavailable'
+
+
+class BadRequestExceptionWatermark(APIException):
+    """Exception is for the situation when watermark is incorrect."""
+
+    status_code = 400
+    default_detail = {
+        "name": "Bad Request",
+        "message": "Watermark is not valid.",
+        "status": 400,
+    }
+    default_code = 'service_unavailable'
+
+
+class BadRequestExceptionEntities(APIException):
+    """Exception is for the situation when entities are incorrect."""
+
+    status_code = 400
+    default_detail = {
+        "name": "Bad Request",
+        "message": "Please, input 'entities' value.",
+        "hint": "You need to write ?entities=<uuid>,<uuid> parameter "
+                f"with up to {FIRST_LEVEL_BATCH_MAX_ENTITIES} UUID values.",
+        "status": 400,
+    }
+    default_code = 'service_unavailable'
+
+
+class UnprocessableExceptionIdempotencyKey(APIException):
+    """Exception is for the situation when Idempotency-Key was used
+    with other data.
+    """
+
+    status_code = 422
+    default_detail = {
+        "name": "Unprocessable Entity",
+        "message": "The Idempotency-Key was used with other data.",
+        "status": 422,
+    }
+    default_code = 'unprocessable_entity'
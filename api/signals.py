@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.snapshots import (add_reply_to_snapshots, delete_tree_snapshots,
+                           get_ancestors_of_comments, snapshots_enabled)
+from comments.models import Comment
+
+# Receivers of models' signals. #
+
+
+@receiver(post_save, sender=Comment)
+def patch_tree_snapshots(sender, instance, created, **kwargs):
+    """Add the new comment to cached snapshots of trees
+    after the transaction is committed. The snapshots of trees
+    with a changed comment are deleted.
+    """
+    if created:
+        # the ancestors are set by 'Comment.save' after the signal
+        transaction.on_commit(lambda: add_reply_to_snapshots(
+            instance, getattr(instance, "ancestors", None)))
+    elif snapshots_enabled():
+        trees = get_ancestors_of_comments([instance.uuid_comment])
+        transaction.on_commit(lambda: delete_tree_snapshots(trees))
+
+
+@receiver(post_delete, sender=Comment)
+def delete_tree_snapshots_of_comment(sender, instance, **kwargs):
+    """Delete cached snapshots of the tree of the deleted comment
+    and of the trees of its ancestors after the transaction
+    is committed.
+    """
+    if snapshots_enabled():
+        trees = [instance.uuid_comment] + get_ancestors_of_comments(
+            [instance.parent_entity]
+        )
+        transaction.on_commit(lambda: delete_tree_snapshots(trees))
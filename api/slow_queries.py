@@ -0,0 +1,257 @@
+import hashlib
+import json
+import queue
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+
+# Capture of slow SQL statements (api.middleware.SlowQueryMiddleware). #
+# Statements of API requests that are slower than 'SLOW_QUERY_THRESHOLD'
+# are put to a queue, a background thread explains them by its own
+# connection and appends them to 'SLOW_QUERY_FILE', so requests don't
+# wait for EXPLAIN. The slow_queries command groups them by shape.
+
+# statements that can change data or take locks are explained without
+# ANALYZE, because ANALYZE executes the statement
+DATA_MODIFYING = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|CREATE|ALTER|DROP|LOCK)\b", re.I
+)
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![\w.])\d+(?:\.\d+)?\b")
+PLACEHOLDER_LIST = re.compile(r"\bIN \(\?(?:, \?)*\)", re.I)
+
+
+def get_shape(sql: str) -> str:
+    """Return the normalized shape of statement: literals and
+    parameters are '?', lists of them in IN are '(...)'.
+    """
+    shape = " ".join(sql.split())
+    shape = STRING_LITERAL.sub("?", shape).replace("%s", "?")
+    shape = NUMBER_LITERAL.sub("?", shape)
+    shape = re.sub(r"\s*,\s*", ", ", shape)
+    shape = re.sub(r"\(\s*", "(", re.sub(r"\s*\)", ")", shape))
+    return PLACEHOLDER_LIST.sub("IN (...)", shape)
+
+
+def get_fingerprint(shape: str) -> str:
+    """Return short hash of the shape of statement."""
+    return hashlib.sha1(shape.encode()).hexdigest()[:16]
+
+
+def is_read_only(sql: str) -> bool:
+    """Return True if the statement only reads data."""
+    words = sql.split(None, 1)
+    return bool(words) and words[0].upper() in ("SELECT", "WITH") and \
+        DATA_MODIFYING.search(sql) is None
+
+
+def explain(sql: str, params) -> (list, bool):
+    """Return the plan of statement in JSON and whether it was analyzed.
+    The statement is explained in a transaction that is rolled back,
+    with 'SLOW_QUERY_EXPLAIN_TIMEOUT'.
+
+    :rtype: (list, bool)
+    """
+    analyze = is_read_only(sql)
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    with transaction.atomic():
+        with connections["default"].cursor() as cursor:
+            cursor.execute(
+                "SET LOCAL statement_timeout = %s",
+                [settings.SLOW_QUERY_EXPLAIN_TIMEOUT]
+            )
+            cursor.execute(f"EXPLAIN ({options}) {sql}", params)
+            plan = cursor.fetchone()[0]
+        transaction.set_rollback(True)
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan, analyze
+
+
+class SlowQueryRecorder:
+    """Execute wrapper of a request: statements slower than
+    'SLOW_QUERY_THRESHOLD' (ms) are sampled by 'SLOW_QUERY_SAMPLE_RATE'
+    and put to the queue of the writer.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.view = ""
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            if duration >= settings.SLOW_QUERY_THRESHOLD and \
+                    random.random() < settings.SLOW_QUERY_SAMPLE_RATE:
+                writer.put({
+                    "time": datetime.now(timezone.utc).isoformat(),
+                    "duration": round(duration, 3),
+                    "view": self.view,
+                    "path": self.path,
+                    "sql": sql,
+                    "params": params,
+                    "many": many,
+                })
+
+
+class SlowQueryWriter:
+    """Explains captured statements and appends them to the file by
+    a daemon thread. Statements are dropped while the queue is full.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queue = None
+        self.thread = None
+        self.dropped = 0
+
+    def put(self, record: dict):
+        with self.lock:
+            if self.thread is None:
+                self.queue = queue.Queue(settings.SLOW_QUERY_QUEUE_SIZE)
+                self.thread = threading.Thread(
+                    target=self.run, name="slow-queries", daemon=True
+                )
+                self.thread.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Wait until all captured statements are written."""
+        if self.queue is not None:
+            self.queue.join()
+
+    def run(self):
+        while True:
+            record = self.queue.get()
+            try:
+                self.write(record)
+            except Exception:  # the thread must not stop
+                pass
+            finally:
+                if self.queue.empty():
+                    # the connection is not kept while there is no work
+                    connections["default"].close()
+                self.queue.task_done()
+
+    def write(self, record: dict):
+        sql, params = record["sql"], record["params"]
+        record["shape"] = get_shape(sql)
+        record["fingerprint"] = get_fingerprint(record["shape"])
+        record["plan"], record["analyzed"] = None, False
+        if record.pop("many"):
+            # the plan of executemany would need every set of parameters
+            record["explain_error"] = "executemany"
+        else:
+            connections["default"].close_if_unusable_or_obsolete()
+            try:
+                record["plan"], record["analyzed"] = explain(sql, params)
+            except DatabaseError as error:
+                record["explain_error"] = str(error).strip()
+        line = json.dumps(record, default=str, separators=(",", ":"))
+        with open(settings.SLOW_QUERY_FILE, "a") as file:
+            file.write(line + "\n")
+
+
+writer = SlowQueryWriter()
+
+
+def read_slow_queries(path: str) -> list:
+    """Return records of the file, lines that are not JSON are skipped."""
+    records = []
+    with open(path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and "fingerprint" in record:
+                records.append(record)
+    return records
+
+
+def get_worst_offenders(records: list, top: int = 10) -> list:
+    """Group records by shape of statement and return the groups with
+    the largest total duration:
+        {
+          "fingerprint": <str>,
+          "shape": <str>,
+          "count": <int>,
+          "total": <float, ms>,
+          "mean": <float, ms>,
+          "max": <float, ms>,
+          "views": {<view>: <count>, ...},
+          "slowest": <record with the largest duration>
+        }
+
+    :rtype: list
+    """
+    groups = {}
+    for record in records:
+        group = groups.setdefault(record["fingerprint"], {
+            "fingerprint": record["fingerprint"],
+            "shape": record["shape"],
+            "count": 0,
+            "total": 0,
+            "max": 0,
+            "views": {},
+            "slowest": record,
+        })
+        group["count"] += 1
+        group["total"] += record["duration"]
+        view = record.get("view") or record.get("path", "")
+        group["views"][view] = group["views"].get(view, 0) + 1
+        if record["duration"] > group["max"]:
+            group["max"] = record["duration"]
+            group["slowest"] = record
+    for group in groups.values():
+        group["mean"] = round(group["total"] / group["count"], 3)
+        group["total"] = round(group["total"], 3)
+    return sorted(groups.values(), key=lambda group: -group["total"])[:top]
+
+
+def format_plan(plan) -> list:
+    """Return lines of the plan in JSON as an indented tree with
+    actual time, rows and buffers of every node.
+    """
+    lines = []
+
+    def add_node(node: dict, depth: int):
+        name = node.get("Node Type", "?")
+        if node.get("Relation Name"):
+            name += f" on {node['Relation Name']}"
+        if node.get("Index Name"):
+            name += f" using {node['Index Name']}"
+        details = [f"cost={node.get('Total Cost', 0)}"]
+        if "Actual Total Time" in node:
+            details.append(
+                f"time={node['Actual Total Time']}ms "
+                f"rows={node.get('Actual Rows')} "
+                f"loops={node.get('Actual Loops')}"
+            )
+        else:
+            details.append(f"rows={node.get('Plan Rows')}")
+        if node.get("Shared Hit Blocks") or node.get("Shared Read Blocks"):
+            details.append(
+                f"buffers hit={node.get('Shared Hit Blocks', 0)} "
+                f"read={node.get('Shared Read Blocks', 0)}"
+            )
+        lines.append(f"{'  ' * depth}-> {name} ({' '.join(details)})")
+        for child in node.get("Plans", []):
+            add_node(child, depth + 1)
+
+    for item in plan or []:
+        add_node(item["Plan"], 0)
+        if "Execution Time" in item:
+            lines.append(f"Execution Time: {item['Execution Time']}ms")
+    return lines
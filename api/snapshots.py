@@ -0,0 +1,291 @@
+from typing import Union
+from uuid import UUID, uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.utils import timezone
+
+from api.services import get_comment_dict
+from comments.models import Comment
+
+# Snapshots of whole comment trees. #
+
+SNAPSHOT_KEY = "tree-snapshot:{}"
+SNAPSHOT_LOCK_KEY = "tree-snapshot-lock:{}"
+SNAPSHOT_STALE_KEY = "tree-snapshot-stale:{}"
+SNAPSHOT_BUILD_KEY = "tree-snapshot-build:{}"
+SNAPSHOT_LOCK_TIMEOUT = 10
+# seconds to build a tree from database, a slower build isn't saved
+SNAPSHOT_BUILD_TIMEOUT = 60
+# backends that keep entries in memory of one process
+PER_PROCESS_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def snapshots_enabled() -> bool:
+    """Return True if snapshots of comment trees are used.
+    A reply saved by one process must patch the snapshots of all
+    processes, so snapshots are used only if 'TREE_SNAPSHOT_CACHE'
+    is set and its backend is shared by processes.
+    """
+    alias = settings.TREE_SNAPSHOT_CACHE
+    return bool(alias) and \
+        settings.CACHES[alias]["BACKEND"] not in PER_PROCESS_BACKENDS
+
+
+def get_snapshot_cache():
+    """Return the cache with snapshots of comment trees.
+    The alias of cache is set by 'TREE_SNAPSHOT_CACHE' setting.
+    """
+    return caches[settings.TREE_SNAPSHOT_CACHE]
+
+
+def get_tree_snapshot(root: UUID) -> Union[dict, None]:
+    """Return the snapshot of the whole tree for root comment
+    or None if the snapshot is not cached.
+    The snapshot is the same as the response of '/api/child-comments'.
+
+    :param root: uuid of root comment
+    :type root: UUID
+
+    :return: tree of comments or None
+    """
+    if not snapshots_enabled():
+        return None
+    snapshot = get_snapshot_cache().get(SNAPSHOT_KEY.format(root))
+    if snapshot is None:
+        return None
+    return snapshot["tree"]
+
+
+def start_tree_snapshot(root: UUID) -> Union[str, None]:
+    """Mark the start of build of the whole tree for root comment.
+    It must be called before the tree is read from database: a new reply
+    of the tree removes the mark, so the tree that was read before
+    the reply isn't saved.
+
+    :param root: uuid of root comment
+    :type root: UUID
+
+    :return: token of the build for 'set_tree_snapshot'
+     or None if snapshots are not used
+    """
+    if not snapshots_enabled():
+        return None
+    token = uuid4().hex
+    get_snapshot_cache().set(
+        SNAPSHOT_BUILD_KEY.format(root), token, SNAPSHOT_BUILD_TIMEOUT
+    )
+    return token
+
+
+def set_tree_snapshot(root: UUID, tree: dict, token: str) -> bool:
+    """Save the snapshot of the whole tree for root comment if no reply
+    of the tree was saved since the build was started.
+    Trees with more than 'TREE_SNAPSHOT_MAX_NODES' comments are not saved.
+
+    :param root: uuid of root comment
+    :type root: UUID
+
+    :param tree: tree of comments with all child comments
+    :type tree: dict
+
+    :param token: token returned by 'start_tree_snapshot'
+    :type token: str
+
+    :return: was the snapshot saved
+    :rtype: bool
+    """
+    if token is None:
+        return False
+    nodes = count_tree_nodes(tree)
+    if nodes > settings.TREE_SNAPSHOT_MAX_NODES:
+        return False
+    cache = get_snapshot_cache()
+    build_key = SNAPSHOT_BUILD_KEY.format(root)
+    if cache.get(build_key) != token:
+        return False
+    key = SNAPSHOT_KEY.format(root)
+    cache.set(key, {"nodes": nodes, "tree": tree})
+    # a reply that removed the mark after the first check could look
+    # for the snapshot before it was saved, so the mark is checked again
+    if cache.get(build_key) != token:
+        cache.delete(key)
+        return False
+    return True
+
+
+def delete_tree_snapshot(root: UUID):
+    """Delete the snapshot of tree for root comment."""
+    get_snapshot_cache().delete(SNAPSHOT_KEY.format(root))
+
+
+def delete_tree_snapshots(roots: list):
+    """Delete the snapshots of trees for root comments and the marks
+    of their builds, so the trees that are being built aren't saved.
+
+    :param roots: uuid values of root comments
+    :type roots: list
+    """
+    if not snapshots_enabled() or not roots:
+        return
+    get_snapshot_cache().delete_many(
+        [SNAPSHOT_KEY.format(root) for root in roots] +
+        [SNAPSHOT_BUILD_KEY.format(root) for root in roots]
+    )
+
+
+def count_tree_nodes(tree: dict) -> int:
+    """Return count of comments in the tree (with root comment)."""
+    count = 0
+    nodes = [tree]
+    while nodes:
+        node = nodes.pop()
+        count += 1
+        nodes.extend(node["child"])
+    return count
+
+
+def get_comment_ancestors(entity: UUID) -> list:
+    """Return uuid values of the comment and all its ancestors
+    from the comment to the top one. The list is empty if the entity
+    is not a comment.
+
+    :param entity: uuid of comment
+    :type entity: UUID
+
+    :rtype: list
+    """
+    sql = f"""
+        WITH RECURSIVE ancestors AS (
+            SELECT uuid_comment, parent_entity, 0 AS depth
+            FROM {Comment._meta.db_table}
+            WHERE uuid_comment = %s
+            UNION ALL
+            SELECT comment.uuid_comment, comment.parent_entity,
+                   ancestors.depth + 1
+            FROM {Comment._meta.db_table} AS comment
+            JOIN ancestors ON comment.uuid_comment = ancestors.parent_entity
+        )
+        SELECT uuid_comment FROM ancestors ORDER BY depth
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [entity])
+        return [UUID(str(row[0])) for row in cursor.fetchall()]
+
+
+def get_ancestors_of_comments(entities: list) -> list:
+    """Return uuid values of the comments and all their ancestors.
+
+    :param entities: uuid values of comments
+    :type entities: list
+
+    :rtype: list
+    """
+    sql = f"""
+        WITH RECURSIVE ancestors AS (
+            SELECT uuid_comment, parent_entity
+            FROM {Comment._meta.db_table}
+            WHERE uuid_comment = ANY(%s)
+            UNION
+            SELECT comment.uuid_comment, comment.parent_entity
+            FROM {Comment._meta.db_table} AS comment
+            JOIN ancestors ON comment.uuid_comment = ancestors.parent_entity
+        )
+        SELECT uuid_comment FROM ancestors
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(entities)])
+        return [UUID(str(row[0])) for row in cursor.fetchall()]
+
+
+def insert_reply(tree: dict, path: list, reply: dict) -> Union[int, None]:
+    """Insert reply to the tree. The path is uuid values of comments
+    from the child of root to the parent of reply.
+    Replies are kept from newer to older.
+
+    :return: count of inserted comments (0 if the reply is already
+     in the tree) or None if the parent of reply was not found
+    """
+    node = tree
+    for uuid_comment in path:
+        for child in node["child"]:
+            if str(child["uuid_comment"]) == str(uuid_comment):
+                node = child
+                break
+        else:
+            return None
+
+    reply_key = (reply["created_date"], str(reply["uuid_comment"]))
+    position = 0
+    for child in node["child"]:
+        child_key = (child["created_date"], str(child["uuid_comment"]))
+        if child_key == reply_key:
+            return 0
+        if child_key < reply_key:
+            break
+        position += 1
+    node["child"].insert(position, reply)
+    return 1
+
+
+def add_reply_to_snapshots(comment: Comment, ancestors: list = None):
+    """Add new comment to all cached trees that include its parent.
+    The snapshot is dropped if it can't be patched: another process
+    is patching it, the parent was not found or the tree became too big.
+
+    :param comment: the new comment
+    :type comment: Comment
+    :param ancestors: uuid values of the parent and all its ancestors
+     if they are known (e.g. returned by the insert)
+    :type ancestors: list
+    """
+    if not snapshots_enabled():
+        return
+    if ancestors is None:
+        ancestors = get_comment_ancestors(comment.parent_entity)
+    if not ancestors:
+        return
+    cache = get_snapshot_cache()
+    # the trees that are being built now don't have the reply
+    cache.delete_many([SNAPSHOT_BUILD_KEY.format(root) for root in ancestors])
+    cached = cache.get_many([SNAPSHOT_KEY.format(root) for root in ancestors])
+    if not cached:
+        return
+
+    reply = get_comment_dict(comment)
+    if timezone.is_naive(reply["created_date"]):
+        reply["created_date"] = timezone.make_aware(reply["created_date"])
+
+    for index, root in enumerate(ancestors):
+        key = SNAPSHOT_KEY.format(root)
+        if key not in cached:
+            continue
+        lock_key = SNAPSHOT_LOCK_KEY.format(root)
+        stale_key = SNAPSHOT_STALE_KEY.format(root)
+        if not cache.add(lock_key, 1, SNAPSHOT_LOCK_TIMEOUT):
+            # the holder of lock drops its result if it sees the mark
+            cache.set(stale_key, 1, SNAPSHOT_LOCK_TIMEOUT)
+            cache.delete(key)
+            continue
+        try:
+            snapshot = cache.get(key)
+            if snapshot is None:
+                continue
+            path = list(reversed(ancestors[:index]))
+            inserted = insert_reply(
+                snapshot["tree"], path, dict(reply, child=[])
+            )
+            snapshot["nodes"] += inserted or 0
+            if inserted is None or \
+                    snapshot["nodes"] > settings.TREE_SNAPSHOT_MAX_NODES:
+                cache.delete(key)
+            elif inserted:
+                cache.set(key, snapshot)
+            if cache.get(stale_key) is not None:
+                cache.delete_many([key, stale_key])
+        finally:
+            cache.delete(lock_key)
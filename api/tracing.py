@@ -0,0 +1,362 @@
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+import time
+from typing import Iterator, Union
+
+from django.conf import settings
+
+from api.benchmarks import percentile
+
+# Sampled tracing of API requests (api.middleware.TracingMiddleware). #
+# Spans of a traced request are kept in memory and appended to
+# 'TRACING_FILE' at the end of the request as one line of OTLP JSON
+# (the format of the file exporter of OpenTelemetry Collector), so
+# the file can be read by 'summarize_traces' or by OpenTelemetry tools.
+
+# kinds and status code of spans in OTLP
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_ERROR = 2
+
+# characters of SQL statement that are kept in its span
+MAX_STATEMENT_LENGTH = 2000
+
+# W3C trace context of the caller: version-trace_id-parent_id-flags
+TRACEPARENT = re.compile(
+    r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$"
+)
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Span:
+    """Timed operation of a request."""
+
+    __slots__ = ("span_id", "parent_id", "name", "kind", "attributes",
+                 "start", "end", "error")
+
+    def __init__(self, parent_id: str, name: str, kind: int,
+                 attributes: dict):
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start = time.time_ns()
+        self.end = None
+        self.error = None
+
+
+class Trace:
+    """Spans of one request. Spans that are started while another span
+    is open are its children. Only 'max_spans' spans are kept, the
+    count of the others is added to the attributes of the first span.
+    """
+
+    def __init__(self, max_spans: int, traceparent: str = ""):
+        self.trace_id = os.urandom(16).hex()
+        self.parent_id = ""
+        match = TRACEPARENT.match(traceparent)
+        if match is not None:
+            # continue the trace of the caller
+            self.trace_id, self.parent_id = match.groups()
+        self.max_spans = max_spans
+        self.spans = []
+        self.stack = []
+        self.dropped = 0
+
+    def start_span(self, name: str, component: str,
+                   kind: int = SPAN_KIND_INTERNAL,
+                   attributes: dict = None) -> Union[Span, None]:
+        """Start a child span of the open span.
+
+        :param component: part of the request: 'http', 'view', 'service',
+         'db' or 'render'
+
+        :return: the span or None if the trace already has 'max_spans'
+        :rtype: Span | None
+        """
+        if len(self.spans) >= self.max_spans:
+            self.dropped += 1
+            return None
+        span = Span(
+            self.stack[-1].span_id if self.stack else self.parent_id, name,
+            kind, dict(attributes or {}, component=component)
+        )
+        self.spans.append(span)
+        self.stack.append(span)
+        return span
+
+    def end_span(self, span: Union[Span, None],
+                 error: BaseException = None):
+        """End the span if it is open."""
+        if span is None or span.end is not None:
+            return
+        span.end = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        for index in range(len(self.stack) - 1, -1, -1):
+            if self.stack[index] is span:
+                del self.stack[index]
+                break
+
+    def get_otlp(self) -> dict:
+        """Return the trace in OTLP JSON. Spans that are not ended
+        (e.g. because of an exception) end now.
+        """
+        now = time.time_ns()
+        if self.dropped and self.spans:
+            self.spans[0].attributes["dropped_spans"] = self.dropped
+        spans = []
+        for span in self.spans:
+            item = {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id,
+                "name": span.name,
+                "kind": span.kind,
+                "startTimeUnixNano": str(span.start),
+                "endTimeUnixNano": str(span.end or now),
+                "attributes": [
+                    get_otlp_attribute(key, value)
+                    for key, value in span.attributes.items()
+                ],
+                "status": {},
+            }
+            if span.error is not None:
+                item["status"] = {
+                    "code": STATUS_CODE_ERROR, "message": span.error
+                }
+            spans.append(item)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [get_otlp_attribute(
+                "service.name", settings.TRACING_SERVICE_NAME
+            )]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]}
+
+
+def get_otlp_attribute(key: str, value) -> dict:
+    """Return attribute of span or resource in OTLP JSON."""
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        # 64-bit integers are strings in OTLP JSON
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def traced(function):
+    """Decorator that records a span of every call of function
+    while the request is traced. Untraced calls only check the context.
+    """
+    name = function.__qualname__
+    attributes = {"code.namespace": function.__module__}
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        trace = current_trace.get()
+        if trace is None:
+            return function(*args, **kwargs)
+        span = trace.start_span(name, "service", attributes=attributes)
+        error = None
+        try:
+            return function(*args, **kwargs)
+        except BaseException as exception:
+            error = exception
+            raise
+        finally:
+            trace.end_span(span, error)
+
+    return wrapper
+
+
+def trace_sql(execute, sql, params, many, context):
+    """Execute wrapper that records a span of every SQL statement
+    while the request is traced. Parameters are not recorded.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    # the name of span is the operation, e.g. SELECT or WITH
+    operation = sql.split(None, 1)[0].upper() if sql.strip() else "SQL"
+    span = trace.start_span(operation, "db", SPAN_KIND_CLIENT, {
+        "db.system": "postgresql",
+        "db.statement": sql[:MAX_STATEMENT_LENGTH],
+        "db.executemany": many,
+    })
+    error = None
+    try:
+        return execute(sql, params, many, context)
+    except BaseException as exception:
+        error = exception
+        raise
+    finally:
+        trace.end_span(span, error)
+
+
+# the file is shared by threads of the process
+_file_lock = threading.Lock()
+
+
+def write_trace(trace: Trace, path: str):
+    """Append the trace to the file as one line. The line is written
+    by one call of write, so lines of processes are not mixed.
+    """
+    line = (json.dumps(
+        trace.get_otlp(), separators=(",", ":")
+    ) + "\n").encode()
+    with _file_lock:
+        descriptor = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                             0o644)
+        try:
+            os.write(descriptor, line)
+        finally:
+            os.close(descriptor)
+
+
+def read_traces(path: str) -> Iterator[list]:
+    """Yield spans of every trace of the file. Every span is a dict:
+        {
+          "trace_id": <str>,
+          "span_id": <str>,
+          "parent_id": <str>,
+          "name": <str>,
+          "component": <str>,
+          "duration": <float, ms>,
+          "attributes": <dict>,
+          "error": <bool>
+        }
+    Lines that are not OTLP JSON are skipped.
+
+    :rtype: Iterator[list]
+    """
+    with open(path) as file:
+        for line in file:
+            try:
+                data = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(data, dict):
+                continue
+            spans = []
+            for resource in data.get("resourceSpans", []):
+                for scope in resource.get("scopeSpans", []):
+                    for span in scope.get("spans", []):
+                        attributes = {
+                            item["key"]: next(iter(item["value"].values()))
+                            for item in span.get("attributes", [])
+                        }
+                        spans.append({
+                            "trace_id": span["traceId"],
+                            "span_id": span["spanId"],
+                            "parent_id": span.get("parentSpanId", ""),
+                            "name": span["name"],
+                            "component": attributes.get("component", ""),
+                            "duration": (
+                                int(span["endTimeUnixNano"]) -
+                                int(span["startTimeUnixNano"])
+                            ) / 1e6,
+                            "attributes": attributes,
+                            "error": span.get("status", {}).get("code") ==
+                            STATUS_CODE_ERROR,
+                        })
+            if spans:
+                yield spans
+
+
+def summarize(traces, top: int = 5) -> dict:
+    """Return statistics of traces by root spans (endpoints).
+    Self time of span is its duration without durations of its children.
+        {
+          <root name>: {
+            "traces": <int>,
+            "p50": <float>, "p95": <float>, "p99": <float>,
+            "components": {<component>: <self time, ms>, ...},
+            "spans": {<name>: {"count", "errors", "total", "self",
+                               "p95"}, ...},
+            "statements": [(<self time, ms>, <count>, <sql>), ...],
+            "slowest": [(<duration, ms>, <trace id>), ...]
+          },
+          ...
+        }
+
+    :param traces: lists of spans (see 'read_traces')
+    :param top: count of the slowest SQL statements and traces
+
+    :rtype: dict
+    """
+    summary = {}
+    for spans in traces:
+        ids = {span["span_id"] for span in spans}
+        roots = [span for span in spans if span["parent_id"] not in ids]
+        if not roots:
+            continue
+        root = roots[0]
+        children = {}
+        for span in spans:
+            children[span["parent_id"]] = (
+                children.get(span["parent_id"], 0) + span["duration"]
+            )
+        endpoint = summary.setdefault(root["name"], {
+            "durations": [], "components": {}, "spans": {},
+            "statements": {}, "slowest": [],
+        })
+        endpoint["durations"].append(root["duration"])
+        endpoint["slowest"].append(
+            (round(root["duration"], 2), root["trace_id"])
+        )
+        for span in spans:
+            self_time = max(
+                0.0, span["duration"] - children.get(span["span_id"], 0)
+            )
+            component = span["component"] or "other"
+            endpoint["components"][component] = (
+                endpoint["components"].get(component, 0) + self_time
+            )
+            row = endpoint["spans"].setdefault(span["name"], {
+                "count": 0, "errors": 0, "total": 0, "self": 0,
+                "durations": [],
+            })
+            row["count"] += 1
+            row["errors"] += span["error"]
+            row["total"] += span["duration"]
+            row["self"] += self_time
+            row["durations"].append(span["duration"])
+            statement = span["attributes"].get("db.statement")
+            if statement is not None:
+                total, count = endpoint["statements"].get(statement, (0, 0))
+                endpoint["statements"][statement] = (
+                    total + self_time, count + 1
+                )
+
+    for endpoint in summary.values():
+        durations = endpoint.pop("durations")
+        endpoint["traces"] = len(durations)
+        for percent in (50, 95, 99):
+            endpoint[f"p{percent}"] = round(percentile(durations, percent), 2)
+        endpoint["components"] = {
+            component: round(total, 2) for component, total in sorted(
+                endpoint["components"].items(), key=lambda item: -item[1]
+            )
+        }
+        for row in endpoint["spans"].values():
+            row["p95"] = round(percentile(row.pop("durations"), 95), 2)
+            row["total"] = round(row["total"], 2)
+            row["self"] = round(row["self"], 2)
+        endpoint["spans"] = dict(sorted(
+            endpoint["spans"].items(), key=lambda item: -item[1]["self"]
+        ))
+        endpoint["statements"] = sorted((
+            (round(total, 2), count, statement)
+            for statement, (total, count) in endpoint["statements"].items()
+        ), reverse=True)[:top]
+        endpoint["slowest"] = sorted(endpoint["slowest"], reverse=True)[:top]
+    return summary
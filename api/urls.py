@@ -1,14 +1,29 @@
 from django.urls import path
 
-from .views import (CommentsListView, CommentsUserHistoryListView,
-                    CSVEntityViewSet, CSVUserViewSet,
-                    manage_all_child_comments, manage_new_comment)
+from .views import (CommentsBatchListView, CommentsChangesView,
+                    CommentsListView, CommentsSearchView,
+                    CommentsUserHistoryListView, CSVEntityViewSet,
+                    CSVUserViewSet, EntityStatsView, EntityTypesStatsView,
+                    UsersStatsView, manage_all_child_comments,
+                    manage_new_comment, manage_next_child_comments,
+                    manage_readiness, manage_thread_summaries)
 
 urlpatterns = [
     path("new-comments/", manage_new_comment, name="new_comments"),
     path("first-lvl-comments", CommentsListView.as_view()),
+    path("first-lvl-comments/batch", CommentsBatchListView.as_view()),
+    path("thread-summaries", manage_thread_summaries),
     path("history-comments", CommentsUserHistoryListView.as_view()),
     path("history/user", CSVUserViewSet.as_view()),
     path("history/entity", CSVEntityViewSet.as_view()),
-    path("child-comments", manage_all_child_comments, name='all_child')
+    path("search-comments", CommentsSearchView.as_view()),
+    path("changes", CommentsChangesView.as_view()),
+    path("stats/entity", EntityStatsView.as_view()),
+    path("stats/entity-types", EntityTypesStatsView.as_view()),
+    path("stats/users", UsersStatsView.as_view()),
+    path("child-comments", manage_all_child_comments, name='all_child'),
+    path(
+        "child-comments/next", manage_next_child_comments, name='next_child'
+    ),
+    path("ready", manage_readiness, name="ready"),
 ]
@@ -1,24 +1,59 @@
 import csv
 import json
+from collections import OrderedDict
+from datetime import timedelta
+from itertools import chain
 from uuid import UUID
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DatabaseError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 from rest_framework.decorators import api_view
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 
+from api.coalescing import coalesce
 from api.serializers import CommentListSerializer
-from api.services import (BadRequestException, BadRequestExceptionDatetime,
+from api.services import (SUMMARIES_MAX_ENTITIES, BadRequestException,
+                          BadRequestExceptionCursor,
+                          BadRequestExceptionDatetime,
+                          BadRequestExceptionEntities,
                           BadRequestExceptionEntityNotFound,
+                          BadRequestExceptionSearchNotFound,
                           BadRequestExceptionUserData,
-                          BadRequestExceptionUserNotFound, PaginationComments,
-                          PaginationHistoryUserComments,
-                          get_all_child_comments,
+                          BadRequestExceptionUserNotFound,
+                          BadRequestExceptionWatermark, PaginationComments,
+                          PaginationHistoryUserComments, create_comment,
+                          get_child_comments_stream, get_child_comments_tree,
+                          get_child_comments_tree_json,
+                          get_child_comments_tree_json_stream,
+                          get_comment_dict, get_comments_after,
                           get_comments_queryset_entity_with_filtered,
-                          get_comments_queryset_user_with_filtered, get_date,
-                          get_user, is_uuid, is_valid_comment_request)
-from comments.models import Comment, EntityType, User
+                          get_comments_queryset_user_with_filtered,
+                          get_database_latency, get_date, get_entities,
+                          get_entity_stats, get_entity_summaries,
+                          get_entity_types_stats,
+                          get_first_level_comments_batch, get_search_cursor,
+                          get_search_queryset, get_stats_days,
+                          get_top_users_stats, get_tree_limits, get_user,
+                          get_watermark, is_uuid, load_child_comments_token,
+                          load_search_cursor, load_watermark)
+from api.snapshots import (add_reply_to_snapshots, get_tree_snapshot,
+                           set_tree_snapshot, start_tree_snapshot)
+from comments.models import Comment
+
+
+def can_stream_from_database(request) -> bool:
+    """Return True if the response can be streamed while it is read
+    from database. Django 3.2 sends the streaming content of ASGI
+    responses in the event loop, where the database can't be used,
+    so only WSGI requests are streamed.
+    """
+    return not isinstance(getattr(request, "_request", request), ASGIRequest)
 
 
 @api_view(["POST"])
@@ -26,6 +61,12 @@ def manage_new_comment(request):
     """Adds new comment to database and response for page.
     Processes a request to 'api/new-comments/'.
     Have only POST method.
+
+    The retry with the same 'Idempotency-Key' header within
+    'IDEMPOTENCY_KEY_TTL' returns the original result without
+    another comment (and with 'Idempotent-Replayed: true' header).
+    Keys are separate for every author, the retry of the author with
+    other data is rejected with status 422.
     """
 
     if request.method == "POST":
@@ -40,30 +81,32 @@ def manage_new_comment(request):
                 "status": 400,
             }
             return Response(response, status=400)
-        # check the validity of the data
-        valid_data, exception_message = is_valid_comment_request(data)
-        if not valid_data:
+        # add new comment to DB with checking the validity of the data
+        comment, exception_message = create_comment(
+            data, request.headers.get("Idempotency-Key")
+        )
+        if comment is None and not exception_message:
+            response = Response({
+                "name": "Created",
+                "message": "New comment was created!",
+                "status": 201
+            }, status=201)
+            response["Idempotent-Replayed"] = "true"
+            return response
+        if comment is None:
             response = {
                 "name": "Bad Request",
                 "message": exception_message,
                 "status": 400,
             }
             return Response(response, status=400)
-
-        # add new comment to DB
-        if is_uuid(data["author"]):
-            user = User.objects.get(uuid_user=data["author"])
-        else:
-            user = User.objects.get(nickname=data["author"])
-        comment = Comment(
-            user=user,
-            text=data["text"],
-            parent_entity=UUID(data["parent_entity_uuid"]),
-            parent_entity_type=EntityType.objects.get(
-                name=data["parent_entity_type"]
-            ),
+        transaction.on_commit(
+            lambda: add_reply_to_snapshots(comment, comment.ancestors)
         )
-        comment.save()
+        # the live feed is imported only by the first new comment,
+        # so workers that only read don't load it
+        from api.events import publish_comment
+        publish_comment(comment, comment.ancestors)
 
         response = {
             "name": "Created",
@@ -84,7 +127,7 @@ class CommentsListView(ListAPIView):
         /api/first-lvl-comments?entity=<str>&page=<int>&page_size=<int>
     Where:
     entity - the entity for which comments are searching. Can be uuid value.
-    page_size - count of comments on page.
+    page_size - count of comments on page (default 10, max 100).
     page - number of pagination page.
     """
 
@@ -106,6 +149,145 @@ class CommentsListView(ListAPIView):
         else:
             return Comment.objects.filter(parent_entity=UUID(entity_value))
 
+    def list(self, request, *args, **kwargs):
+        """Identical concurrent requests share one page of comments.
+        With 'DB_JSON_RESPONSES' the page is built by database.
+        """
+        if settings.DB_JSON_RESPONSES:
+            content = coalesce(
+                request.build_absolute_uri(),
+                lambda: self.paginator.get_paginated_json(
+                    self.get_queryset(), request
+                )
+            )
+            return HttpResponse(content, content_type="application/json")
+
+        def get_page():
+            response = super(CommentsListView, self).list(
+                request, *args, **kwargs
+            )
+            return response.data, response.status_code
+
+        data, status = coalesce(request.build_absolute_uri(), get_page)
+        return Response(data, status=status)
+
+
+class CommentsBatchListView(APIView):
+    """Has method 'GET' for getting the first level comments of many
+    entities at once, e.g. for a feed of entities.
+
+    Processes such requests as:
+        /api/first-lvl-comments/batch?entities=<uuid>,<uuid>
+        /api/first-lvl-comments/batch?entities=<uuid>,<uuid>&limit=<int>
+
+    Where:
+    entities - comma separated entities (up to 100).
+    limit - count of the first comments of every entity
+    (default 10, max 100).
+
+    Response has such format:
+        {
+          "entities": {
+            "<uuid>": {"comments_count": <int>, "comments": [...]},
+            ...
+          }
+        }
+    Comments of every entity are ordered from older to newer.
+    """
+
+    limit = 10
+    max_limit = 100
+
+    def get_limit(self, request) -> int:
+        """Return limit from request or default limit."""
+        limit = request.GET.get('limit', '')
+        if not limit.isdigit() or int(limit) == 0:
+            return self.limit
+        return min(int(limit), self.max_limit)
+
+    def get(self, request):
+        """The function processes 'GET' requests.
+
+        :param request: request from user.
+
+        :raises BadRequestExceptionEntities: if entities are not given,
+         are not UUID values or there are too many of them
+
+        :return: response with comments.
+        """
+        entities = get_entities(request.GET.get('entities', None))
+        if entities is None:
+            raise BadRequestExceptionEntities
+
+        comments = get_first_level_comments_batch(
+            entities, self.get_limit(request)
+        )
+        return Response({"entities": comments}, status=200)
+
+
+@api_view(["GET", "POST"])
+def manage_thread_summaries(request):
+    """Has methods 'GET' and 'POST' for getting summaries of comments
+    of many entities: count of comments, count of distinct participants
+    and the latest comment. Hundreds of entities don't fit to URL,
+    so they can be sent with 'POST'.
+
+    Processes such requests as:
+        GET /api/thread-summaries?entities=<uuid>,<uuid>
+        POST /api/thread-summaries
+            {"entities": [<uuid>, <uuid>]}
+
+    Where:
+    entities - entities for summaries (up to 1000).
+
+    Response has such format:
+        {
+          "entities": {
+            "<uuid>": {
+              "comments_count": <int>,
+              "participants_count": <int>,
+              "latest_comment": {...} | null
+            },
+            ...
+          }
+        }
+
+    :param request: request from user
+    :return: response for user
+    :rtype: Response
+    """
+
+    if request.method == "POST":
+        # check the validity of JSON
+        try:
+            entities = json.loads(request.body)
+        except json.decoder.JSONDecodeError:
+            response = {
+                "name": "Bad Request",
+                "message": "The entered JSON is not valid.",
+                "status": 400,
+            }
+            return Response(response, status=400)
+        if isinstance(entities, dict):
+            entities = entities.get("entities", None)
+    else:
+        entities = request.GET.get('entities', None)
+
+    entities = get_entities(entities, SUMMARIES_MAX_ENTITIES)
+    if entities is None:
+        response = {
+            "name": "Bad Request",
+            "message": "Please, input 'entities' value.",
+            "hint": f"You need to send up to {SUMMARIES_MAX_ENTITIES} "
+                    f"UUID values of entities.",
+            "status": 400,
+        }
+        return Response(response, status=400)
+
+    return Response(
+        {"entities": get_entity_summaries(entities)}, status=200
+    )
+
 
 class CommentsUserHistoryListView(ListAPIView):
     """Has method 'GET' for getting all comments by user.
@@ -120,7 +302,7 @@ class CommentsUserHistoryListView(ListAPIView):
     <str:user> - string representation of the value uuid or
     nickname of specific user.
     user - the user for whom comments are searching.
-    page_size - count of comments on page (default 50).
+    page_size - count of comments on page (default 50, max 500).
     page - number of pagination page.
     """
 
@@ -316,12 +498,26 @@ def manage_all_child_comments(request):
     Processes such requests as:
         /api/child-comments?root=<uuid>
         /api/child-comments?root=<uuid>&entity_type=<str>
+        /api/child-comments?root=<uuid>&max_depth=<int>&limit=<int>
+        /api/child-comments?root=<uuid>&budget=<int>
+        /api/child-comments?root=<uuid>&stream=true
 
     Where:
     <uuid> - uuid value.
     <str> - string value.
+    <int> - integer value.
     root - the entity to find child comments for.
     entity_type - type of root entity.
+    max_depth - how many levels of replies to load.
+    limit - how many newest replies to load for each comment.
+    budget - how many comments to load for the whole response.
+    stream - send the whole tree by parts while it is read from database,
+    can't be used with limits. Only WSGI requests are streamed, ASGI
+    requests get the usual response with the same JSON.
+
+    Replies are ordered from newer to older. A comment that has more
+    replies than were loaded has the 'next' field with a token for
+    '/api/child-comments/next'.
 
     :param request: request from user
     :return: response for user
@@ -350,8 +546,87 @@ def manage_all_child_comments(request):
                 "status": 400,
             }
             return Response(response, status=400)
-        # check does the uuid value exist
-        elif not Comment.objects.filter(uuid_comment=root).count():
+
+        # check the limits of tree
+        limits, exception_message = get_tree_limits(request.GET)
+        if limits is None:
+            response = {
+                "name": "Bad Request",
+                "message": exception_message,
+                "status": 400,
+            }
+            return Response(response, status=400)
+        stream = request.GET.get('stream', None) in ("1", "true")
+        full_tree = all(value is None for value in limits.values())
+        if stream and full_tree and not can_stream_from_database(request):
+            stream = False
+
+        # the whole tree can be taken from snapshot without database
+        if full_tree and not stream:
+            snapshot = get_tree_snapshot(UUID(root))
+            if snapshot is not None:
+                return Response(snapshot, status=200)
+
+        if stream and not full_tree:
+            response = {
+                "name": "Bad Request",
+                "message": "The stream can't be used with limits.",
+                "status": 400,
+            }
+            return Response(response, status=400)
+
+        def get_tree_response():
+            """Return the tree of root and status of response."""
+            # the build is marked before the tree is read, a reply
+            # saved while it is read prevents saving of the snapshot
+            build = start_tree_snapshot(UUID(root)) \
+                if full_tree and not stream else None
+
+            # check does the uuid value exist
+            if not Comment.objects.filter(uuid_comment=root).count():
+                response = {
+                    "name": "Bad Request",
+                    "message": f"Element '{root}' was not found.",
+                    "status": 400,
+                }
+                return response, 400
+
+            root_entity = Comment.objects.get(uuid_comment=UUID(root))
+
+            if stream:
+                return root_entity, 200
+
+            child, token = get_child_comments_tree(
+                root_entity.uuid_comment, **limits
+            )
+            response = get_comment_dict(root_entity)
+            response["child"] = child
+            if token is not None:
+                response["next"] = token
+            elif full_tree:
+                set_tree_snapshot(root_entity.uuid_comment, response, build)
+            return response, 200
+
+        if full_tree and not stream and settings.DB_JSON_RESPONSES:
+            # the tree is built by database, it isn't put to snapshots
+            if can_stream_from_database(request):
+                # the tree is sent while it is read, the first part
+                # is read before the response to check the root
+                parts = get_child_comments_tree_json_stream(UUID(root))
+                first = next(parts, None)
+                if first is not None:
+                    return StreamingHttpResponse(
+                        chain([first], parts), content_type="application/json"
+                    )
+            else:
+                content = coalesce(
+                    request.build_absolute_uri(),
+                    lambda: get_child_comments_tree_json(UUID(root))
+                )
+                if content is not None:
+                    return HttpResponse(
+                        content, content_type="application/json"
+                    )
             response = {
                 "name": "Bad Request",
                 "message": f"Element '{root}' was not found.",
@@ -359,15 +634,446 @@ def manage_all_child_comments(request):
             }
             return Response(response, status=400)
 
-        root_entity = Comment.objects.get(uuid_comment=UUID(root))
+        if stream:
+            root_entity, status = get_tree_response()
+            if status != 200:
+                return Response(root_entity, status=status)
+            return StreamingHttpResponse(
+                get_child_comments_stream(root_entity),
+                content_type="application/json"
+            )
+
+        # identical concurrent requests build the tree once
+        response, status = coalesce(
+            request.build_absolute_uri(), get_tree_response
+        )
+        return Response(response, status=status)
+
+
+@api_view(["GET"])
+def manage_next_child_comments(request):
+    """Has method 'GET' for getting the next replies of a comment,
+    that were not loaded by '/api/child-comments'.
+    The limits of the first request are kept in the token.
+
+    Processes such requests as:
+        /api/child-comments/next?token=<str>
+
+    Where:
+    token - value of the 'next' field of a comment.
+
+    Response has such format:
+        {
+          "parent_entity": <uuid>,
+          "child": [...],
+          "next": <str> | null
+        }
+
+    :param request: request from user
+    :return: response for user
+    :rtype: Response
+    """
+
+    if request.method == "GET":
+        token = request.GET.get('token', None)
+
+        # check 'token' input value
+        if token is None:
+            response = {
+                "name": "Bad Request",
+                "message": "Please, input 'token' value.",
+                "hint": "You need to write ?token=<str> parameter.",
+                "status": 400,
+            }
+            return Response(response, status=400)
+
+        data = load_child_comments_token(token)
+        if data is None:
+            response = {
+                "name": "Bad Request",
+                "message": "Token is not valid.",
+                "status": 400,
+            }
+            return Response(response, status=400)
+
+        child, next_token = get_child_comments_tree(
+            data["parent"],
+            max_depth=data["max_depth"],
+            limit=data["limit"],
+            budget=data["budget"],
+            after=data["after"],
+        )
         response = {
-            "uuid_comment": root_entity.uuid_comment,
-            "created_date": root_entity.created_date,
-            "user": root_entity.user.nickname,
-            "parent_entity": str(root_entity.parent_entity),
-            "parent_entity_type": root_entity.parent_entity_type.name,
-            "text": root_entity.text,
-            "child": get_all_child_comments(str(root_entity.uuid_comment))
+            "parent_entity": str(data["parent"]),
+            "child": child,
+            "next": next_token,
         }
 
         return Response(response, status=200)
+
+
+class CommentsSearchView(APIView):
+    """Has method 'GET' for full-text search over comments' text.
+    Comments are ordered from more relevant to less relevant.
+
+    Processes such requests as:
+        /api/search-comments?q=<str>
+        /api/search-comments?q=<str>&entity=<str:uuid>
+        /api/search-comments?q=<str>&user=<str:user>
+        /api/search-comments?q=<str>&start_date=<str>&end_date=<str>
+        /api/search-comments?q=<str>&page_size=<int>&cursor=<str>
+
+    Where:
+    q - search query in web search syntax ("quoted phrase", or, -word).
+    entity - the entity for which comments are searching.
+    user - nickname or uuid of the user whose comments are searching.
+    start_date - starting from what date to search
+    (format: 'YYY-MM-DDThh:mm:ss').
+    end_date - ending with what date to search
+    (format: 'YYY-MM-DDThh:mm:ss').
+    page_size - count of comments on page (default 10, max 100).
+    cursor - position of page, it is taken from the 'next' link.
+
+    Response has such format:
+        {
+          "next": 'http://...' | null,
+          "comments": [...]
+        }
+    Every comment has the 'rank' field with its relevance.
+    """
+
+    page_size = 10
+    max_page_size = 100
+
+    def get_page_size(self, request) -> int:
+        """Return page size from request or default page size."""
+        page_size = request.GET.get('page_size', '')
+        if not page_size.isdigit() or int(page_size) == 0:
+            return self.page_size
+        return min(int(page_size), self.max_page_size)
+
+    def get(self, request):
+        """The function processes 'GET' requests.
+
+        :param request: request from user.
+
+        :raises BadRequestExceptionSearchNotFound: if q value is None
+        :raises BadRequestException: if entity is not UUID value
+        :raises BadRequestExceptionUserData: if user doesn't exists
+        :raises BadRequestExceptionDatetime: if start_date or end_date
+         from get parameters is invalid
+        :raises BadRequestExceptionCursor: if cursor is invalid
+
+        :return: response with found comments.
+        """
+        text = request.GET.get('q', None)
+        if text is None or not text.strip():
+            raise BadRequestExceptionSearchNotFound
+
+        entity = request.GET.get('entity', None)
+        if entity is not None and not is_uuid(entity):
+            raise BadRequestException
+
+        user = request.GET.get('user', None)
+        user_instance = None
+        if user is not None:
+            user_instance = get_user(user)
+            if user_instance is None:
+                raise BadRequestExceptionUserData
+
+        # get and check date
+        start_date = request.GET.get('start_date', None)
+        end_date = request.GET.get('end_date', None)
+        for date in (start_date, end_date):
+            if date is not None and get_date(date) is None:
+                raise BadRequestExceptionDatetime
+
+        cursor = request.GET.get('cursor', None)
+        after = None
+        if cursor is not None:
+            after = load_search_cursor(cursor)
+            if after is None:
+                raise BadRequestExceptionCursor
+
+        page_size = self.get_page_size(request)
+        queryset = get_search_queryset(
+            text, entity, user_instance, start_date, end_date, after
+        )
+        # one more comment shows that there is the next page
+        comments = list(queryset[:page_size + 1])
+        next_link = None
+        if len(comments) > page_size:
+            comments = comments[:page_size]
+            next_link = replace_query_param(
+                request.build_absolute_uri(),
+                'cursor',
+                get_search_cursor(comments[-1])
+            )
+
+        data = CommentListSerializer(comments, many=True).data
+        for comment_data, comment in zip(data, comments):
+            comment_data['rank'] = comment.rank
+
+        return Response(OrderedDict([
+            ('next', next_link),
+            ('comments', data),
+        ]), status=200)
+
+
+class CommentsChangesView(APIView):
+    """Has method 'GET' for getting comments created after a watermark.
+    It is the change feed for other services: they save the watermark
+    of response and request the next comments with it.
+
+    Processes such requests as:
+        /api/changes
+        /api/changes?after=<str>
+        /api/changes?after=<str>&limit=<int>
+
+    Where:
+    after - watermark from the previous response, without it comments
+    are returned from the oldest one.
+    limit - count of comments in response (default 1000, max 10000).
+
+    Comments are ordered by (created_date, uuid_comment). Comments of the
+    last 'CHANGE_FEED_DELAY_SECONDS' are not returned yet, so comments of
+    not committed transactions are not skipped.
+
+    Response has such format:
+        {
+          "watermark": <str> | null,
+          "has_more": <bool>,
+          "comments": [...]
+        }
+    """
+
+    limit = 1000
+    max_limit = 10000
+
+    def get_limit(self, request) -> int:
+        """Return limit from request or default limit."""
+        limit = request.GET.get('limit', '')
+        if not limit.isdigit() or int(limit) == 0:
+            return self.limit
+        return min(int(limit), self.max_limit)
+
+    def get(self, request):
+        """The function processes 'GET' requests.
+
+        :param request: request from user.
+
+        :raises BadRequestExceptionWatermark: if watermark is invalid
+
+        :return: response with comments.
+        """
+        watermark = request.GET.get('after', None)
+        after = None
+        if watermark is not None:
+            after = load_watermark(watermark)
+            if after is None:
+                raise BadRequestExceptionWatermark
+
+        limit = self.get_limit(request)
+        until = timezone.now() - timedelta(
+            seconds=settings.CHANGE_FEED_DELAY_SECONDS
+        )
+        queryset = get_comments_after(after).filter(
+            created_date__lt=until
+        ).select_related("user", "parent_entity_type")
+        # one more comment shows that there are more comments
+        comments = list(queryset[:limit + 1])
+        has_more = len(comments) > limit
+        comments = comments[:limit]
+        if comments:
+            watermark = get_watermark(comments[-1])
+
+        return Response(OrderedDict([
+            ('watermark', watermark),
+            ('has_more', has_more),
+            ('comments', CommentListSerializer(comments, many=True).data),
+        ]), status=200)
+
+
+class EntityStatsView(APIView):
+    """Has method 'GET' for getting daily statistics of an entity.
+    The statistics are read from the daily rollups, not from comments.
+
+    Processes such requests as:
+        /api/stats/entity?entity=<uuid>
+        /api/stats/entity?entity=<uuid>&start_date=<str>&end_date=<str>
+
+    Where:
+    entity - the entity for which statistics are returned.
+    start_date - the first day of the period (format: YYYY-MM-DD).
+    end_date - the last day of the period (format: YYYY-MM-DD).
+
+    Response has such format:
+        {
+          "entity": <uuid>,
+          "comments_count": <int>,
+          "participants": <int>,
+          "days": [{"day": <str>, "comments_count": <int>,
+                    "participants": <int>}, ...]
+        }
+    Participants are distinct users, they are estimated with
+    HyperLogLog sketches.
+    """
+
+    def get(self, request):
+        """The function processes 'GET' requests.
+
+        :param request: request from user.
+
+        :raises BadRequestExceptionEntityNotFound: if entity is not given
+        :raises BadRequestException: if entity is not UUID value
+        :raises BadRequestExceptionDatetime: if start_date or end_date
+         is invalid
+
+        :return: response with statistics.
+        """
+        entity = request.GET.get('entity', None)
+        if entity is None:
+            raise BadRequestExceptionEntityNotFound
+        if not is_uuid(entity):
+            raise BadRequestException
+        days = get_stats_days(request.GET)
+        if days is None:
+            raise BadRequestExceptionDatetime
+
+        return Response(get_entity_stats(UUID(entity), *days), status=200)
+
+
+class EntityTypesStatsView(APIView):
+    """Has method 'GET' for getting daily counts of comments
+    for every type of entity.
+
+    Processes such requests as:
+        /api/stats/entity-types
+        /api/stats/entity-types?start_date=<str>&end_date=<str>
+
+    Where:
+    start_date - the first day of the period (format: YYYY-MM-DD).
+    end_date - the last day of the period (format: YYYY-MM-DD).
+
+    Response has such format:
+        {
+          "days": [{"day": <str>, "entity_type": <str>,
+                    "comments_count": <int>}, ...]
+        }
+    """
+
+    def get(self, request):
+        """The function processes 'GET' requests.
+
+        :param request: request from user.
+
+        :raises BadRequestExceptionDatetime: if start_date or end_date
+         is invalid
+
+        :return: response with statistics.
+        """
+        days = get_stats_days(request.GET)
+        if days is None:
+            raise BadRequestExceptionDatetime
+
+        return Response({"days": get_entity_types_stats(*days)}, status=200)
+
+
+class UsersStatsView(APIView):
+    """Has method 'GET' for getting users with the most comments.
+
+    Processes such requests as:
+        /api/stats/users
+        /api/stats/users?start_date=<str>&end_date=<str>&limit=<int>
+
+    Where:
+    start_date - the first day of the period (format: YYYY-MM-DD).
+    end_date - the last day of the period (format: YYYY-MM-DD).
+    limit - count of users (default 10, max 100).
+
+    Response has such format:
+        {
+          "users": [{"user": <str>, "comments_count": <int>,
+                     "entities": <int>}, ...]
+        }
+    Entities are distinct commented entities, they are estimated with
+    HyperLogLog sketches.
+    """
+
+    limit = 10
+    max_limit = 100
+
+    def get_limit(self, request) -> int:
+        """Return limit from request or default limit."""
+        limit = request.GET.get('limit', '')
+        if not limit.isdigit() or int(limit) == 0:
+            return self.limit
+        return min(int(limit), self.max_limit)
+
+    def get(self, request):
+        """The function processes 'GET' requests.
+
+        :param request: request from user.
+
+        :raises BadRequestExceptionDatetime: if start_date or end_date
+         is invalid
+
+        :return: response with statistics.
+        """
+        days = get_stats_days(request.GET)
+        if days is None:
+            raise BadRequestExceptionDatetime
+
+        users = get_top_users_stats(*days, limit=self.get_limit(request))
+        return Response({"users": users}, status=200)
+
+
+@api_view(["GET"])
+def manage_readiness(request):
+    """Has method 'GET' for the readiness probe of the process.
+    The process is ready if database answers faster than
+    'READINESS_MAX_DB_LATENCY'.
+
+    Processes such requests as:
+        /api/ready
+
+    Response has such format:
+        {
+          "name": "Ready" | "Not Ready",
+          "message": <str>,
+          "database_latency_ms": <float> | null,
+          "status": 200 | 503
+        }
+
+    :param request: request from user
+    :return: response for user
+    :rtype: Response
+    """
+
+    try:
+        latency = get_database_latency()
+    except DatabaseError:
+        response = {
+            "name": "Not Ready",
+            "message": "The database is not available.",
+            "database_latency_ms": None,
+            "status": 503,
+        }
+        return Response(response, status=503)
+
+    if latency > settings.READINESS_MAX_DB_LATENCY:
+        response = {
+            "name": "Not Ready",
+            "message": "The database is too slow.",
+            "database_latency_ms": round(latency, 2),
+            "status": 503,
+        }
+        return Response(response, status=503)
+
+    response = {
+        "name": "Ready",
+        "message": "The service is ready.",
+        "database_latency_ms": round(latency, 2),
+        "status": 200,
+    }
+    return Response(response, status=200)
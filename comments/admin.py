@@ -1,7 +1,16 @@
 from django.contrib import admin
 
-from .models import Comment, EntityType, User
+from .models import (Comment, EntityDailyStats, EntityParticipant,
+                     EntitySummary, EntityType, IdempotencyKey, OutboxEvent,
+                     ProfilingToggle, User, UserDailyStats)
 
 admin.site.register(User)
 admin.site.register(EntityType)
 admin.site.register(Comment)
+admin.site.register(OutboxEvent)
+admin.site.register(EntityDailyStats)
+admin.site.register(UserDailyStats)
+admin.site.register(EntitySummary)
+admin.site.register(EntityParticipant)
+admin.site.register(IdempotencyKey)
+admin.site.register(ProfilingToggle)
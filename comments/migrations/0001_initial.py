@@ -0,0 +1,93 @@
+# Generated by Django 3.2.7 on 2026-10-19 10:56
+
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntityType',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ('name', models.CharField(max_length=80)),
+                ('description', models.TextField()),
+            ],
+            options={
+                'verbose_name': 'entity type',
+                'verbose_name_plural': 'entity types',
+            },
+        ),
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                (
+                    'uuid_user',
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ('nickname', models.CharField(max_length=30, unique=True)),
+                ('firstname', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'user',
+                'verbose_name_plural': 'users',
+            },
+        ),
+        migrations.CreateModel(
+            name='Comment',
+            fields=[
+                (
+                    'uuid_comment',
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ('created_date', models.DateTimeField()),
+                ('text', models.TextField()),
+                ('parent_entity', models.UUIDField()),
+                (
+                    'parent_entity_type',
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name='comments',
+                        to='comments.entitytype',
+                    ),
+                ),
+                (
+                    'user',
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name='comments',
+                        to='comments.user',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'comment',
+                'verbose_name_plural': 'comments',
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.7 on 2026-10-19 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0002_comment_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(
+                fields=['created_date', 'uuid_comment'],
+                name='comment_created_idx',
+            ),
+        ),
+    ]
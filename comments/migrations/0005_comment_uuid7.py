@@ -0,0 +1,24 @@
+# Generated by Django 3.2.7 on 2026-10-19 10:56
+
+from django.db import migrations, models
+
+import comments.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0004_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='uuid_comment',
+            field=models.UUIDField(
+                default=comments.models.uuid7,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 3.2.7 on 2026-10-19 10:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import comments.hyperloglog
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0005_comment_uuid7'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDailyStats',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('day', models.DateField()),
+                ('comments_count', models.PositiveIntegerField(default=0)),
+                (
+                    'entities',
+                    models.BinaryField(default=comments.hyperloglog.empty),
+                ),
+                (
+                    'user',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='+',
+                        to='comments.user',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'user daily stats',
+                'verbose_name_plural': 'user daily stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='EntityDailyStats',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('day', models.DateField()),
+                ('parent_entity', models.UUIDField()),
+                ('comments_count', models.PositiveIntegerField(default=0)),
+                (
+                    'participants',
+                    models.BinaryField(default=comments.hyperloglog.empty),
+                ),
+                (
+                    'parent_entity_type',
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name='+',
+                        to='comments.entitytype',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'entity daily stats',
+                'verbose_name_plural': 'entity daily stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='userdailystats',
+            index=models.Index(fields=['day'], name='user_stats_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='userdailystats',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'day'),
+                name='user_stats_day_uniq',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='entitydailystats',
+            index=models.Index(fields=['day'], name='entity_stats_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='entitydailystats',
+            constraint=models.UniqueConstraint(
+                fields=('parent_entity', 'day'),
+                name='entity_stats_day_uniq',
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.7 on 2026-10-19 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0006_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(
+                fields=['parent_entity', 'created_date', 'uuid_comment'],
+                name='comment_entity_created_idx',
+            ),
+        ),
+    ]
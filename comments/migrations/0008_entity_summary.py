@@ -0,0 +1,65 @@
+# Generated by Django 3.2.7 on 2026-10-19 10:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0007_comment_entity_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntitySummary',
+            fields=[
+                (
+                    'parent_entity',
+                    models.UUIDField(primary_key=True, serialize=False),
+                ),
+                ('comments_count', models.PositiveIntegerField(default=0)),
+                ('participants_count', models.PositiveIntegerField(default=0)),
+                ('latest_created_date', models.DateTimeField(null=True)),
+                (
+                    'latest_comment',
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name='+',
+                        to='comments.comment',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'entity summary',
+                'verbose_name_plural': 'entity summaries',
+            },
+        ),
+        migrations.CreateModel(
+            name='EntityParticipant',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('parent_entity', models.UUIDField()),
+                (
+                    'user',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='+',
+                        to='comments.user',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'entity participant',
+                'verbose_name_plural': 'entity participants',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='entityparticipant',
+            constraint=models.UniqueConstraint(
+                fields=('parent_entity', 'user'),
+                name='entity_participant_uniq',
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.7 on 2026-10-19 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0010_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfilingToggle',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('remaining', models.PositiveIntegerField(default=0)),
+                (
+                    'path_prefix',
+                    models.CharField(default='/api/', max_length=200),
+                ),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'profiling toggle',
+                'verbose_name_plural': 'profiling toggles',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.7 on 2026-10-19 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0011_profilingtoggle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='fingerprint',
+            field=models.UUIDField(null=True),
+        ),
+    ]
@@ -1,7 +1,48 @@
+import os
+import threading
+import time
 import uuid
 from datetime import datetime, timedelta, timezone
 
-from django.db import models
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connections, models, router, transaction
+
+from comments import hyperloglog
+
+_uuid7_lock = threading.Lock()
+_uuid7_last = [0, 0]
+
+
+def uuid7() -> uuid.UUID:
+    """Return time-ordered UUID version 7 (RFC 9562).
+    The first 48 bits are milliseconds of unix time and the next 12 bits
+    are a counter, so the values of one process are increasing even
+    within one millisecond. The other 62 bits are random.
+
+    :rtype: uuid.UUID
+    """
+    with _uuid7_lock:
+        timestamp = time.time_ns() // 1_000_000
+        last_timestamp, counter = _uuid7_last
+        if timestamp > last_timestamp:
+            # the counter starts from a random value in the lower half
+            counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        else:
+            timestamp = last_timestamp
+            counter += 1
+            if counter > 0xFFF:
+                # the counter is over, borrow the next millisecond
+                timestamp += 1
+                counter = 0
+        _uuid7_last[:] = [timestamp, counter]
+
+    random_bits = int.from_bytes(os.urandom(8), "big") & (2 ** 62 - 1)
+    value = (
+        timestamp << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | random_bits
+    )
+    return uuid.UUID(int=value)
 
 
 class User(models.Model):
@@ -37,7 +78,9 @@ class EntityType(models.Model):
 class Comment(models.Model):
     """Model with comments."""
 
-    uuid_comment = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    # new comments have time-ordered uuid, so the order of primary key is
+    # the order of creation and inserts go to the end of the index
+    uuid_comment = models.UUIDField(primary_key=True, default=uuid7)
     created_date = models.DateTimeField()
     user = models.ForeignKey(
         User, null=True, on_delete=models.SET_NULL, related_name="comments"
@@ -50,16 +93,415 @@ class Comment(models.Model):
         on_delete=models.SET_NULL,
         related_name="comments"
     )
+    # full-text search document of text, it is updated by 'save'
+    search_vector = SearchVectorField(null=True, editable=False)
+    # counts of direct replies and of all replies below the comment,
+    # they are increased by 'save' of a new reply
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+    descendant_count = models.PositiveIntegerField(
+        default=0, editable=False
+    )
 
     class Meta:
         verbose_name = "comment"
         verbose_name_plural = "comments"
+        indexes = [
+            GinIndex(fields=["search_vector"], name="comment_search_idx"),
+            # the order of change feed and resuming of live feed
+            models.Index(
+                fields=["created_date", "uuid_comment"],
+                name="comment_created_idx"
+            ),
+            # comments of entities in the order of creation
+            models.Index(
+                fields=["parent_entity", "created_date", "uuid_comment"],
+                name="comment_entity_created_idx"
+            ),
+        ]
 
     def save(self, *args, **kwargs):
-        """"Set datetime.now for created_date by default."""
+        """"Set datetime.now for created_date by default.
+        Update the search document in the same query if text is saved.
+        """
         if not self.created_date:
             self.created_date = datetime.now(tz=timezone(timedelta(hours=0)))
-        return super(Comment, self).save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields", None)
+        if update_fields is None or "text" in update_fields:
+            self.search_vector = SearchVector(
+                models.Value(self.text, output_field=models.TextField()),
+                config=settings.COMMENT_SEARCH_CONFIG
+            )
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "search_vector"}
+
+        if not self._state.adding:
+            return super(Comment, self).save(*args, **kwargs)
+        # the event, the statistics, the summary and the counts of
+        # replies of new comment are saved in the same transaction
+        using = kwargs.get("using", None) or router.db_for_write(Comment)
+        with transaction.atomic(using=using):
+            result = super(Comment, self).save(*args, **kwargs)
+            with connections[using].cursor() as cursor:
+                cursor.execute(
+                    f"WITH RECURSIVE new_comment AS (SELECT "
+                    f"%s::uuid AS uuid_comment, "
+                    f"%s::timestamptz AS created_date, "
+                    f"%s::uuid AS user_id, %s::text AS text, "
+                    f"%s::uuid AS parent_entity, "
+                    f"%s::int AS parent_entity_type_id), "
+                    f"{Comment.get_insert_effects_sql()} "
+                    f"SELECT ARRAY(SELECT uuid_comment FROM ancestors "
+                    f"ORDER BY depth)",
+                    [self.uuid_comment, self.created_date,
+                     self.user_id, self.text,
+                     uuid.UUID(str(self.parent_entity)),
+                     self.parent_entity_type_id]
+                )
+                self.ancestors = cursor.fetchone()[0]
+        return result
+
+    @staticmethod
+    def get_insert_effects_sql() -> str:
+        """Return CTEs that apply new comment to other tables in the same
+        statement. The new comment is read from CTE 'new_comment' with
+        columns (uuid_comment, created_date, user_id, text, parent_entity,
+        parent_entity_type_id) and the statement must start with
+        'WITH RECURSIVE'. CTE 'ancestors' has uuid_comment and depth
+        of the parent comment (depth 0) and all its ancestors.
+            - the event of new comment is added to the outbox;
+            - the daily rollups of the entity and the user are upserted,
+              the sketch gets the register of the value with set_byte;
+            - the participant is inserted first, so the summary of
+              the entity counts the user only once;
+            - the counts of replies of ancestors are increased, they are
+              locked in the order of primary key, so concurrent replies
+              to one thread don't deadlock.
+        """
+        comments = Comment._meta.db_table
+        user_index, user_rank = hyperloglog.get_register_sql("user_id")
+        entity_index, entity_rank = hyperloglog.get_register_sql(
+            "parent_entity"
+        )
+        empty = hyperloglog.empty_sql()
+        day = "(created_date AT TIME ZONE 'UTC')::date"
+        return f"""
+            registers AS (
+                SELECT {user_index} AS user_index, {user_rank} AS user_rank,
+                       {entity_index} AS entity_index,
+                       {entity_rank} AS entity_rank
+                FROM new_comment
+            ), outbox AS (
+                INSERT INTO {OutboxEvent._meta.db_table}
+                (created_date, event_type, payload)
+                SELECT now(), '{OutboxEvent.COMMENT_CREATED}',
+                       jsonb_build_object(
+                           'uuid_comment', uuid_comment::text,
+                           'created_date', to_jsonb(created_date),
+                           'user', user_id::text,
+                           'text', text,
+                           'parent_entity', parent_entity::text,
+                           'parent_entity_type', parent_entity_type_id
+                       )
+                FROM new_comment
+            ), entity_stats AS (
+                INSERT INTO {EntityDailyStats._meta.db_table} AS stats
+                (day, parent_entity, parent_entity_type_id,
+                 comments_count, participants)
+                SELECT {day}, parent_entity, parent_entity_type_id, 1,
+                       CASE WHEN user_id IS NULL THEN {empty}
+                       ELSE set_byte({empty}, user_index, user_rank) END
+                FROM new_comment, registers
+                ON CONFLICT (parent_entity, day) DO UPDATE SET
+                    comments_count = stats.comments_count + 1,
+                    participants = (
+                        SELECT CASE WHEN user_index IS NULL
+                        THEN stats.participants
+                        ELSE set_byte(stats.participants, user_index,
+                            greatest(get_byte(stats.participants,
+                                              user_index), user_rank))
+                        END FROM registers
+                    )
+            ), user_stats AS (
+                INSERT INTO {UserDailyStats._meta.db_table} AS stats
+                (day, user_id, comments_count, entities)
+                SELECT {day}, user_id, 1,
+                       set_byte({empty}, entity_index, entity_rank)
+                FROM new_comment, registers
+                WHERE user_id IS NOT NULL
+                ON CONFLICT (user_id, day) DO UPDATE SET
+                    comments_count = stats.comments_count + 1,
+                    entities = (
+                        SELECT set_byte(stats.entities, entity_index,
+                            greatest(get_byte(stats.entities, entity_index),
+                                     entity_rank))
+                        FROM registers
+                    )
+            ), participant AS (
+                INSERT INTO {EntityParticipant._meta.db_table}
+                (parent_entity, user_id)
+                SELECT parent_entity, user_id FROM new_comment
+                WHERE user_id IS NOT NULL
+                ON CONFLICT DO NOTHING
+                RETURNING 1
+            ), summary AS (
+                INSERT INTO {EntitySummary._meta.db_table} AS summary
+                (parent_entity, comments_count, participants_count,
+                 latest_comment_id, latest_created_date)
+                SELECT parent_entity, 1, (SELECT count(*) FROM participant),
+                       uuid_comment, created_date
+                FROM new_comment
+                ON CONFLICT (parent_entity) DO UPDATE SET
+                    comments_count = summary.comments_count + 1,
+                    participants_count = summary.participants_count
+                        + EXCLUDED.participants_count,
+                    latest_comment_id = CASE
+                        WHEN summary.latest_created_date IS NULL
+                        OR (EXCLUDED.latest_created_date,
+                            EXCLUDED.latest_comment_id)
+                        > (summary.latest_created_date,
+                           summary.latest_comment_id)
+                        THEN EXCLUDED.latest_comment_id
+                        ELSE summary.latest_comment_id END,
+                    latest_created_date = GREATEST(
+                        summary.latest_created_date,
+                        EXCLUDED.latest_created_date
+                    )
+            ), ancestors AS (
+                SELECT uuid_comment, parent_entity, 0 AS depth
+                FROM {comments}
+                WHERE uuid_comment = (SELECT parent_entity FROM new_comment)
+                UNION ALL
+                SELECT comment.uuid_comment, comment.parent_entity,
+                       ancestors.depth + 1
+                FROM {comments} AS comment
+                JOIN ancestors
+                ON comment.uuid_comment = ancestors.parent_entity
+            ), locked AS (
+                SELECT uuid_comment FROM {comments}
+                WHERE uuid_comment IN (SELECT uuid_comment FROM ancestors)
+                ORDER BY uuid_comment
+                FOR UPDATE
+            ), reply_counts AS (
+                UPDATE {comments} SET
+                    descendant_count = {comments}.descendant_count + 1,
+                    reply_count = {comments}.reply_count + CASE
+                        WHEN {comments}.uuid_comment = (
+                            SELECT parent_entity FROM new_comment
+                        ) THEN 1 ELSE 0 END
+                FROM locked
+                WHERE {comments}.uuid_comment = locked.uuid_comment
+            )
+        """
+
+    @staticmethod
+    def add_reply_counts(parent: uuid.UUID, replies: int, descendants: int,
+                         using: str = "default"):
+        """Add replies to the count of replies of the parent comment
+        and descendants to the count of descendants of the parent and
+        all its ancestors (negative values decrease the counts).
+        The ancestors are locked in the order of primary key, so
+        concurrent replies to one thread don't deadlock.
+        """
+        table = Comment._meta.db_table
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH RECURSIVE ancestors AS (
+                    SELECT uuid_comment, parent_entity
+                    FROM {table}
+                    WHERE uuid_comment = %s
+                    UNION ALL
+                    SELECT comment.uuid_comment, comment.parent_entity
+                    FROM {table} AS comment
+                    JOIN ancestors
+                    ON comment.uuid_comment = ancestors.parent_entity
+                ), locked AS (
+                    SELECT uuid_comment FROM {table}
+                    WHERE uuid_comment IN (
+                        SELECT uuid_comment FROM ancestors
+                    )
+                    ORDER BY uuid_comment
+                    FOR UPDATE
+                )
+                UPDATE {table} SET
+                    descendant_count = {table}.descendant_count + %s,
+                    reply_count = {table}.reply_count + CASE
+                        WHEN {table}.uuid_comment = %s THEN %s ELSE 0 END
+                FROM locked
+                WHERE {table}.uuid_comment = locked.uuid_comment
+                """,
+                [parent, descendants, parent, replies]
+            )
 
     def __str__(self):
         return self.text
+
+
+class OutboxEvent(models.Model):
+    """Model with events for other systems that are not delivered yet.
+    Events are saved in the transaction of the change and
+    the 'dispatch_outbox' command delivers and deletes them.
+    """
+
+    COMMENT_CREATED = "comment_created"
+
+    id = models.BigAutoField(primary_key=True)
+    created_date = models.DateTimeField(auto_now_add=True)
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField()
+
+    class Meta:
+        verbose_name = "outbox event"
+        verbose_name_plural = "outbox events"
+
+    def __str__(self):
+        return f"{self.event_type} {self.id}"
+
+
+class IdempotencyKey(models.Model):
+    """Model with Idempotency-Key values of created comments.
+    The key is kept as md5 of the author and the value, so keys of
+    different users don't collide and every row has the same small size.
+    The fingerprint is md5 of the payload, a retry with another payload
+    is rejected. A key is used again after 'IDEMPOTENCY_KEY_TTL',
+    the 'purge_idempotency_keys' command deletes expired keys.
+    """
+
+    key = models.UUIDField(primary_key=True)
+    created_date = models.DateTimeField(db_index=True)
+    uuid_comment = models.UUIDField()
+    fingerprint = models.UUIDField(null=True)
+
+    class Meta:
+        verbose_name = "idempotency key"
+        verbose_name_plural = "idempotency keys"
+
+    def __str__(self):
+        return str(self.key)
+
+
+class EntityDailyStats(models.Model):
+    """Model with the daily rollup of comments for an entity.
+    It is updated by 'Comment.save', so the statistics are read
+    without the table of comments.
+    """
+
+    day = models.DateField()
+    parent_entity = models.UUIDField()
+    parent_entity_type = models.ForeignKey(
+        EntityType, null=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    comments_count = models.PositiveIntegerField(default=0)
+    # HyperLogLog sketch of users that commented the entity
+    participants = models.BinaryField(default=hyperloglog.empty)
+
+    class Meta:
+        verbose_name = "entity daily stats"
+        verbose_name_plural = "entity daily stats"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["parent_entity", "day"], name="entity_stats_day_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["day"], name="entity_stats_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.parent_entity} {self.day}"
+
+
+class UserDailyStats(models.Model):
+    """Model with the daily rollup of comments for a user.
+    It is updated by 'Comment.save'.
+    """
+
+    day = models.DateField()
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+"
+    )
+    comments_count = models.PositiveIntegerField(default=0)
+    # HyperLogLog sketch of entities that the user commented
+    entities = models.BinaryField(default=hyperloglog.empty)
+
+    class Meta:
+        verbose_name = "user daily stats"
+        verbose_name_plural = "user daily stats"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "day"], name="user_stats_day_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["day"], name="user_stats_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.day}"
+
+
+class EntitySummary(models.Model):
+    """Model with the summary of comments of an entity for feeds.
+    It is updated by 'Comment.save', so summaries of many entities
+    are read by primary key without the table of comments.
+    """
+
+    parent_entity = models.UUIDField(primary_key=True)
+    comments_count = models.PositiveIntegerField(default=0)
+    participants_count = models.PositiveIntegerField(default=0)
+    latest_comment = models.ForeignKey(
+        Comment, null=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    latest_created_date = models.DateTimeField(null=True)
+
+    class Meta:
+        verbose_name = "entity summary"
+        verbose_name_plural = "entity summaries"
+
+    def __str__(self):
+        return str(self.parent_entity)
+
+
+class EntityParticipant(models.Model):
+    """Model with users that commented an entity.
+    It keeps 'EntitySummary.participants_count' exact.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    parent_entity = models.UUIDField()
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+"
+    )
+
+    class Meta:
+        verbose_name = "entity participant"
+        verbose_name_plural = "entity participants"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["parent_entity", "user"],
+                name="entity_participant_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.parent_entity} {self.user_id}"
+
+
+class ProfilingToggle(models.Model):
+    """Model with requests to profile, it is edited in admin.
+    The next 'remaining' requests to API with path that starts with
+    'path_prefix' are profiled by 'api.middleware.ProfilingMiddleware'
+    (only if 'PROFILING_ENABLED'), every profiled request decrements it.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    remaining = models.PositiveIntegerField(default=0)
+    path_prefix = models.CharField(max_length=200, default="/api/")
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "profiling toggle"
+        verbose_name_plural = "profiling toggles"
+
+    def __str__(self):
+        return f"{self.path_prefix} ({self.remaining})"
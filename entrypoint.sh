@@ -10,7 +10,19 @@ then
     echo "PostgreSQL started"
 fi
 
-python3 manage.py makemigrations comments && python3 manage.py migrate
-python3 manage.py set_demo_data
+if [ "$BOOT_MODE" = "fast" ]
+then
+    # production boot: migrations are applied by the deploy before
+    # the containers are started, so the schema is only checked here
+    if ! python3 manage.py check_schema
+    then
+        echo "The schema is not complete, run 'manage.py migrate'."
+        exit 1
+    fi
+else
+    # the migrations are committed in comments/migrations
+    python3 manage.py migrate
+    python3 manage.py set_demo_data
+fi
 
-exec "$@"
\ No newline at end of file
+exec "$@"
@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# the models can be imported only after the setup of django
+from api.events import sse_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Send the stream of new comments to 'sse_application'
+    and all other requests to django.
+    """
+    if scope["type"] == "http" and scope["path"] == "/api/events":
+        await sse_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
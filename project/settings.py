@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework',
 
@@ -47,6 +48,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.TracingMiddleware',
+    'api.middleware.SlowQueryMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.AdmissionControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -110,6 +115,241 @@ if os.environ.get('GITHUB_WORKFLOW'):
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # snapshots of whole comment trees, one entry per root comment;
+    # the cache must be shared by all processes that save comments
+    "tree-snapshots": {
+        "BACKEND": os.environ.get(
+            "TREE_SNAPSHOT_CACHE_BACKEND",
+            default="django.core.cache.backends.filebased.FileBasedCache"
+        ),
+        "LOCATION": os.environ.get(
+            "TREE_SNAPSHOT_CACHE_LOCATION", default="/tmp/tree-snapshots"
+        ),
+        "TIMEOUT": int(os.environ.get("TREE_SNAPSHOT_TIMEOUT", default=300)),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(
+                os.environ.get("TREE_SNAPSHOT_MAX_ENTRIES", default=1000)
+            ),
+        },
+    },
+}
+
+# alias of the cache of snapshots, e.g. "tree-snapshots"; empty value -
+# snapshots are off, they are also off with a cache of one process
+# (LocMemCache), because the other processes wouldn't patch it
+TREE_SNAPSHOT_CACHE = os.environ.get("TREE_SNAPSHOT_CACHE", default="")
+# trees with more comments are not cached
+TREE_SNAPSHOT_MAX_NODES = int(
+    os.environ.get("TREE_SNAPSHOT_MAX_NODES", default=10000)
+)
+
+
+# Full-text search
+# https://www.postgresql.org/docs/current/textsearch-configuration.html
+
+COMMENT_SEARCH_CONFIG = os.environ.get("COMMENT_SEARCH_CONFIG", "simple")
+
+
+# Responses built by database (/api/first-lvl-comments and the whole
+# tree of /api/child-comments), Python only joins bytes of JSON.
+# The tree is streamed while it is read by WSGI, ASGI sends it at once
+
+DB_JSON_RESPONSES = bool(int(os.environ.get("DB_JSON_RESPONSES", default=0)))
+
+
+# Live feed of new comments (/api/events, ASGI only)
+
+# seconds between heartbeats of idle connection
+SSE_HEARTBEAT_SECONDS = int(
+    os.environ.get("SSE_HEARTBEAT_SECONDS", default=15)
+)
+# not sent events of one connection, the slow connection is closed
+SSE_MAX_PENDING_BYTES = int(
+    os.environ.get("SSE_MAX_PENDING_BYTES", default=256 * 1024)
+)
+# how many missed comments are sent after resuming by Last-Event-ID
+SSE_MAX_REPLAY = int(os.environ.get("SSE_MAX_REPLAY", default=1000))
+
+
+# Change feed (/api/changes)
+
+# the newest comments are not returned until all transactions that could
+# create comments before them are committed
+CHANGE_FEED_DELAY_SECONDS = int(
+    os.environ.get("CHANGE_FEED_DELAY_SECONDS", default=5)
+)
+
+
+# Outbox of events for other systems (dispatch_outbox command)
+
+# file:<path> or URL of HTTP endpoint
+OUTBOX_SINK = os.environ.get("OUTBOX_SINK", "file:outbox.jsonl")
+
+
+# Readiness probe (/api/ready)
+
+# the process is not ready while the simplest query is slower (ms)
+READINESS_MAX_DB_LATENCY = float(
+    os.environ.get("READINESS_MAX_DB_LATENCY", default=500)
+)
+
+
+# Idempotency-Key header of /api/new-comments/
+
+# seconds while the retry with the same key returns the original result
+IDEMPOTENCY_KEY_TTL = int(
+    os.environ.get("IDEMPOTENCY_KEY_TTL", default=24 * 60 * 60)
+)
+
+
+# Admission control of API (api.middleware.AdmissionControlMiddleware)
+
+# META key with address of client behind a proxy,
+# e.g. HTTP_X_FORWARDED_FOR
+API_CLIENT_IP_HEADER = os.environ.get("API_CLIENT_IP_HEADER", default="")
+
+# token bucket of every client: requests per second and burst size;
+# the limit is off by default (API_RATE_LIMIT_RATE=0), it is enabled
+# only with API_CLIENT_IP_HEADER, otherwise all clients behind a proxy
+# would share the bucket of its address (API_RATE_LIMIT_REMOTE_ADDR=1
+# enables it by REMOTE_ADDR for a server without proxy)
+API_RATE_LIMIT = None
+if float(os.environ.get("API_RATE_LIMIT_RATE", default=0)) and (
+        API_CLIENT_IP_HEADER or
+        int(os.environ.get("API_RATE_LIMIT_REMOTE_ADDR", default=0))
+):
+    API_RATE_LIMIT = {
+        "rate": float(os.environ.get("API_RATE_LIMIT_RATE")),
+        "burst": int(os.environ.get("API_RATE_LIMIT_BURST", default=100)),
+    }
+
+# requests that are processed at once by one process
+API_CONCURRENCY_LIMITS = {
+    "/api/child-comments": int(
+        os.environ.get("API_CHILD_COMMENTS_CONCURRENCY", default=4)
+    ),
+    "/api/history-comments": int(
+        os.environ.get("API_HISTORY_CONCURRENCY", default=4)
+    ),
+    "/api/history/user": int(
+        os.environ.get("API_HISTORY_CONCURRENCY", default=4)
+    ),
+    "/api/history/entity": int(
+        os.environ.get("API_HISTORY_CONCURRENCY", default=4)
+    ),
+    "/api/search-comments": int(
+        os.environ.get("API_SEARCH_CONCURRENCY", default=4)
+    ),
+}
+
+# timeout of every SQL statement of the endpoints (ms)
+API_STATEMENT_TIMEOUTS = {
+    "/api/child-comments": int(
+        os.environ.get("API_CHILD_COMMENTS_TIMEOUT", default=10000)
+    ),
+    "/api/history-comments": int(
+        os.environ.get("API_HISTORY_TIMEOUT", default=5000)
+    ),
+    "/api/history/user": int(
+        os.environ.get("API_HISTORY_TIMEOUT", default=5000)
+    ),
+    "/api/history/entity": int(
+        os.environ.get("API_HISTORY_TIMEOUT", default=5000)
+    ),
+    "/api/search-comments": int(
+        os.environ.get("API_SEARCH_TIMEOUT", default=5000)
+    ),
+}
+
+# seconds to wait for a free slot before 503
+API_QUEUE_TIMEOUT = float(os.environ.get("API_QUEUE_TIMEOUT", default=0.5))
+
+# value of Retry-After header of 503 responses
+API_RETRY_AFTER_SECONDS = int(
+    os.environ.get("API_RETRY_AFTER_SECONDS", default=1)
+)
+
+
+# Coalescing of identical concurrent requests (api.coalescing)
+
+# seconds to wait for the result of the identical request
+COALESCING_TIMEOUT = int(os.environ.get("COALESCING_TIMEOUT", default=10))
+
+# cache to coalesce requests of different processes, it must be shared
+# by them, e.g. file based cache; empty value - only in one process
+COALESCING_CACHE = os.environ.get("COALESCING_CACHE", default="")
+
+# seconds to keep the result for processes that wait for it
+COALESCING_RESULT_TIMEOUT = int(
+    os.environ.get("COALESCING_RESULT_TIMEOUT", default=1)
+)
+
+
+# Tracing of API requests (api.middleware.TracingMiddleware)
+
+# part of requests that are traced, 0 disables the tracing
+TRACING_SAMPLE_RATE = float(os.environ.get("TRACING_SAMPLE_RATE", default=0))
+# spans of traced requests in OTLP JSON, one trace per line
+# (summarize_traces command)
+TRACING_FILE = os.environ.get("TRACING_FILE", default="traces.jsonl")
+# spans of one request, the next spans are not recorded
+TRACING_MAX_SPANS = int(os.environ.get("TRACING_MAX_SPANS", default=1000))
+TRACING_SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", default="comments")
+
+
+# Capture of slow SQL statements (api.middleware.SlowQueryMiddleware)
+
+# statements of API requests that are slower are captured (ms),
+# 0 disables the capture
+SLOW_QUERY_THRESHOLD = float(os.environ.get("SLOW_QUERY_THRESHOLD", default=0))
+# part of slow statements that are captured
+SLOW_QUERY_SAMPLE_RATE = float(
+    os.environ.get("SLOW_QUERY_SAMPLE_RATE", default=1)
+)
+# captured statements with plans, one per line (slow_queries command)
+SLOW_QUERY_FILE = os.environ.get(
+    "SLOW_QUERY_FILE", default="slow_queries.jsonl"
+)
+# statements waiting for EXPLAIN, the next ones are dropped
+SLOW_QUERY_QUEUE_SIZE = int(
+    os.environ.get("SLOW_QUERY_QUEUE_SIZE", default=100)
+)
+# timeout of EXPLAIN ANALYZE of a captured statement (ms)
+SLOW_QUERY_EXPLAIN_TIMEOUT = int(
+    os.environ.get("SLOW_QUERY_EXPLAIN_TIMEOUT", default=10000)
+)
+
+
+# On-demand profiling of API requests (api.middleware.ProfilingMiddleware)
+
+# the middleware is used only if the profiling is enabled
+PROFILING_ENABLED = bool(int(os.environ.get("PROFILING_ENABLED", default=0)))
+# requests with header 'X-Profile-Token: <token>' are profiled,
+# empty value disables the header
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", default="")
+# seconds between checks of profiling toggles of admin
+PROFILING_POLL_INTERVAL = float(
+    os.environ.get("PROFILING_POLL_INTERVAL", default=5)
+)
+# directory of profiles (render_profile command)
+PROFILING_DIR = os.environ.get("PROFILING_DIR", default="profiles")
+# frames of traceback of every allocation site
+PROFILING_TRACEMALLOC_FRAMES = int(
+    os.environ.get("PROFILING_TRACEMALLOC_FRAMES", default=1)
+)
+# allocation sites in the summary of profile
+PROFILING_TOP_ALLOCATIONS = int(
+    os.environ.get("PROFILING_TOP_ALLOCATIONS", default=30)
+)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 UserAttributeSimilarityValidator =\
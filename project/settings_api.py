@@ -0,0 +1,50 @@
+"""
+API-only settings of project.
+
+The JSON API doesn't use admin, sessions, messages, CSRF and templates,
+so this profile doesn't load them: the startup is faster and every
+request passes less middleware. The documentation, admin and
+'api-auth/' are served only with 'project.settings'.
+
+Usage:
+    DJANGO_SETTINGS_MODULE=project.settings_api gunicorn project.wsgi
+
+Compare with the full profile:
+    python manage.py benchmark_settings
+"""
+from project.settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.postgres',
+
+    'rest_framework',
+
+    'api',
+    'comments',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'api.middleware.TracingMiddleware',
+    'api.middleware.SlowQueryMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.AdmissionControlMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+REST_FRAMEWORK = {
+    'DEFAULT_PERMISSION_CLASSES': ('rest_framework.permissions.AllowAny',),
+    # requests are anonymous, 'request.user' is None
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'UNAUTHENTICATED_USER': None,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'DEFAULT_PARSER_CLASSES': ['rest_framework.parsers.JSONParser'],
+}
+
+ROOT_URLCONF = 'project.urls_api'
+
+TEMPLATES = []
+
+AUTH_PASSWORD_VALIDATORS = []
+
+USE_I18N = False
@@ -0,0 +1,7 @@
+from django.urls import include, path
+
+# URLs of API-only settings (project.settings_api). #
+
+urlpatterns = [
+    path("api/", include("api.urls")),
+]
@@ -0,0 +1,161 @@
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+
+from api.middleware import AdmissionControlMiddleware
+from comments.models import Comment, EntityType, User
+
+
+def send_in_thread(content) -> bytes:
+    """Send the streaming content in another thread as the ASGI
+    handler does.
+    """
+    def send():
+        try:
+            return b"".join(content)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(send).result()
+
+
+class AdmissionControlTest(TestCase):
+    """Test rejecting requests by admission control."""
+    parent_entity = uuid.uuid4()
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create 120 comments for one entity.
+        """
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        user = User.objects.create(nickname="nick", firstname="Nick")
+        for number in range(120):
+            Comment.objects.create(
+                user=user,
+                text=f"Comment{number}",
+                parent_entity=cls.parent_entity,
+                parent_entity_type=entity_type
+            )
+
+    def get_comments(self, params=""):
+        return self.client.get(
+            f"/api/first-lvl-comments?entity={self.parent_entity}{params}"
+        )
+
+    @override_settings(API_RATE_LIMIT={"rate": 0.01, "burst": 2})
+    def test_rate_limit(self):
+        """The client gets 429 when its tokens are over."""
+        self.assertEqual(self.get_comments().status_code, 200)
+        self.assertEqual(self.get_comments().status_code, 200)
+
+        response = self.get_comments()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "100")
+        self.assertEqual(
+            json.loads(response.content)["message"],
+            "Too many requests, try again later."
+        )
+
+    @override_settings(
+        API_CONCURRENCY_LIMITS={"/api/first-lvl-comments": 0},
+        API_QUEUE_TIMEOUT=0
+    )
+    def test_concurrency_limit(self):
+        """The endpoint returns 503 when all its slots are busy."""
+        response = self.get_comments()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(
+            json.loads(response.content)["message"],
+            "The server is busy, try again later."
+        )
+
+    @override_settings(
+        API_STATEMENT_TIMEOUTS={"/api/first-lvl-comments": 1000}
+    )
+    def test_statement_timeout_is_reset(self):
+        """The timeout is applied only while the request is processed."""
+        self.assertEqual(self.get_comments().status_code, 200)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW statement_timeout")
+            self.assertEqual(cursor.fetchone()[0], "0")
+
+    def test_max_page_size(self):
+        """Too large page size is reduced to the maximum."""
+        data = json.loads(self.get_comments("&page_size=1000").content)
+
+        self.assertEqual(data["comments_count"], 120)
+        self.assertEqual(len(data["comments"]), 100)
+
+
+class StatementTimeoutTest(TransactionTestCase):
+    """Test cancelling slow statements by admission control.
+    The cancelled statement aborts the transaction, so the test
+    isn't run in a transaction.
+    """
+
+    def setUp(self):
+        self.parent_entity = uuid.uuid4()
+
+    @override_settings(
+        API_STATEMENT_TIMEOUTS={"/api/first-lvl-comments": 100}
+    )
+    def test_slow_statement(self):
+        """The request gets 503 when its statement is cancelled."""
+        executed = []
+
+        def slow_statement(execute, sql, params, many, context):
+            # only the first statement of the request is slow
+            if not executed:
+                executed.append(sql)
+                return execute("SELECT pg_sleep(1)", None, many, context)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(slow_statement):
+            response = self.client.get(
+                f"/api/first-lvl-comments?entity={self.parent_entity}"
+            )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(
+            json.loads(response.content)["message"],
+            "The request took too long, try again later."
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW statement_timeout")
+            self.assertEqual(cursor.fetchone()[0], "0")
+
+
+class StreamingStatementTimeoutTest(TestCase):
+    """Test the statement timeout of streaming responses."""
+
+    @override_settings(API_STATEMENT_TIMEOUTS={"/api/stream": 1000})
+    def test_stream_sent_by_another_thread(self):
+        """The timeout of the request is reset in its thread and
+        the stream gets the timeout in the thread that sends it.
+        """
+        def get_response(request):
+            def content():
+                with connection.cursor() as cursor:
+                    cursor.execute("SHOW statement_timeout")
+                    yield cursor.fetchone()[0].encode()
+            return StreamingHttpResponse(content())
+
+        middleware = AdmissionControlMiddleware(get_response)
+        response = middleware(RequestFactory().get("/api/stream"))
+
+        self.assertEqual(connection.execute_wrappers, [])
+        self.assertEqual(send_in_thread(response.streaming_content), b"1s")
@@ -0,0 +1,44 @@
+import io
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+
+class CheckSchemaTest(TestCase):
+    """Test work the check of schema before the fast boot."""
+
+    def check_schema(self) -> str:
+        out = io.StringIO()
+        call_command("check_schema", stdout=out)
+        return out.getvalue()
+
+    def test_complete_schema(self):
+        """The migrated database passes the check."""
+        self.assertIn("The schema is complete.", self.check_schema())
+
+    def test_unapplied_migration(self):
+        """The check fails if a migration is not applied."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM django_migrations WHERE app = 'comments' "
+                "AND name = '0011_profilingtoggle'"
+            )
+
+        with self.assertRaisesMessage(
+                CommandError,
+                "The migration comments.0011_profilingtoggle is not applied."
+        ):
+            self.check_schema()
+
+    def test_missing_table(self):
+        """The check fails if a table of comments does not exist."""
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE comments_profilingtoggle")
+
+        with self.assertRaisesMessage(
+                CommandError,
+                "The table comments_profilingtoggle does not exist."
+        ):
+            self.check_schema()
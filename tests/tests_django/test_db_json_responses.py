@@ -0,0 +1,129 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+from django.test import TestCase, override_settings
+
+from api.services import (get_child_comments_tree_json,
+                          get_child_comments_tree_json_stream)
+from comments.models import Comment, EntityType, User
+
+
+class DatabaseJSONResponsesTest(TestCase):
+    """Test that responses built by database are the same as
+    responses built by python.
+    """
+    parent_entity = uuid.uuid4()
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create a tree of comments: the root has 2 replies, the first
+        reply has a reply. Some comments have microseconds in the date,
+        one comment has no user and no type.
+        """
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        user = User.objects.create(nickname="nick", firstname="Nick")
+
+        def create(parent, text, second, microsecond=0, **fields):
+            return Comment.objects.create(
+                user=fields.get("user", user),
+                text=text,
+                created_date=datetime(
+                    2021, 9, 1, 0, 0, second, microsecond,
+                    tzinfo=timezone.utc
+                ),
+                parent_entity=parent,
+                parent_entity_type=fields.get("entity_type", entity_type)
+            )
+
+        cls.root = create(cls.parent_entity, "Root \"quoted\" ü", 1, 5)
+        first = create(cls.root.uuid_comment, "First\nreply", 2)
+        create(cls.root.uuid_comment, "Second", 3, 123000, user=None,
+               entity_type=None)
+        create(first.uuid_comment, "Reply to first", 4, 999999)
+        for second in range(5, 17):
+            create(cls.parent_entity, f"Other {second}", second)
+
+    def get_both(self, url):
+        """Return responses of url built by database and by python."""
+        responses = []
+        for enabled in (True, False):
+            with override_settings(DB_JSON_RESPONSES=enabled):
+                responses.append(self.client.get(url))
+        return responses
+
+    def test_first_level_comments(self):
+        """Pages of first level comments are the same."""
+        for params in ("", "&page=2", "&page_size=5&page=3", "&page=last"):
+            url = f"/api/first-lvl-comments?entity={self.parent_entity}"
+            fast, slow = self.get_both(url + params)
+
+            self.assertEqual(fast.status_code, 200)
+            self.assertEqual(fast["Content-Type"], "application/json")
+            self.assertEqual(json.loads(fast.content), slow.json())
+
+    def test_first_level_comments_errors(self):
+        """Invalid page and entity are processed as before."""
+        for params in (f"entity={self.parent_entity}&page=10",
+                       "entity=1", ""):
+            fast, slow = self.get_both(f"/api/first-lvl-comments?{params}")
+
+            self.assertEqual(fast.status_code, slow.status_code)
+            self.assertEqual(fast.json(), slow.json())
+
+    def test_first_level_comments_in_two_queries(self):
+        """The count and the page are two queries."""
+        with override_settings(DB_JSON_RESPONSES=True):
+            with self.assertNumQueries(2):
+                self.client.get(
+                    f"/api/first-lvl-comments?entity={self.parent_entity}"
+                )
+
+    def test_tree(self):
+        """The whole tree is the same and it is one query
+        (and the reset of statement_timeout of the endpoint).
+        """
+        url = f"/api/child-comments?root={self.root.uuid_comment}"
+        with override_settings(DB_JSON_RESPONSES=True):
+            with self.assertNumQueries(2):
+                fast = self.client.get(url + "&fast")
+                content = fast.getvalue()
+        slow = self.client.get(url + "&slow")
+
+        self.assertEqual(fast.status_code, 200)
+        self.assertTrue(fast.streaming)
+        data = json.loads(content)
+        self.assertEqual(data, slow.json())
+        self.assertEqual(data["created_date"], "2021-09-01T00:00:01.000005Z")
+        self.assertEqual(
+            [child["text"] for child in data["child"]],
+            ["Second", "First\nreply"]
+        )
+        self.assertEqual(
+            data["child"][1]["child"][0]["text"], "Reply to first"
+        )
+
+    def test_tree_not_found(self):
+        """The response for not found root is the same."""
+        fast, slow = self.get_both(f"/api/child-comments?root={uuid.uuid4()}")
+
+        self.assertEqual(fast.status_code, 400)
+        self.assertEqual(fast.json(), slow.json())
+
+    def test_tree_by_chunks(self):
+        """The tree read by chunks of one row is the same."""
+        parts = list(get_child_comments_tree_json_stream(
+            self.root.uuid_comment, chunk_size=1
+        ))
+
+        self.assertEqual(len(parts), 5)
+        self.assertEqual(
+            b"".join(parts),
+            get_child_comments_tree_json(self.root.uuid_comment)
+        )
+        self.assertEqual(
+            list(get_child_comments_tree_json_stream(uuid.uuid4())), []
+        )
@@ -0,0 +1,64 @@
+import io
+import json
+import os
+import tempfile
+import uuid
+
+from django.core.management import call_command
+from django.test import LiveServerTestCase, override_settings
+
+from comments.models import Comment, EntityType, User
+
+
+@override_settings(API_RATE_LIMIT=None)
+class LoadTestTest(LiveServerTestCase):
+    """Test work the load test against the live server."""
+
+    def setUp(self):
+        """Set up the data for test.
+        Create a comment with a reply.
+        """
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        user = User.objects.create(nickname="nick", firstname="Nick")
+        root = Comment.objects.create(
+            user=user, text="Root", parent_entity=uuid.uuid4(),
+            parent_entity_type=entity_type
+        )
+        Comment.objects.create(
+            user=user, text="Reply", parent_entity=root.uuid_comment,
+            parent_entity_type=entity_type
+        )
+
+    def load_test(self, baseline, **options):
+        stdout = io.StringIO()
+        call_command(
+            "load_test", url=self.live_server_url, requests=40,
+            concurrency=4, baseline=baseline, stdout=stdout,
+            stderr=io.StringIO(), **options
+        )
+        return stdout.getvalue()
+
+    def test_load_test_with_baseline(self):
+        """All endpoints answer and the second run is compared
+        with the saved baseline.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "baseline.json")
+
+            output = self.load_test(baseline, save_baseline=True)
+            with open(baseline) as file:
+                statistics = json.load(file)["statistics"]
+            compared = self.load_test(baseline)
+
+        self.assertIn("The baseline was saved", output)
+        self.assertEqual(statistics["total"]["requests"], 40)
+        self.assertEqual(statistics["total"]["errors"], 0)
+        self.assertEqual(
+            set(statistics), {"create", "csv", "first-level", "history",
+                              "tree", "total"}
+        )
+        for status in statistics["total"]["statuses"]:
+            self.assertEqual(status[0], "2")
+        self.assertIn("Comparison with", compared)
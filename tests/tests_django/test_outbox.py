@@ -0,0 +1,123 @@
+import io
+import json
+import os
+import tempfile
+import uuid
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from api.outbox import FileSink, dispatch, dispatch_batch
+from comments.models import Comment, EntityType, OutboxEvent, User
+
+
+class FailingSink:
+    """Sink that can't deliver events."""
+
+    def send(self, events):
+        raise ConnectionError("Sink is not available")
+
+
+class FlakySink(FileSink):
+    """File sink that fails the first time."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.failed = False
+
+    def send(self, events):
+        if not self.failed:
+            self.failed = True
+            raise TimeoutError("Sink timed out")
+        super().send(events)
+
+
+class OutboxTest(TestCase):
+    """Test work the outbox of events."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create 2 comments, so there are 2 events.
+        """
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        user = User.objects.create(nickname="nick", firstname="Nick")
+        for text in ("Comment1", "Comment2"):
+            Comment.objects.create(
+                user=user,
+                text=text,
+                parent_entity=uuid.uuid4(),
+                parent_entity_type=entity_type
+            )
+
+    def test_event_is_saved_with_comment(self):
+        """Every new comment has an event."""
+        events = OutboxEvent.objects.order_by("id")
+
+        self.assertEqual(events.count(), 2)
+        self.assertEqual(events[0].event_type, OutboxEvent.COMMENT_CREATED)
+        self.assertEqual(events[0].payload["text"], "Comment1")
+
+    def test_dispatch_to_file(self):
+        """Events are written to the file and deleted from the outbox."""
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "events.jsonl")
+        out = io.StringIO()
+
+        call_command(
+            "dispatch_outbox", "--once", "--batch-size", "1",
+            "--sink", f"file:{path}", stdout=out
+        )
+
+        with open(path) as file:
+            events = [json.loads(line) for line in file]
+        self.assertEqual(
+            [event["payload"]["text"] for event in events],
+            ["Comment1", "Comment2"]
+        )
+        self.assertEqual(OutboxEvent.objects.count(), 0)
+        self.assertIn("Delivered events: 2.", out.getvalue())
+
+    def test_failed_delivery_keeps_events(self):
+        """Events stay in the outbox if the sink fails."""
+        with self.assertRaises(ConnectionError):
+            dispatch_batch(FailingSink(), 10)
+
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+
+    def test_dispatch_retries_failed_sink(self):
+        """Events are delivered after the sink failed once."""
+        path = os.path.join(tempfile.mkdtemp(), "events.jsonl")
+        messages = []
+
+        with mock.patch("api.outbox.time.sleep") as sleep:
+            dispatch(FlakySink(path), 10, 0, True, report=messages.append)
+
+        sleep.assert_called_once_with(1)
+        with open(path) as file:
+            self.assertEqual(len(file.readlines()), 2)
+        self.assertEqual(OutboxEvent.objects.count(), 0)
+        self.assertEqual(
+            messages[0], "Sink failed (TimeoutError: Sink timed out), "
+                         "retry in 1s."
+        )
+        self.assertEqual(messages[-1], "Delivered events: 2.")
+
+    def test_dispatch_stops_after_retries(self):
+        """The command stops if the sink fails more than retries."""
+        with mock.patch(
+                "api.management.commands.dispatch_outbox.get_sink",
+                return_value=FailingSink()
+        ):
+            with mock.patch("api.outbox.time.sleep"):
+                with self.assertRaisesMessage(
+                        CommandError, "The sink failed: Sink is not available"
+                ):
+                    call_command(
+                        "dispatch_outbox", "--once", "--retries", "2",
+                        stdout=io.StringIO()
+                    )
+        self.assertEqual(OutboxEvent.objects.count(), 2)
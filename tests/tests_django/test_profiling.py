@@ -0,0 +1,111 @@
+import io
+import os
+import tempfile
+import uuid
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from comments.models import Comment, EntityType, ProfilingToggle, User
+
+
+class ProfilingTest(TestCase):
+    """Test work the on-demand profiling of requests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create root comment with a reply.
+        """
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        user = User.objects.create(nickname="nick", firstname="Nick")
+        date = datetime(2021, 9, 6, 10, 0, 0, tzinfo=timezone.utc)
+        root = Comment.objects.create(
+            user=user, text="ROOT", created_date=date,
+            parent_entity=uuid.uuid4(), parent_entity_type=entity_type
+        )
+        cls.root_uuid = root.uuid_comment
+        Comment.objects.create(
+            user=user, text="child", created_date=date,
+            parent_entity=cls.root_uuid, parent_entity_type=entity_type
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(
+            PROFILING_ENABLED=True, PROFILING_TOKEN="secret",
+            PROFILING_DIR=self.directory, PROFILING_POLL_INTERVAL=0
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def get_tree(self, **headers):
+        response = self.client.get(
+            f"/api/child-comments?root={self.root_uuid}", **headers
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_profile_by_header(self):
+        """The request with the token is profiled and rendered."""
+        response = self.get_tree(HTTP_X_PROFILE_TOKEN="secret")
+        profile_id = response["X-Profile-Id"]
+
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            [f"{profile_id}.json", f"{profile_id}.prof"]
+        )
+        out = io.StringIO()
+        call_command("render_profile", profile_id, stdout=out)
+        output = out.getvalue()
+        self.assertIn(f"GET /api/child-comments?root={self.root_uuid}",
+                      output)
+        self.assertIn("Allocations:", output)
+        self.assertIn("manage_all_child_comments (api/views.py:", output)
+        self.assertIn("get_child_comments_tree (api/services.py:", output)
+
+        out = io.StringIO()
+        call_command("render_profile", stdout=out)
+        self.assertIn(f"{profile_id} ", out.getvalue())
+
+    def test_wrong_token(self):
+        """The request without the valid token is not profiled."""
+        for headers in ({}, {"HTTP_X_PROFILE_TOKEN": "wrong"}):
+            response = self.get_tree(**headers)
+            self.assertNotIn("X-Profile-Id", response)
+        with override_settings(PROFILING_TOKEN=""):
+            response = self.get_tree(HTTP_X_PROFILE_TOKEN="")
+            self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_admin_toggle(self):
+        """The next 'remaining' requests of the path are profiled."""
+        toggle = ProfilingToggle.objects.create(
+            remaining=2, path_prefix="/api/child-comments"
+        )
+
+        response = self.client.get(
+            f"/api/first-lvl-comments?entity={self.root_uuid}"
+        )
+        self.assertNotIn("X-Profile-Id", response)
+        profiled = [
+            "X-Profile-Id" in self.get_tree() for _ in range(3)
+        ]
+        self.assertEqual(profiled, [True, True, False])
+        toggle.refresh_from_db()
+        self.assertEqual(toggle.remaining, 0)
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+    def test_no_queries_without_toggles(self):
+        """Toggles are not read again until the poll interval."""
+        with override_settings(PROFILING_POLL_INTERVAL=3600):
+            self.get_tree()
+            with self.assertNumQueries(0):
+                # the response without queries
+                response = self.client.get("/api/child-comments")
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,133 @@
+import io
+import os
+import tempfile
+import uuid
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from api.retention import get_replication_lag, purge_batch, save_checkpoint
+from api.snapshots import SNAPSHOT_KEY, get_snapshot_cache
+from comments.models import (Comment, EntityParticipant, EntitySummary,
+                             EntityType, User)
+
+
+class RetentionTest(TestCase):
+    """Test work the retention purge of old comments."""
+    parent_entity = uuid.uuid4()
+    cutoff = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create the tree of comments with years of creation, the old
+        comment is the only comment of other user:
+            old (2020)
+                new reply (2022)
+            new (2022)
+                old reply (2020)
+                    old reply of reply (2020)
+        """
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        user = User.objects.create(nickname="nick", firstname="Nick")
+        other = User.objects.create(nickname="other", firstname="Other")
+
+        def create(text, parent_entity, year, author=user):
+            return Comment.objects.create(
+                user=author,
+                text=text,
+                created_date=datetime(year, 9, 1, tzinfo=timezone.utc),
+                parent_entity=parent_entity,
+                parent_entity_type=entity_type
+            ).uuid_comment
+
+        old = create("old", cls.parent_entity, 2020, other)
+        create("new reply", old, 2022)
+        new = create("new", cls.parent_entity, 2022)
+        cls.new = new
+        old_reply = create("old reply", new, 2020)
+        create("old reply of reply", old_reply, 2020)
+
+    def purge(self, *args):
+        out = io.StringIO()
+        call_command(
+            "purge_comments", "--before", "2021-01-01", "--sleep", "0",
+            "--checkpoint", "", *args, stdout=out
+        )
+        return out.getvalue()
+
+    def test_purge_subtrees(self):
+        """Old comments are deleted with all their replies."""
+        output = self.purge("--batch-size", "1")
+
+        self.assertEqual(
+            list(Comment.objects.values_list("text", flat=True)), ["new"]
+        )
+        self.assertIn("Deleted comments: 4.", output)
+        self.assertIn("rows/s", output)
+
+    def test_counts_are_decreased(self):
+        """Counts of the remaining parent and the summary are decreased."""
+        self.purge()
+
+        new = Comment.objects.get(text="new")
+        self.assertEqual((new.reply_count, new.descendant_count), (0, 0))
+        summary = EntitySummary.objects.get(parent_entity=self.parent_entity)
+        self.assertEqual(summary.comments_count, 1)
+
+    def test_summaries_are_recomputed(self):
+        """Participants and the latest comment of summaries are recomputed."""
+        self.purge()
+
+        summary = EntitySummary.objects.get(parent_entity=self.parent_entity)
+        self.assertEqual(summary.participants_count, 1)
+        self.assertEqual(summary.latest_comment_id, self.new)
+        self.assertEqual(
+            list(EntityParticipant.objects.filter(
+                parent_entity=self.parent_entity
+            ).values_list("user__nickname", flat=True)),
+            ["nick"]
+        )
+        # all replies of the new comment are deleted
+        summary = EntitySummary.objects.get(parent_entity=self.new)
+        self.assertEqual(
+            (summary.comments_count, summary.participants_count,
+             summary.latest_comment_id, summary.latest_created_date),
+            (0, 0, None, None)
+        )
+        self.assertFalse(
+            EntityParticipant.objects.filter(parent_entity=self.new).exists()
+        )
+
+    @override_settings(TREE_SNAPSHOT_CACHE="tree-snapshots")
+    def test_snapshots_are_deleted(self):
+        """The snapshots of the remaining ancestors are deleted."""
+        get_snapshot_cache().clear()
+        self.client.get(f"/api/child-comments?root={self.new}")
+        key = SNAPSHOT_KEY.format(self.new)
+        self.assertIsNotNone(get_snapshot_cache().get(key))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.purge()
+
+        self.assertIsNone(get_snapshot_cache().get(key))
+
+    def test_resume_from_checkpoint(self):
+        """The purge continues from the saved batch with its cutoff."""
+        path = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+        deleted, last = purge_batch(self.cutoff, None, 1)
+        save_checkpoint(path, self.cutoff, last, deleted)
+
+        output = self.purge("--checkpoint", path, "--max-lag", "10")
+
+        self.assertIn(f"Resume from {last}", output)
+        self.assertIn("Deleted comments: 4.", output)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_replication_lag_without_replicas(self):
+        """There is no lag without replicas."""
+        self.assertEqual(get_replication_lag(), 0)
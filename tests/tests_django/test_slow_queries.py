@@ -0,0 +1,154 @@
+import io
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from api.middleware import SlowQueryMiddleware
+from api.slow_queries import read_slow_queries, writer
+from comments.models import Comment, EntityType, User
+from tests.tests_django.test_admission_control import send_in_thread
+
+
+class SlowQueriesTest(TestCase):
+    """Test work the capture of slow SQL statements."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create root comment with a reply.
+        """
+        cls.entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        cls.user = User.objects.create(nickname="nick", firstname="Nick")
+        root = Comment.objects.create(
+            user=cls.user, text="ROOT",
+            created_date=datetime(2021, 9, 6, tzinfo=timezone.utc),
+            parent_entity=uuid.uuid4(), parent_entity_type=cls.entity_type
+        )
+        cls.root_uuid = root.uuid_comment
+        Comment.objects.create(
+            user=cls.user, text="child",
+            created_date=datetime(2021, 9, 7, tzinfo=timezone.utc),
+            parent_entity=cls.root_uuid, parent_entity_type=cls.entity_type
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "slow_queries.jsonl")
+
+    def capture(self, request) -> list:
+        """Run request with capture of all statements."""
+        with override_settings(SLOW_QUERY_THRESHOLD=0.001,
+                               SLOW_QUERY_FILE=self.path):
+            response = request()
+            writer.flush()
+        self.assertLess(response.status_code, 300)
+        return read_slow_queries(self.path)
+
+    def test_select_is_analyzed(self):
+        """Statements of view are captured with EXPLAIN ANALYZE."""
+        records = self.capture(lambda: self.client.get(
+            f"/api/child-comments?root={self.root_uuid}"
+        ))
+
+        self.assertTrue(records)
+        selects = [
+            record for record in records
+            if record["sql"].startswith("SELECT")
+        ]
+        self.assertTrue(selects)
+        for record in selects:
+            self.assertEqual(
+                record["view"], "api.views.manage_all_child_comments"
+            )
+            self.assertEqual(record["path"], "/api/child-comments")
+            self.assertTrue(record["analyzed"])
+            self.assertIn("Actual Total Time", record["plan"][0]["Plan"])
+            self.assertNotIn("%s", record["shape"])
+        self.assertIn(
+            str(self.root_uuid),
+            [str(param) for record in selects for param in record["params"]]
+        )
+
+    def test_insert_is_not_analyzed(self):
+        """Statements that change data are explained without ANALYZE."""
+        count = Comment.objects.count()
+        records = self.capture(lambda: self.client.post(
+            "/api/new-comments/", {
+                "author": self.user.nickname,
+                "text": "new",
+                "parent_entity_uuid": str(self.root_uuid),
+                "parent_entity_type": self.entity_type.name,
+            }, content_type="application/json"
+        ))
+
+        changes = [record for record in records if "INSERT" in record["sql"]]
+        self.assertTrue(changes)
+        for record in changes:
+            self.assertFalse(record["analyzed"])
+            self.assertNotIn("Actual Total Time", record["plan"][0]["Plan"])
+        self.assertEqual(Comment.objects.count(), count + 1)
+
+    @override_settings(SLOW_QUERY_THRESHOLD=60000)
+    def test_fast_statements_are_not_captured(self):
+        """Statements faster than the threshold are not captured."""
+        with override_settings(SLOW_QUERY_FILE=self.path):
+            self.client.get(f"/api/child-comments?root={self.root_uuid}")
+            writer.flush()
+
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_stream_sent_by_another_thread(self):
+        """Statements of the stream are captured in the thread that
+        sends it, the wrapper of the request is removed in its thread.
+        """
+        def get_response(request):
+            def content():
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                yield b"1"
+            return StreamingHttpResponse(content())
+
+        def request():
+            middleware = SlowQueryMiddleware(get_response)
+            response = middleware(RequestFactory().get("/api/stream"))
+            self.assertEqual(connection.execute_wrappers, [])
+            self.assertEqual(send_in_thread(response.streaming_content), b"1")
+            return response
+
+        records = self.capture(request)
+
+        self.assertEqual(
+            [record["sql"] for record in records], ["SELECT 1"]
+        )
+        self.assertEqual(records[0]["path"], "/api/stream")
+
+    def test_worst_offenders(self):
+        """The command groups statements by shape."""
+        for _ in range(2):
+            self.capture(lambda: self.client.get(
+                f"/api/child-comments?root={self.root_uuid}"
+            ))
+        out = io.StringIO()
+        call_command("slow_queries", "--file", self.path, "--json", stdout=out)
+        groups = json.loads(out.getvalue())
+
+        self.assertTrue(groups)
+        self.assertEqual(
+            [group["total"] for group in groups],
+            sorted((group["total"] for group in groups), reverse=True)
+        )
+        self.assertTrue(all(group["count"] % 2 == 0 for group in groups))
+
+        out = io.StringIO()
+        call_command("slow_queries", "--file", self.path, stdout=out)
+        self.assertIn("plan, EXPLAIN ANALYZE:", out.getvalue())
@@ -0,0 +1,157 @@
+import io
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from api.middleware import TracingMiddleware
+from api.tracing import read_traces
+from comments.models import Comment, EntityType, User
+from tests.tests_django.test_admission_control import send_in_thread
+
+
+class TracingTest(TestCase):
+    """Test work the tracing of requests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create root comment with 2 replies.
+        """
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        user = User.objects.create(nickname="nick", firstname="Nick")
+        date = datetime(2021, 9, 6, 10, 0, 0, tzinfo=timezone.utc)
+        root = Comment.objects.create(
+            user=user, text="ROOT", created_date=date,
+            parent_entity=uuid.uuid4(), parent_entity_type=entity_type
+        )
+        cls.root_uuid = root.uuid_comment
+        for text in ("child1", "child2"):
+            Comment.objects.create(
+                user=user, text=text, created_date=date,
+                parent_entity=cls.root_uuid, parent_entity_type=entity_type
+            )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "traces.jsonl")
+
+    def get_traces(self, **headers) -> list:
+        with override_settings(TRACING_SAMPLE_RATE=1, TRACING_FILE=self.path):
+            response = self.client.get(
+                f"/api/child-comments?root={self.root_uuid}", **headers
+            )
+        self.assertEqual(response.status_code, 200)
+        return list(read_traces(self.path))
+
+    def test_spans_of_request(self):
+        """The request, view, services, SQL and render are spans
+        of one tree.
+        """
+        traces = self.get_traces()
+
+        self.assertEqual(len(traces), 1)
+        spans = traces[0]
+        components = {span["name"]: span["component"] for span in spans}
+        self.assertEqual(components["GET /api/child-comments"], "http")
+        self.assertEqual(components["view manage_all_child_comments"], "view")
+        self.assertEqual(components["get_child_comments_tree"], "service")
+        self.assertEqual(components["SELECT"], "db")
+        self.assertEqual(components["render"], "render")
+
+        by_id = {span["span_id"]: span for span in spans}
+        roots = [span for span in spans if span["parent_id"] not in by_id]
+        self.assertEqual([span["name"] for span in roots],
+                         ["GET /api/child-comments"])
+        tree = next(
+            span for span in spans
+            if span["name"] == "get_child_comments_tree"
+        )
+        self.assertEqual(
+            by_id[tree["parent_id"]]["name"], "view manage_all_child_comments"
+        )
+        rows = next(
+            span for span in spans if span["name"] == "get_child_comment_rows"
+        )
+        self.assertIs(by_id[rows["parent_id"]], tree)
+        self.assertTrue(any(
+            by_id[span["parent_id"]] is rows for span in spans
+            if span["component"] == "db"
+        ))
+        self.assertEqual(roots[0]["attributes"]["http.status_code"], "200")
+        self.assertEqual(len({span["trace_id"] for span in spans}), 1)
+
+    def test_trace_of_caller(self):
+        """The trace of W3C traceparent header is continued."""
+        trace_id, parent_id = "ab" * 16, "cd" * 8
+        spans = self.get_traces(
+            HTTP_TRACEPARENT=f"00-{trace_id}-{parent_id}-01"
+        )[0]
+
+        self.assertEqual({span["trace_id"] for span in spans}, {trace_id})
+        root = next(span for span in spans if span["component"] == "http")
+        self.assertEqual(root["parent_id"], parent_id)
+
+    @override_settings(TRACING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        """Nothing is written if the tracing is disabled."""
+        with override_settings(TRACING_FILE=self.path):
+            self.client.get(f"/api/child-comments?root={self.root_uuid}")
+
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_summarize_traces(self):
+        """The command summarizes spans by endpoints."""
+        self.get_traces()
+        self.get_traces()
+        out = io.StringIO()
+        call_command(
+            "summarize_traces", "--file", self.path, "--json", stdout=out
+        )
+        summary = json.loads(out.getvalue())
+
+        endpoint = summary["GET /api/child-comments"]
+        self.assertEqual(endpoint["traces"], 2)
+        self.assertEqual(
+            set(endpoint["components"]),
+            {"http", "view", "service", "db", "render"}
+        )
+        self.assertEqual(
+            endpoint["spans"]["view manage_all_child_comments"]["count"], 2
+        )
+        self.assertTrue(endpoint["statements"])
+
+        out = io.StringIO()
+        call_command("summarize_traces", "--file", self.path, stdout=out)
+        self.assertIn("GET /api/child-comments: traces=2", out.getvalue())
+
+    def test_stream_sent_by_another_thread(self):
+        """Statements of the stream are traced in the thread that
+        sends it, the wrapper of the request is removed in its thread.
+        """
+        def get_response(request):
+            def content():
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                yield b"1"
+            return StreamingHttpResponse(content())
+
+        with override_settings(TRACING_SAMPLE_RATE=1, TRACING_FILE=self.path):
+            middleware = TracingMiddleware(get_response)
+            response = middleware(RequestFactory().get("/api/stream"))
+            self.assertEqual(connection.execute_wrappers, [])
+            self.assertEqual(send_in_thread(response.streaming_content), b"1")
+
+        spans = list(read_traces(self.path))[0]
+        names = [span["name"] for span in spans]
+        self.assertEqual(names.count("GET /api/stream"), 1)
+        self.assertIn("SELECT", names)
@@ -0,0 +1,71 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+from django.test import TestCase
+from django.utils import timezone as django_timezone
+
+from comments.models import Comment, EntityType, User
+
+
+class ChangesTest(TestCase):
+    """Test work change feed of comments."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create 3 old comments and 1 comment created just now.
+        """
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        user = User.objects.create(nickname="nick", firstname="Nick")
+        dates = [
+            datetime(2021, 9, day, tzinfo=timezone.utc) for day in (3, 1, 2)
+        ] + [django_timezone.now()]
+        for number, date in enumerate(dates):
+            Comment.objects.create(
+                user=user,
+                text=f"Comment{number}",
+                created_date=date,
+                parent_entity=uuid.uuid4(),
+                parent_entity_type=entity_type
+            )
+
+    def get_changes(self, params=""):
+        response = self.client.get(f"/api/changes?{params}")
+        return response.status_code, json.loads(response.content)
+
+    def test_changes_in_order(self):
+        """Old comments are returned from older to newer."""
+        status, data = self.get_changes()
+
+        self.assertEqual(status, 200)
+        self.assertFalse(data["has_more"])
+        self.assertEqual(
+            [comment["text"] for comment in data["comments"]],
+            ["Comment1", "Comment2", "Comment0"]
+        )
+
+    def test_changes_after_watermark(self):
+        """The next batch starts after the watermark."""
+        _, first = self.get_changes("limit=2")
+        self.assertTrue(first["has_more"])
+        self.assertEqual(len(first["comments"]), 2)
+
+        _, second = self.get_changes(f"after={first['watermark']}&limit=2")
+        self.assertFalse(second["has_more"])
+        self.assertEqual(
+            [comment["text"] for comment in second["comments"]], ["Comment0"]
+        )
+
+        _, third = self.get_changes(f"after={second['watermark']}")
+        self.assertEqual(third["comments"], [])
+        self.assertEqual(third["watermark"], second["watermark"])
+
+    def test_invalid_watermark(self):
+        """Processing an invalid value of watermark."""
+        status, data = self.get_changes("after=watermark")
+
+        self.assertEqual(status, 400)
+        self.assertEqual(data["message"], "Watermark is not valid.")
@@ -0,0 +1,388 @@
+import io
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from api.snapshots import (SNAPSHOT_KEY, get_snapshot_cache, set_tree_snapshot,
+                           start_tree_snapshot)
+from comments.models import Comment, EntityType, User
+from project.asgi import application
+
+
+class ChildCommentsTreeTest(TestCase):
+    """Test work getting tree of comments with limits."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create root comment with 3 replies, the oldest reply has 2 replies.
+        """
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        user = User.objects.create(nickname="nick", firstname="Nick")
+        date = datetime(2021, 9, 6, 10, 0, 0, tzinfo=timezone.utc)
+
+        def create(text, parent, minutes):
+            return Comment.objects.create(
+                user=user,
+                text=text,
+                created_date=date + timedelta(minutes=minutes),
+                parent_entity=parent,
+                parent_entity_type=entity_type
+            )
+
+        root = create("ROOT", uuid.uuid4(), 0)
+        cls.root_uuid = root.uuid_comment
+        first = create("L1 child1", cls.root_uuid, 1)
+        create("L1 child2", cls.root_uuid, 2)
+        create("L1 child3", cls.root_uuid, 3)
+        create("L2 child1", first.uuid_comment, 4)
+        create("L2 child2", first.uuid_comment, 5)
+
+    def get_tree(self, params=""):
+        response = self.client.get(
+            f"/api/child-comments?root={self.root_uuid}{params}"
+        )
+        return response.status_code, json.loads(response.content)
+
+    def test_full_tree_newest_replies_first(self):
+        """Without limits all the tree is returned."""
+        status, data = self.get_tree()
+
+        self.assertEqual(status, 200)
+        self.assertNotIn("next", data)
+        self.assertEqual(
+            [child["text"] for child in data["child"]],
+            ["L1 child3", "L1 child2", "L1 child1"]
+        )
+        self.assertEqual(
+            [child["text"] for child in data["child"][2]["child"]],
+            ["L2 child2", "L2 child1"]
+        )
+
+    def test_max_depth(self):
+        """Replies below max_depth are not loaded but have a token."""
+        status, data = self.get_tree("&max_depth=1")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(len(data["child"]), 3)
+        self.assertEqual(data["child"][2]["child"], [])
+        self.assertIn("next", data["child"][2])
+        self.assertNotIn("next", data["child"][0])
+
+    def test_limit_and_next_replies(self):
+        """Only the newest replies are loaded, the others by token."""
+        status, data = self.get_tree("&limit=2")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [child["text"] for child in data["child"]],
+            ["L1 child3", "L1 child2"]
+        )
+
+        response = self.client.get(
+            f"/api/child-comments/next?token={data['next']}"
+        )
+        next_data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(next_data["parent_entity"], str(self.root_uuid))
+        self.assertIsNone(next_data["next"])
+        self.assertEqual(len(next_data["child"]), 1)
+        self.assertEqual(next_data["child"][0]["text"], "L1 child1")
+        self.assertEqual(len(next_data["child"][0]["child"]), 2)
+
+    def test_budget(self):
+        """No more than budget comments are loaded."""
+        status, data = self.get_tree("&budget=2")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(len(data["child"]), 2)
+        self.assertIn("next", data)
+
+    def test_empty_budget(self):
+        """The budget without comments is not valid, its token
+        would never move forward.
+        """
+        status, data = self.get_tree("&budget=0")
+
+        self.assertEqual(status, 400)
+        self.assertEqual(
+            data["message"], "The budget must be an integer >= 1"
+        )
+
+    def test_invalid_limit(self):
+        """Processing an invalid value of limit."""
+        status, data = self.get_tree("&limit=0")
+
+        self.assertEqual(status, 400)
+        self.assertEqual(data["message"], "The limit must be an integer >= 1")
+
+    def test_invalid_token(self):
+        """Processing an invalid value of token."""
+        response = self.client.get("/api/child-comments/next?token=token")
+        data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data["message"], "Token is not valid.")
+
+    def test_stream_is_same_as_response(self):
+        """The streamed JSON is the same as the usual response."""
+        response = self.client.get(
+            f"/api/child-comments?root={self.root_uuid}"
+        )
+        stream_response = self.client.get(
+            f"/api/child-comments?root={self.root_uuid}&stream=true"
+        )
+
+        self.assertEqual(stream_response.status_code, 200)
+        self.assertTrue(stream_response.streaming)
+        self.assertEqual(
+            b"".join(stream_response.streaming_content), response.content
+        )
+
+    def test_stream_with_limits(self):
+        """The stream can't be used with limits."""
+        status, data = self.get_tree("&stream=true&limit=1")
+
+        self.assertEqual(status, 400)
+        self.assertEqual(
+            data["message"], "The stream can't be used with limits."
+        )
+
+
+@override_settings(TREE_SNAPSHOT_CACHE="tree-snapshots")
+class TreeSnapshotTest(TestCase):
+    """Test work cached snapshots of comment trees."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create root comment with 1 reply.
+        """
+        cls.entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        cls.user = User.objects.create(nickname="nick", firstname="Nick")
+        cls.root = Comment.objects.create(
+            user=cls.user,
+            text="ROOT",
+            parent_entity=uuid.uuid4(),
+            parent_entity_type=cls.entity_type
+        )
+        cls.reply = Comment.objects.create(
+            user=cls.user,
+            text="L1 child1",
+            parent_entity=cls.root.uuid_comment,
+            parent_entity_type=cls.entity_type
+        )
+
+    def setUp(self):
+        get_snapshot_cache().clear()
+        self.url = f"/api/child-comments?root={self.root.uuid_comment}"
+
+    def test_warm_snapshot_without_queries(self):
+        """The second request is answered from snapshot."""
+        response = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(self.url)
+
+        self.assertEqual(cached_response.status_code, 200)
+        self.assertEqual(cached_response.content, response.content)
+
+    def test_new_reply_is_added_to_snapshot(self):
+        """A new reply of any comment in the tree patches the snapshot."""
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                user=self.user,
+                text="L2 child1",
+                parent_entity=self.reply.uuid_comment,
+                parent_entity_type=self.entity_type
+            )
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        data = json.loads(response.content)
+
+        self.assertEqual(data["child"][0]["child"][0]["text"], "L2 child1")
+        self.assertEqual(
+            response.content,
+            self.client.get(self.url + "&stream=true").getvalue()
+        )
+
+    def test_reply_during_build(self):
+        """The tree that was read before a new reply is not saved."""
+        token = start_tree_snapshot(self.root.uuid_comment)
+        stale_tree = {"uuid_comment": self.root.uuid_comment, "child": []}
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                user=self.user,
+                text="L2 child1",
+                parent_entity=self.reply.uuid_comment,
+                parent_entity_type=self.entity_type
+            )
+
+        self.assertFalse(
+            set_tree_snapshot(self.root.uuid_comment, stale_tree, token)
+        )
+        key = SNAPSHOT_KEY.format(self.root.uuid_comment)
+        self.assertIsNone(get_snapshot_cache().get(key))
+
+    def test_changed_comment_deletes_snapshots(self):
+        """A changed comment deletes the snapshots of its tree
+        and of the trees of its ancestors.
+        """
+        self.client.get(self.url)
+        self.client.get(f"/api/child-comments?root={self.reply.uuid_comment}")
+        self.reply.text = "changed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reply.save()
+
+        keys = [
+            SNAPSHOT_KEY.format(self.root.uuid_comment),
+            SNAPSHOT_KEY.format(self.reply.uuid_comment),
+        ]
+        self.assertEqual(get_snapshot_cache().get_many(keys), {})
+        data = json.loads(self.client.get(self.url).content)
+        self.assertEqual(data["child"][0]["text"], "changed")
+
+    def test_deleted_comment_deletes_snapshots(self):
+        """A deleted comment deletes the snapshots of its tree
+        and of the trees of its ancestors.
+        """
+        reply = Comment.objects.create(
+            user=self.user,
+            text="L2 child1",
+            parent_entity=self.reply.uuid_comment,
+            parent_entity_type=self.entity_type
+        )
+        roots = [self.root.uuid_comment, self.reply.uuid_comment,
+                 reply.uuid_comment]
+        for root in roots:
+            self.client.get(f"/api/child-comments?root={root}")
+        with self.captureOnCommitCallbacks(execute=True):
+            reply.delete()
+
+        keys = [SNAPSHOT_KEY.format(root) for root in roots]
+        self.assertEqual(get_snapshot_cache().get_many(keys), {})
+        data = json.loads(self.client.get(self.url).content)
+        self.assertEqual(data["child"][0]["child"], [])
+
+    @override_settings(CACHES={"tree-snapshots": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }})
+    def test_per_process_cache(self):
+        """Snapshots are off with a cache of one process."""
+        self.client.get(self.url)
+
+        key = SNAPSHOT_KEY.format(self.root.uuid_comment)
+        self.assertIsNone(get_snapshot_cache().get(key))
+
+    def test_check_command(self):
+        """The command finds and deletes not consistent snapshots."""
+        self.client.get(self.url)
+        key = SNAPSHOT_KEY.format(self.root.uuid_comment)
+        snapshot = get_snapshot_cache().get(key)
+        snapshot["tree"]["child"] = []
+        get_snapshot_cache().set(key, snapshot)
+
+        out = io.StringIO()
+        call_command(
+            "check_tree_snapshots", str(self.root.uuid_comment), "--fix",
+            stdout=out
+        )
+
+        self.assertIn(
+            "Checked snapshots: 1, not consistent: 1.", out.getvalue()
+        )
+        self.assertIsNone(get_snapshot_cache().get(key))
+
+
+class ChildCommentsAsgiTest(TransactionTestCase):
+    """Test work getting tree of comments through the ASGI application.
+    The handler closes the connection after the request, so the test
+    isn't run in a transaction.
+    """
+
+    def setUp(self):
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        user = User.objects.create(nickname="nick", firstname="Nick")
+        self.root = Comment.objects.create(
+            user=user,
+            text="ROOT",
+            parent_entity=uuid.uuid4(),
+            parent_entity_type=entity_type
+        )
+        Comment.objects.create(
+            user=user,
+            text="L1 child1",
+            parent_entity=self.root.uuid_comment,
+            parent_entity_type=entity_type
+        )
+
+    def get_through_asgi(self, query: str) -> (int, bytes):
+        """Send the request to the ASGI application and return
+        the status and the body of response.
+        """
+        messages = []
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/api/child-comments",
+            "raw_path": b"/api/child-comments",
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"testserver")],
+            "client": ("127.0.0.1", 10000),
+            "server": ("testserver", 80),
+        }
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        async_to_sync(application)(scope, receive, send)
+        status = messages[0]["status"]
+        body = b"".join(
+            message.get("body", b"") for message in messages[1:]
+        )
+        return status, body
+
+    def test_stream_through_asgi(self):
+        """The ASGI request with stream gets the same JSON
+        without the stream.
+        """
+        status, body = self.get_through_asgi(
+            f"root={self.root.uuid_comment}&stream=true"
+        )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            body,
+            self.client.get(
+                f"/api/child-comments?root={self.root.uuid_comment}"
+            ).content
+        )
+
+    @override_settings(DB_JSON_RESPONSES=True)
+    def test_database_json_through_asgi(self):
+        """The ASGI request gets the tree built by database
+        without the stream.
+        """
+        url = f"/api/child-comments?root={self.root.uuid_comment}"
+        status, body = self.get_through_asgi(url.split("?")[1])
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body, self.client.get(url).getvalue())
@@ -1,9 +1,14 @@
+import io
 import json
 import uuid
+from datetime import timedelta
 
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
 
-from comments.models import Comment, EntityType, User
+from comments.models import (Comment, EntitySummary, EntityType,
+                             IdempotencyKey, OutboxEvent, User, UserDailyStats)
 
 
 class CreateNewCommentTest(TestCase):
@@ -308,3 +313,221 @@ class CreateNewCommentTest(TestCase):
             data["message"], "The parent_entity_type was not found"
         )
         self.assertEqual(data["status"], 400)
+
+    def test_create_with_parent_entity_type_id(self):
+        """Tests creating comment with id of parent entity type."""
+        entity_type = EntityType.objects.get(name="Another entity")
+        json_body_data = json.dumps(
+            {
+                "author": "bob11",
+                "text": "This is a new comment",
+                "parent_entity_uuid": "ac8abca8-050b-4fa0-8333-53c87a8588b2",
+                "parent_entity_type": entity_type.id,
+            }
+        )
+        response = self.client.generic(
+            "POST", "/api/new-comments/", json_body_data
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            Comment.objects.get().parent_entity_type, entity_type
+        )
+
+    def test_create_in_one_query(self):
+        """Tests the comment, its event, statistics, summary and counts
+        of replies are saved by one query.
+        """
+        user = User.objects.get(nickname="bob11")
+        parent = Comment.objects.create(
+            user=user,
+            text="Parent comment",
+            parent_entity=uuid.uuid4(),
+            parent_entity_type=EntityType.objects.get()
+        )
+        json_body_data = json.dumps(
+            {
+                "author": str(user.uuid_user),
+                "text": "This is a reply",
+                "parent_entity_uuid": str(parent.uuid_comment),
+                "parent_entity_type": "Another entity",
+            }
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.generic(
+                "POST", "/api/new-comments/", json_body_data
+            )
+
+        self.assertEqual(response.status_code, 201)
+        reply = Comment.objects.get(parent_entity=parent.uuid_comment)
+        self.assertEqual(reply.text, "This is a reply")
+        self.assertIsNotNone(reply.search_vector)
+        parent.refresh_from_db()
+        self.assertEqual(parent.reply_count, 1)
+        self.assertEqual(parent.descendant_count, 1)
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+        self.assertEqual(
+            EntitySummary.objects.get(
+                parent_entity=parent.uuid_comment
+            ).latest_comment_id,
+            reply.uuid_comment
+        )
+        self.assertEqual(sum(UserDailyStats.objects.filter(
+            user=user
+        ).values_list("comments_count", flat=True)), 2)
+
+    def test_create_comment_with_number_text(self):
+        """Tests the text given as JSON number is saved as string."""
+        json_body_data = json.dumps(
+            {
+                "author": "bob11",
+                "text": 12345,
+                "parent_entity_uuid": "ac8abca8-050b-4fa0-8333-53c87a8588b2",
+                "parent_entity_type": "Another entity",
+            }
+        )
+        response = self.client.generic(
+            "POST", "/api/new-comments/", json_body_data
+        )
+
+        self.assertEqual(response.status_code, 201)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.text, "12345")
+        self.assertTrue(Comment.objects.filter(
+            search_vector="12345"
+        ).exists())
+
+    def test_retry_with_idempotency_key(self):
+        """Tests the retry with the same Idempotency-Key returns
+        the original result without another comment.
+        """
+        json_body_data = json.dumps(
+            {
+                "author": "bob11",
+                "text": "This is a new comment",
+                "parent_entity_uuid": "ac8abca8-050b-4fa0-8333-53c87a8588b2",
+                "parent_entity_type": "Another entity",
+            }
+        )
+        responses = []
+        for key in ("first-key", "first-key", "second-key"):
+            with self.assertNumQueries(1):
+                responses.append(self.client.generic(
+                    "POST", "/api/new-comments/", json_body_data,
+                    HTTP_IDEMPOTENCY_KEY=key
+                ))
+
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [201, 201, 201]
+        )
+        self.assertEqual(
+            json.loads(responses[1].content)["name"], "Created"
+        )
+        self.assertNotIn("Idempotent-Replayed", responses[0])
+        self.assertEqual(responses[1]["Idempotent-Replayed"], "true")
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+
+    def test_idempotency_key_with_other_data(self):
+        """Tests the retry with the same Idempotency-Key and other data
+        is rejected.
+        """
+        data = {
+            "author": "bob11",
+            "text": "This is a new comment",
+            "parent_entity_uuid": "ac8abca8-050b-4fa0-8333-53c87a8588b2",
+            "parent_entity_type": "Another entity",
+        }
+        self.client.generic(
+            "POST", "/api/new-comments/", json.dumps(data),
+            HTTP_IDEMPOTENCY_KEY="key"
+        )
+        response = self.client.generic(
+            "POST", "/api/new-comments/",
+            json.dumps(dict(data, text="Another comment")),
+            HTTP_IDEMPOTENCY_KEY="key"
+        )
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(
+            json.loads(response.content)["message"],
+            "The Idempotency-Key was used with other data."
+        )
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_idempotency_keys_of_different_authors(self):
+        """Tests the same Idempotency-Key of different authors
+        creates their comments.
+        """
+        User.objects.create(nickname="alice", firstname="Alice")
+        for author in ("bob11", "alice"):
+            response = self.client.generic(
+                "POST", "/api/new-comments/", json.dumps({
+                    "author": author,
+                    "text": "This is a new comment",
+                    "parent_entity_uuid":
+                        "ac8abca8-050b-4fa0-8333-53c87a8588b2",
+                    "parent_entity_type": "Another entity",
+                }),
+                HTTP_IDEMPOTENCY_KEY="key"
+            )
+            self.assertNotIn("Idempotent-Replayed", response)
+
+        self.assertEqual(
+            sorted(Comment.objects.values_list("user__nickname", flat=True)),
+            ["alice", "bob11"]
+        )
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+
+    def test_expired_idempotency_key(self):
+        """Tests the key is used again after it is expired and
+        expired keys are purged.
+        """
+        json_body_data = json.dumps(
+            {
+                "author": "bob11",
+                "text": "This is a new comment",
+                "parent_entity_uuid": "ac8abca8-050b-4fa0-8333-53c87a8588b2",
+                "parent_entity_type": "Another entity",
+            }
+        )
+        self.client.generic(
+            "POST", "/api/new-comments/", json_body_data,
+            HTTP_IDEMPOTENCY_KEY="key"
+        )
+        IdempotencyKey.objects.update(
+            created_date=timezone.now() - timedelta(days=2)
+        )
+
+        self.client.generic(
+            "POST", "/api/new-comments/", json_body_data,
+            HTTP_IDEMPOTENCY_KEY="key"
+        )
+
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+        IdempotencyKey.objects.update(
+            created_date=timezone.now() - timedelta(days=2)
+        )
+        call_command("purge_idempotency_keys", stdout=io.StringIO())
+        self.assertEqual(IdempotencyKey.objects.count(), 0)
+
+    def test_idempotency_key_of_invalid_request(self):
+        """Tests the key of not valid request is not saved."""
+        json_body_data = json.dumps(
+            {
+                "author": "new_username",
+                "text": "This is a new comment",
+                "parent_entity_uuid": "ac8abca8-050b-4fa0-8333-53c87a8588b2",
+                "parent_entity_type": "Another entity",
+            }
+        )
+        response = self.client.generic(
+            "POST", "/api/new-comments/", json_body_data,
+            HTTP_IDEMPOTENCY_KEY="key"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(IdempotencyKey.objects.count(), 0)
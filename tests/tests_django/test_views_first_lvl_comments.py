@@ -1,6 +1,8 @@
+import io
 import json
 import uuid
 
+from django.core.management import call_command
 from django.test import TestCase
 
 from comments.models import Comment, EntityType, User
@@ -145,3 +147,66 @@ class BadRequestExceptionTest(TestCase):
             "You need to write ?entity=<str:uuid> parameter. "
             "Pagination parameters: ?page=<str>, ?page_size=<str>."
         )
+
+
+class ReplyCountsTest(TestCase):
+    """Test counts of replies of first level comments."""
+    parent_entity = uuid.uuid4()
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create the tree of comments:
+            first
+                reply1
+                    reply11
+                reply2
+            second
+        """
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        user = User.objects.create(nickname="nick", firstname="Nick")
+
+        def create(text, parent_entity):
+            return Comment.objects.create(
+                user=user,
+                text=text,
+                parent_entity=parent_entity,
+                parent_entity_type=entity_type
+            ).uuid_comment
+
+        first = create("first", cls.parent_entity)
+        reply1 = create("reply1", first)
+        create("reply11", reply1)
+        create("reply2", first)
+        create("second", cls.parent_entity)
+
+    def get_counts(self) -> dict:
+        response = self.client.get(
+            f"/api/first-lvl-comments?entity={self.parent_entity}"
+        )
+        return {
+            comment["text"]: (
+                comment["reply_count"], comment["descendant_count"]
+            ) for comment in json.loads(response.content)["comments"]
+        }
+
+    def test_reply_counts(self):
+        """Counts are increased by new replies."""
+        self.assertEqual(
+            self.get_counts(), {"first": (2, 3), "second": (0, 0)}
+        )
+
+    def test_rebuild_reply_counts(self):
+        """Recounted counts are the same."""
+        Comment.objects.update(reply_count=0, descendant_count=0)
+
+        call_command("rebuild_reply_counts", stdout=io.StringIO())
+
+        self.assertEqual(
+            self.get_counts(), {"first": (2, 3), "second": (0, 0)}
+        )
+        self.assertEqual(
+            Comment.objects.get(text="reply1").descendant_count, 1
+        )
@@ -0,0 +1,84 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+from django.test import TestCase
+
+from comments.models import Comment, EntityType, User
+
+
+class FirstLevelCommentsBatchTest(TestCase):
+    """Test work the first level comments of many entities."""
+    first_entity = uuid.uuid4()
+    second_entity = uuid.uuid4()
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create 3 comments for the first entity and 1 comment for
+        the second entity.
+        """
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        user = User.objects.create(nickname="nick", firstname="Nick")
+        comments = [
+            (cls.first_entity, "Comment3", 3),
+            (cls.first_entity, "Comment1", 1),
+            (cls.first_entity, "Comment2", 2),
+            (cls.second_entity, "Comment4", 4),
+        ]
+        for parent_entity, text, day in comments:
+            Comment.objects.create(
+                user=user,
+                text=text,
+                created_date=datetime(2021, 9, day, tzinfo=timezone.utc),
+                parent_entity=parent_entity,
+                parent_entity_type=entity_type
+            )
+
+    def get_batch(self, params):
+        response = self.client.get(f"/api/first-lvl-comments/batch?{params}")
+        return response.status_code, json.loads(response.content)
+
+    def test_first_comments_of_entities(self):
+        """The first comments and the counts of every entity."""
+        empty_entity = uuid.uuid4()
+        entities = [self.second_entity, self.first_entity, empty_entity]
+
+        with self.assertNumQueries(1):
+            status, data = self.get_batch(
+                f"entities={','.join(map(str, entities))}&limit=2"
+            )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(list(data["entities"]), list(map(str, entities)))
+        first = data["entities"][str(self.first_entity)]
+        self.assertEqual(first["comments_count"], 3)
+        self.assertEqual(
+            [comment["text"] for comment in first["comments"]],
+            ["Comment1", "Comment2"]
+        )
+        self.assertEqual(first["comments"][0]["user"], "nick")
+        self.assertEqual(
+            data["entities"][str(empty_entity)],
+            {"comments_count": 0, "comments": []}
+        )
+
+    def test_invalid_entities(self):
+        """Processing not given and not UUID entities."""
+        for params in ("", "entities=", f"entities={self.first_entity},1"):
+            status, data = self.get_batch(params)
+
+            self.assertEqual(status, 400)
+            self.assertEqual(
+                data["message"], "Please, input 'entities' value."
+            )
+
+    def test_too_many_entities(self):
+        """Processing more entities than allowed."""
+        entities = ",".join(str(uuid.uuid4()) for _ in range(101))
+
+        status, _ = self.get_batch(f"entities={entities}")
+
+        self.assertEqual(status, 400)
@@ -0,0 +1,26 @@
+import json
+
+from django.test import TestCase, override_settings
+
+
+class ReadinessTest(TestCase):
+    """Test work the readiness probe."""
+
+    def test_ready(self):
+        """The process is ready if database answers."""
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/ready")
+        data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["name"], "Ready")
+        self.assertGreaterEqual(data["database_latency_ms"], 0)
+
+    @override_settings(READINESS_MAX_DB_LATENCY=-1)
+    def test_slow_database(self):
+        """The process is not ready if database is too slow."""
+        response = self.client.get("/api/ready")
+        data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(data["message"], "The database is too slow.")
@@ -0,0 +1,111 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+from django.test import TestCase
+
+from comments.models import Comment, EntityType, User
+
+
+class SearchCommentsTest(TestCase):
+    """Test work full-text search over comments."""
+    parent_entity = uuid.uuid4()
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create 4 comments of 2 users for 2 entities.
+        """
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        nick = User.objects.create(nickname="nick", firstname="Nick")
+        bob = User.objects.create(nickname="bob", firstname="Bob")
+        comments = [
+            (nick, "red apple and red cherry", cls.parent_entity, 1),
+            (bob, "green apple", cls.parent_entity, 2),
+            (nick, "apple pie", uuid.uuid4(), 3),
+            (bob, "banana", cls.parent_entity, 4),
+        ]
+        for user, text, parent_entity, day in comments:
+            Comment.objects.create(
+                user=user,
+                text=text,
+                created_date=datetime(2021, 9, day, tzinfo=timezone.utc),
+                parent_entity=parent_entity,
+                parent_entity_type=entity_type
+            )
+
+    def search(self, params):
+        response = self.client.get(f"/api/search-comments?{params}")
+        return response.status_code, json.loads(response.content)
+
+    def test_search_ranked(self):
+        """The more relevant comment is the first."""
+        status, data = self.search("q=red apple")
+
+        self.assertEqual(status, 200)
+        self.assertIsNone(data["next"])
+        self.assertEqual(len(data["comments"]), 1)
+        self.assertEqual(
+            data["comments"][0]["text"], "red apple and red cherry"
+        )
+
+        status, data = self.search("q=red or apple")
+        self.assertEqual(len(data["comments"]), 3)
+        self.assertEqual(
+            data["comments"][0]["text"], "red apple and red cherry"
+        )
+        self.assertGreater(
+            data["comments"][0]["rank"], data["comments"][1]["rank"]
+        )
+
+    def test_search_filters(self):
+        """Search by entity, user and dates."""
+        _, data = self.search(f"q=apple&entity={self.parent_entity}")
+        self.assertEqual(len(data["comments"]), 2)
+
+        _, data = self.search("q=apple&user=bob")
+        self.assertEqual(
+            [comment["text"] for comment in data["comments"]], ["green apple"]
+        )
+
+        _, data = self.search(
+            "q=apple&start_date=2021-09-02T00:00:00"
+            "&end_date=2021-09-02T23:59:59"
+        )
+        self.assertEqual(
+            [comment["text"] for comment in data["comments"]], ["green apple"]
+        )
+
+    def test_search_pages(self):
+        """Pages are loaded by cursor from the 'next' link."""
+        _, first_page = self.search("q=apple&page_size=2")
+        self.assertEqual(len(first_page["comments"]), 2)
+        self.assertIsNotNone(first_page["next"])
+
+        response = self.client.get(first_page["next"])
+        second_page = json.loads(response.content)
+        self.assertEqual(len(second_page["comments"]), 1)
+        self.assertIsNone(second_page["next"])
+        texts = {
+            comment["text"]
+            for comment in first_page["comments"] + second_page["comments"]
+        }
+        self.assertEqual(
+            texts, {"red apple and red cherry", "green apple", "apple pie"}
+        )
+
+    def test_search_without_query(self):
+        """Processing an checking for absence q value in url."""
+        status, data = self.search("")
+
+        self.assertEqual(status, 400)
+        self.assertEqual(data["message"], "Please, input 'q' value.")
+
+    def test_search_invalid_cursor(self):
+        """Processing an invalid value of cursor."""
+        status, data = self.search("q=apple&cursor=cursor")
+
+        self.assertEqual(status, 400)
+        self.assertEqual(data["message"], "Cursor is not valid.")
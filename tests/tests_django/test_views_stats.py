@@ -0,0 +1,114 @@
+import io
+import json
+import uuid
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from comments.models import Comment, EntityDailyStats, EntityType, User
+
+
+class StatsTest(TestCase):
+    """Test work statistics from daily rollups."""
+    parent_entity = uuid.uuid4()
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create 5 comments of 2 users for 2 entities on 2 days.
+        """
+        article = EntityType.objects.create(name="Article", description="")
+        post = EntityType.objects.create(name="Post", description="")
+        nick = User.objects.create(nickname="nick", firstname="Nick")
+        bob = User.objects.create(nickname="bob", firstname="Bob")
+        other_entity = uuid.uuid4()
+        comments = [
+            (nick, cls.parent_entity, article, 1),
+            (nick, cls.parent_entity, article, 1),
+            (bob, cls.parent_entity, article, 1),
+            (nick, cls.parent_entity, article, 2),
+            (nick, other_entity, post, 2),
+        ]
+        for user, parent_entity, entity_type, day in comments:
+            Comment.objects.create(
+                user=user,
+                text="Comment",
+                created_date=datetime(2021, 9, day, 12, tzinfo=timezone.utc),
+                parent_entity=parent_entity,
+                parent_entity_type=entity_type
+            )
+
+    def get_stats(self, path, params=""):
+        response = self.client.get(f"/api/stats/{path}?{params}")
+        return response.status_code, json.loads(response.content)
+
+    def test_entity_stats(self):
+        """Daily counts of comments and participants of entity."""
+        status, data = self.get_stats(
+            "entity", f"entity={self.parent_entity}"
+        )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data["comments_count"], 4)
+        self.assertEqual(data["participants"], 2)
+        self.assertEqual(data["days"], [
+            {"day": "2021-09-01", "comments_count": 3, "participants": 2},
+            {"day": "2021-09-02", "comments_count": 1, "participants": 1},
+        ])
+
+    def test_entity_stats_for_period(self):
+        """Only days of the period are counted."""
+        _, data = self.get_stats(
+            "entity",
+            f"entity={self.parent_entity}"
+            f"&start_date=2021-09-02&end_date=2021-09-02"
+        )
+
+        self.assertEqual(data["comments_count"], 1)
+        self.assertEqual(data["participants"], 1)
+
+    def test_entity_types_stats(self):
+        """Daily counts of comments for types of entity."""
+        status, data = self.get_stats("entity-types")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data["days"], [
+            {"day": "2021-09-01", "entity_type": "Article",
+             "comments_count": 3},
+            {"day": "2021-09-02", "entity_type": "Article",
+             "comments_count": 1},
+            {"day": "2021-09-02", "entity_type": "Post",
+             "comments_count": 1},
+        ])
+
+    def test_users_stats(self):
+        """Users with the most comments and their commented entities."""
+        status, data = self.get_stats("users", "limit=1")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(data["users"], [
+            {"user": "nick", "comments_count": 4, "entities": 2},
+        ])
+
+    def test_invalid_date(self):
+        """Processing an invalid value of date."""
+        status, data = self.get_stats("users", "start_date=2021-09")
+
+        self.assertEqual(status, 400)
+        self.assertEqual(data["message"], "Date you entered is incorrect.")
+
+    def test_rebuild_stats(self):
+        """Rollups rebuilt from comments are the same."""
+        rollups = list(EntityDailyStats.objects.order_by(
+            "day", "parent_entity"
+        ).values_list("day", "parent_entity", "comments_count"))
+        EntityDailyStats.objects.all().delete()
+
+        call_command("rebuild_stats", stdout=io.StringIO())
+
+        self.assertEqual(list(EntityDailyStats.objects.order_by(
+            "day", "parent_entity"
+        ).values_list("day", "parent_entity", "comments_count")), rollups)
+        _, data = self.get_stats("users", "limit=1")
+        self.assertEqual(data["users"][0]["entities"], 2)
@@ -0,0 +1,103 @@
+import io
+import json
+import uuid
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from comments.models import Comment, EntitySummary, EntityType, User
+
+
+class ThreadSummariesTest(TestCase):
+    """Test work summaries of entities."""
+    parent_entity = uuid.uuid4()
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set up the data for test.
+        Create 3 comments of 2 users for one entity, the latest comment
+        is saved first.
+        """
+        entity_type = EntityType.objects.create(
+            name="Comment", description=""
+        )
+        nick = User.objects.create(nickname="nick", firstname="Nick")
+        bob = User.objects.create(nickname="bob", firstname="Bob")
+        for user, text, day in ((nick, "Latest", 3), (bob, "First", 1),
+                                (nick, "Second", 2)):
+            Comment.objects.create(
+                user=user,
+                text=text,
+                created_date=datetime(2021, 9, day, tzinfo=timezone.utc),
+                parent_entity=cls.parent_entity,
+                parent_entity_type=entity_type
+            )
+
+    def get_summaries(self, entities, method="get"):
+        if method == "get":
+            response = self.client.get(
+                f"/api/thread-summaries?entities={','.join(entities)}"
+            )
+        else:
+            response = self.client.post(
+                "/api/thread-summaries",
+                data=json.dumps({"entities": entities}),
+                content_type="application/json"
+            )
+        return response.status_code, json.loads(response.content)
+
+    def test_summaries(self):
+        """Summaries of the entity and of entity without comments."""
+        empty_entity = str(uuid.uuid4())
+
+        with self.assertNumQueries(1):
+            status, data = self.get_summaries(
+                [str(self.parent_entity), empty_entity]
+            )
+
+        self.assertEqual(status, 200)
+        summary = data["entities"][str(self.parent_entity)]
+        self.assertEqual(summary["comments_count"], 3)
+        self.assertEqual(summary["participants_count"], 2)
+        self.assertEqual(summary["latest_comment"]["text"], "Latest")
+        self.assertEqual(summary["latest_comment"]["user"], "nick")
+        self.assertEqual(data["entities"][empty_entity], {
+            "comments_count": 0,
+            "participants_count": 0,
+            "latest_comment": None,
+        })
+
+    def test_summaries_by_post(self):
+        """Entities are sent in JSON body."""
+        entities = [str(self.parent_entity)] + [
+            str(uuid.uuid4()) for _ in range(499)
+        ]
+
+        status, data = self.get_summaries(entities, method="post")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(len(data["entities"]), 500)
+
+    def test_invalid_entities(self):
+        """Processing not UUID and too many entities."""
+        too_many = [str(uuid.uuid4()) for _ in range(1001)]
+        for entities in (["1"], too_many):
+            status, data = self.get_summaries(entities, method="post")
+
+            self.assertEqual(status, 400)
+            self.assertEqual(
+                data["message"], "Please, input 'entities' value."
+            )
+
+    def test_rebuild_summaries(self):
+        """Summaries rebuilt from comments are the same."""
+        EntitySummary.objects.all().delete()
+
+        call_command("rebuild_stats", stdout=io.StringIO())
+
+        _, data = self.get_summaries([str(self.parent_entity)])
+        summary = data["entities"][str(self.parent_entity)]
+        self.assertEqual(summary["comments_count"], 3)
+        self.assertEqual(summary["participants_count"], 2)
+        self.assertEqual(summary["latest_comment"]["text"], "Latest")
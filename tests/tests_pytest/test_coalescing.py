@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+from django.core.cache import caches
+
+from api.coalescing import coalesce, get_coalescing_keys
+
+
+def run_concurrently(count: int, function) -> list:
+    """Call function from count threads and return their results."""
+    results = [None] * count
+
+    def target(number):
+        results[number] = function()
+
+    threads = [
+        threading.Thread(target=target, args=(number,))
+        for number in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_calls_are_coalesced():
+    """Test that concurrent calls with the same key compute once."""
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"child": []}
+
+    results = run_concurrently(
+        10, lambda: coalesce("/api/child-comments?root=1", compute)
+    )
+
+    assert len(calls) == 1
+    assert results == [{"child": []}] * 10
+
+
+def test_different_keys_are_not_coalesced():
+    """Test that calls with different keys compute separately."""
+    results = run_concurrently(
+        2, lambda: coalesce(threading.current_thread().name, lambda: 1)
+    )
+
+    assert results == [1, 1]
+
+
+def test_exception_is_shared():
+    """Test that the waiting calls get the exception of computation."""
+    errors = []
+
+    def compute():
+        time.sleep(0.2)
+        raise ValueError("error")
+
+    def call():
+        try:
+            coalesce("/api/first-lvl-comments?entity=1", compute)
+        except ValueError as error:
+            errors.append(error)
+
+    run_concurrently(3, call)
+
+    assert len(errors) == 3
+
+
+def test_result_of_another_process(settings):
+    """Test that the result is taken from the cache while another
+    process holds the lock.
+    """
+    settings.COALESCING_CACHE = "default"
+    cache = caches["default"]
+    key = "/api/first-lvl-comments?entity=2"
+    lock_key, result_key = get_coalescing_keys(key)
+    cache.add(lock_key, 1)
+    # another process computes the result
+    timer = threading.Timer(0.1, cache.set, (result_key, "result"))
+    timer.start()
+
+    try:
+        result = coalesce(key, lambda: pytest.fail("computed twice"))
+    finally:
+        timer.join()
+        cache.delete_many([lock_key, result_key])
+
+    assert result == "result"
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+
+from api.events import (Subscriber, comment_broker, publish_comment,
+                        sse_application)
+from api.services import get_watermark
+from comments.models import Comment, EntityType, User
+
+
+def get_comment(parent_entity: uuid.UUID) -> Comment:
+    """Return not saved comment for parent entity."""
+    return Comment(
+        uuid_comment=uuid.uuid4(),
+        created_date=datetime(2021, 9, 6, 10, 0, 0, 1, tzinfo=timezone.utc),
+        user=User(nickname="nick", firstname="Nick"),
+        text="text",
+        parent_entity=parent_entity,
+        parent_entity_type=EntityType(name="Comment"),
+    )
+
+
+def get_scope(query: str, headers: list = None) -> dict:
+    """Return ASGI scope of request to '/api/events'."""
+    return {
+        "type": "http",
+        "path": "/api/events",
+        "query_string": query.encode(),
+        "headers": headers or [],
+    }
+
+
+def test_subscriber_overflow(settings):
+    """Test that slow connection is closed instead of keeping events."""
+    settings.SSE_MAX_PENDING_BYTES = 10
+
+    async def main():
+        subscriber = Subscriber(
+            ("entity", uuid.uuid4()), asyncio.get_running_loop()
+        )
+        subscriber.put((1,), b"12345")
+        first = await subscriber.get()
+        subscriber.put((2,), b"123456")
+        subscriber.put((3,), b"123456")
+        return first, await subscriber.get()
+
+    first, second = asyncio.run(main())
+    assert first == ((1,), b"12345")
+    assert second is None
+
+
+def test_sse_without_entity():
+    """Test the 'entity' or 'thread' was not found in input."""
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(sse_application(get_scope(""), None, send))
+
+    assert sent[0]["status"] == 400
+    assert json.loads(sent[1]["body"])["message"] == (
+        "Please, input 'entity' or 'thread' value."
+    )
+
+
+def test_sse_sends_new_comment():
+    """Test that new comment of entity is sent to subscriber."""
+    parent_entity = uuid.uuid4()
+    comment = get_comment(parent_entity)
+    sent = []
+
+    async def main():
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if message.get("body", b"").startswith(b"id:"):
+                disconnected.set()
+
+        task = asyncio.ensure_future(sse_application(
+            get_scope(f"entity={parent_entity}"), receive, send
+        ))
+        while not comment_broker.subscribers:
+            await asyncio.sleep(0.01)
+        # comments are published from the threads of django views
+        await asyncio.get_running_loop().run_in_executor(
+            None, publish_comment, comment
+        )
+        await asyncio.wait_for(task, 5)
+
+    asyncio.run(main())
+
+    assert sent[0]["status"] == 200
+    assert (b"content-type", b"text/event-stream") in sent[0]["headers"]
+    lines = sent[1]["body"].decode().splitlines()
+    assert lines[0] == f"id: {get_watermark(comment)}"
+    assert lines[1] == "event: comment"
+    assert json.loads(lines[2][len("data: "):])["text"] == "text"
+    assert not comment_broker.subscribers
+
+
+def get_reset_events(scope: dict) -> list:
+    """Return messages of the stream that is closed by the application."""
+    sent = []
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asyncio.wait_for(sse_application(scope, receive, send), 5))
+    return sent
+
+
+def test_sse_invalid_last_event_id():
+    """Test that not valid Last-Event-ID resets the client."""
+    sent = get_reset_events(get_scope(
+        f"entity={uuid.uuid4()}", [(b"last-event-id", b"not-watermark")]
+    ))
+
+    assert sent[0]["status"] == 200
+    assert len(sent) == 2
+    lines = sent[1]["body"].decode().splitlines()
+    assert lines[:2] == ["id", "event: reset"]
+    assert json.loads(lines[2][len("data: "):])["message"] == (
+        "Last-Event-ID is not valid, fetch the comments again."
+    )
+    assert not sent[1].get("more_body", False)
+    assert not comment_broker.subscribers
+
+
+def test_sse_replay_overflow(settings, monkeypatch):
+    """Test that too many missed comments reset the client
+    instead of sending a part of them.
+    """
+    settings.SSE_MAX_REPLAY = 2
+    parent_entity = uuid.uuid4()
+    monkeypatch.setattr(
+        "api.events.get_missed_comments",
+        lambda channel, after: [get_comment(parent_entity) for _ in range(3)]
+    )
+    last_event_id = get_watermark(get_comment(parent_entity)).encode()
+
+    sent = get_reset_events(get_scope(
+        f"entity={parent_entity}", [(b"last-event-id", last_event_id)]
+    ))
+
+    assert len(sent) == 2
+    lines = sent[1]["body"].decode().splitlines()
+    assert lines[:2] == ["id", "event: reset"]
+    assert json.loads(lines[2][len("data: "):])["message"] == (
+        "Too many missed comments, fetch the comments again."
+    )
+    assert not sent[1].get("more_body", False)
+    assert not comment_broker.subscribers
@@ -0,0 +1,41 @@
+import uuid
+
+from comments import hyperloglog
+
+
+def get_values(count: int) -> list:
+    """Return the same uuid values in every run, so the estimates
+    of tests are deterministic.
+    """
+    return [
+        uuid.uuid5(uuid.NAMESPACE_OID, f"value-{number}")
+        for number in range(count)
+    ]
+
+
+def test_count_of_small_sketch():
+    """Test that a few distinct values are counted exactly,
+    repeated values are counted once.
+    """
+    values = get_values(20)
+    sketch = hyperloglog.empty()
+    for value in values + values:
+        sketch = hyperloglog.add(sketch, value)
+
+    # these values get to different registers
+    assert hyperloglog.count(sketch) == 20
+
+
+def test_count_of_merged_sketches():
+    """Test that common values of merged sketches are counted once."""
+    values = get_values(5000)
+    first, second = hyperloglog.empty(), hyperloglog.empty()
+    for value in values[:3000]:
+        first = hyperloglog.add(first, value)
+    for value in values[2000:]:
+        second = hyperloglog.add(second, value)
+
+    estimate = hyperloglog.count(hyperloglog.merge(first, second))
+
+    # the standard error is about 3%
+    assert abs(estimate - 5000) < 5000 * 0.1
@@ -0,0 +1,42 @@
+from api.loadtest import compare, get_statistics
+
+
+def test_statistics_of_endpoints():
+    """Test percentiles and throughput of endpoints and of all requests."""
+    results = {
+        "tree": {
+            "durations": [float(value) for value in range(1, 101)],
+            "statuses": {"200": 100},
+            "errors": 0,
+        },
+        "create": {"durations": [], "statuses": {}, "errors": 2},
+    }
+
+    statistics = get_statistics(results, elapsed=10)
+
+    assert statistics["tree"]["p50"] == 50
+    assert statistics["tree"]["p99"] == 99
+    assert statistics["tree"]["rps"] == 10
+    assert statistics["create"] == {
+        "requests": 0, "statuses": {}, "errors": 2
+    }
+    assert statistics["total"]["requests"] == 100
+    assert statistics["total"]["errors"] == 2
+
+
+def test_compare_with_baseline():
+    """Test that slower latency and lower throughput are regressions."""
+    baseline = {"tree": {"p50": 10, "p95": 20, "p99": 30, "rps": 100}}
+    current = {
+        "tree": {"p50": 10.5, "p95": 30, "p99": 30, "rps": 80},
+        "csv": {"p50": 1, "p95": 1, "p99": 1, "rps": 1},
+    }
+
+    rows = compare(baseline, current, tolerance=0.1)
+
+    regressions = {
+        (endpoint, metric) for endpoint, metric, *_, regression in rows
+        if regression
+    }
+    assert regressions == {("tree", "p95"), ("tree", "rps")}
+    assert all(endpoint == "tree" for endpoint, *_ in rows)
@@ -0,0 +1,31 @@
+import time
+
+from comments.models import uuid7
+
+
+def test_uuid7_version_and_variant():
+    """Test that uuid7 returns UUID of version 7 with RFC variant."""
+    value = uuid7()
+
+    assert value.version == 7
+    assert value.variant == "specified in RFC 4122"
+
+
+def test_uuid7_time():
+    """Test that the first 48 bits are milliseconds of unix time."""
+    before = time.time_ns() // 1_000_000
+    value = uuid7()
+    after = time.time_ns() // 1_000_000
+
+    assert before <= value.int >> 80 <= after + 1
+
+
+def test_uuid7_is_increasing():
+    """Test that values are increasing even within one millisecond."""
+    values = [uuid7() for _ in range(10000)]
+
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+    assert [value.bytes for value in values] == sorted(
+        value.bytes for value in values
+    )
@@ -1,10 +1,11 @@
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 
 import pytest
 
-from api.services import get_date, get_user, is_uuid, is_valid_comment_request
-from comments.models import EntityType, User
+from api.services import (get_date, get_user, get_watermark, is_uuid,
+                          is_valid_comment_request, load_watermark)
+from comments.models import Comment, EntityType, User
 
 
 def test_value_is_uuid():
@@ -231,3 +232,21 @@ def test_get_date_valid_date_input():
 def test_get_date_invalid_date_input():
     """Test wit valid str date."""
     assert get_date("2000.0.0") is None
+
+
+def test_watermark_is_loaded():
+    """Test that watermark is converted to (created_date, uuid_comment)."""
+    comment = Comment(
+        uuid_comment=uuid.uuid4(),
+        created_date=datetime(2021, 1, 1, 1, 1, 1, 1, tzinfo=timezone.utc)
+    )
+
+    assert load_watermark(get_watermark(comment)) == (
+        comment.created_date, comment.uuid_comment
+    )
+
+
+@pytest.mark.parametrize("watermark", ["", "not watermark", "MjAyMXw"])
+def test_watermark_is_not_valid(watermark):
+    """Test invalid watermark values."""
+    assert load_watermark(watermark) is None
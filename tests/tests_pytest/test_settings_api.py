@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+# the profile is loaded by a new interpreter, the request is answered
+# without queries
+SCRIPT = """
+import json
+import django
+from django.test import Client
+
+django.setup()
+from django.apps import apps
+
+response = Client().get("/api/stats/entity?entity=1")
+print(json.dumps({
+    "status": response.status_code,
+    "data": response.json(),
+    "admin": Client().get("/admin/").status_code,
+    "apps": [app.name for app in apps.get_app_configs()],
+}))
+"""
+
+
+def test_api_settings_profile():
+    """Test that API-only settings serve the API without admin,
+    sessions and other unused apps.
+    """
+    process = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        env=dict(os.environ, DJANGO_SETTINGS_MODULE="project.settings_api"),
+        cwd=settings.BASE_DIR, capture_output=True, text=True
+    )
+
+    assert process.returncode == 0, process.stderr
+    result = json.loads(process.stdout.splitlines()[-1])
+    assert result["status"] == 400
+    assert result["data"]["message"] == "Value was not UUID"
+    assert result["admin"] == 404
+    assert "django.contrib.admin" not in result["apps"]
+    assert "django.contrib.sessions" not in result["apps"]
@@ -0,0 +1,37 @@
+import pytest
+
+from api.slow_queries import get_fingerprint, get_shape, is_read_only
+
+
+def test_shape_of_statement():
+    """Literals, parameters and their lists are replaced."""
+    shape = get_shape(
+        "SELECT  \"comments_comment\".\"text\" FROM \"comments_comment\"\n"
+        "WHERE \"parent_entity\" IN (%s, %s,%s) AND \"text\" = 'it''s' "
+        "LIMIT 21"
+    )
+
+    assert shape == (
+        "SELECT \"comments_comment\".\"text\" FROM \"comments_comment\" "
+        "WHERE \"parent_entity\" IN (...) AND \"text\" = ? LIMIT ?"
+    )
+    assert get_fingerprint(shape) == get_fingerprint(get_shape(
+        "SELECT \"comments_comment\".\"text\" FROM \"comments_comment\" "
+        "WHERE \"parent_entity\" IN (%s) AND \"text\" = %s LIMIT 5"
+    ))
+
+
+@pytest.mark.parametrize(
+    "sql, expected",
+    [
+        ("SELECT 1", True),
+        ("WITH t AS (SELECT 1) SELECT * FROM t", True),
+        ("SELECT * FROM comments_comment FOR UPDATE", False),
+        ("WITH t AS (INSERT INTO a VALUES (1) RETURNING 1) SELECT 1", False),
+        ("UPDATE a SET b = 1", False),
+        ("", False),
+    ]
+)
+def test_read_only_statements(sql, expected):
+    """Only statements that read data are explained with ANALYZE."""
+    assert is_read_only(sql) is expected